@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+
+def compute_etag(request: Request, version) -> str:
+    """
+    データの版（件数・最新の更新時刻など）とURLから作る強いETag。
+    本文を作る前に計算できるので、一致した場合はドキュメントを読まずに304を返せる。
+    """
+    key = repr((request.url.path, str(request.url.query), version)).encode("utf-8")
+    return '"' + hashlib.sha256(key).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match に etag が含まれるか（弱いETagの W/ は無視して比較する）。"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def _cache_headers(etag: str, headers: dict | None = None) -> dict:
+    # クライアントは毎回問い合わせ、変わっていなければ304を受け取る
+    return {**(headers or {}), "ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified_response(request: Request, etag: str) -> Response | None:
+    """If-None-Match が etag と一致すれば本文なしの304を、そうでなければ None を返す。"""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return None
+
+
+def etag_json_response(content, etag: str, headers: dict | None = None) -> Response:
+    """content をFastAPIの既定のJSONResponseと同じ形式でシリアライズし、ETagを付けて返す。"""
+    body = json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+    return Response(content=body, media_type="application/json", headers=_cache_headers(etag, headers))
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
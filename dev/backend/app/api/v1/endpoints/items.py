@@ -1,10 +1,11 @@
 from services import MCP_Client
 from fastapi import APIRouter
 import asyncio
-from fastapi import FastAPI, HTTPException, Body, Depends, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Body, Depends, Request, Query, File, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse, PlainTextResponse
 import io
-from typing import List, Optional
+import json
+from typing import List, Literal, Optional
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -14,22 +15,57 @@ from contextlib import asynccontextmanager
 from PIL import Image
 
 from api.schema import *
+from api.conditional import compute_etag, not_modified_response, etag_json_response
 import uuid
+import zipfile
 
 from tools.ocr.azure_vision_ocr import AzureVisionOCR
 from services.create_article import Article
+from services.firestore_repository import FirestoreRepository
+from services.firestore_cache import FirestoreReadCache
+from models import openai_client
+from core.tracing import get_tracer
+from services.ocr_jobs import OCRJobManager
+from tools.ocr.preprocess import ImagePreprocessor, ImageTooLargeError
+from tools.ocr.ocr_cache import OCRCache, ArticleCache
+from core import config
 
 dotenv.load_dotenv()
 
 mcp_client = MCP_Client.ChatAgent()
 ocr_engine = AzureVisionOCR()
 article = Article()
+image_preprocessor = ImagePreprocessor(max_long_edge=config.OCR_MAX_LONG_EDGE,
+                                       grayscale=config.OCR_GRAYSCALE,
+                                       image_format=config.OCR_IMAGE_FORMAT,
+                                       jpeg_quality=config.OCR_JPEG_QUALITY,
+                                       max_pixels=config.OCR_MAX_PIXELS)
+ocr_jobs = OCRJobManager(ocr_engine, article,
+                         preprocessor=image_preprocessor,
+                         ocr_cache=OCRCache(maxsize=config.OCR_CACHE_SIZE, ttl=config.OCR_CACHE_TTL),
+                         article_cache=ArticleCache(maxsize=config.ARTICLE_CACHE_SIZE, ttl=config.ARTICLE_CACHE_TTL),
+                         max_jobs=config.OCR_MAX_JOBS,
+                         ttl=config.OCR_JOB_TTL,
+                         max_concurrency=config.OCR_MAX_CONCURRENT_JOBS,
+                         ocr_timeout=config.OCR_TIMEOUT,
+                         webhook_url=config.OCR_WEBHOOK_URL)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("startup event")
-    await mcp_client.get_tools_from_mcp_server()
+    # MCPへの接続とベクトルストアへの投入は裏で進め、Firestoreのルートはすぐに使えるようにする
+    warmup_task = asyncio.create_task(mcp_client.warmup())
+    if config.FIRESTORE_CACHE_LISTENERS:
+        try:
+            repository.cache.start_listeners(db)
+        except Exception as e:
+            print(f"Firestoreの変更の監視を開始できませんでした（キャッシュは有効期限で更新されます）：{e}")
     yield
+    warmup_task.cancel()
+    await ocr_jobs.shutdown()
+    await mcp_client.close()
+    await openai_client.close_clients()
+    repository.shutdown()
     print("shutdown event")
 
 router = APIRouter(lifespan=lifespan)
@@ -59,6 +95,26 @@ def initialize_firebase():
     return firestore.client()
 
 db = initialize_firebase()
+repository = FirestoreRepository(db, max_workers=config.FIRESTORE_MAX_WORKERS,
+                                 cache=FirestoreReadCache({"regions": config.FIRESTORE_CACHE_REGIONS_TTL,
+                                                           "near_regions": config.FIRESTORE_CACHE_NEAR_REGIONS_TTL,
+                                                           "users": config.FIRESTORE_CACHE_USERS_TTL},
+                                                          maxsize=config.FIRESTORE_CACHE_MAX_ENTRIES,
+                                                          enabled=config.FIRESTORE_CACHE_ENABLED))
+
+
+@router.get("/health/live", summary="死活確認")
+async def health_live():
+    return {"status": "ok"}
+
+
+@router.get("/health/ready", summary="準備状況の確認（ベクトルストアへの投入状況を含む）")
+async def health_ready(require_retrieval: bool = Query(False, description="trueの場合、検索の準備ができるまで503を返す")):
+    retrieval = mcp_client.warmup_status.to_dict()
+    body = {"status": "ok", "firestore": True, "retrieval_ready": mcp_client.warmup_status.ready, "retrieval": retrieval}
+    if require_retrieval and not mcp_client.warmup_status.ready:
+        return JSONResponse(status_code=503, content={**body, "status": "warming_up"})
+    return body
 
 
 @router.post("/Chat")
@@ -67,16 +123,55 @@ async def Chat(chat_message: ChatMessage):
     return chat_response
 
 
+@router.post("/Chat/stream", summary="チャットの応答をServer-Sent Eventsで逐次返す")
+async def Chat_stream(chat_message: ChatMessage):
+    async def event_stream():
+        try:
+            async for event in mcp_client.chat_stream(query=chat_message.UserMessage, region_id=chat_message.RegionID, region_name=chat_message.RegionName):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/Chat/cache/stats", summary="チャット応答キャッシュのヒット率と削減できた時間")
+async def chat_cache_stats():
+    return mcp_client.response_cache.metrics()
+
+
+@router.get("/firestore/cache/stats", summary="地域一覧・隣接地域・ユーザー情報の読み込みキャッシュのヒット率")
+async def firestore_cache_stats():
+    return repository.cache.metrics()
+
+
+@router.get("/openai/usage", summary="Azure OpenAIのデプロイメントごとのリクエスト数・トークン使用量・再試行回数")
+async def openai_usage():
+    return openai_client.usage_tracker.to_dict()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, summary="Prometheus形式のメトリクス（各段階の処理時間・トークン数・キャッシュヒット）")
+async def metrics():
+    return PlainTextResponse(get_tracer().render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/traces", summary="最近のチャットのトレース（段階ごとの処理時間・トークン数・選択したツール）")
+async def traces(limit: int = Query(20, ge=1, le=200)):
+    return get_tracer().exporter.traces(limit=limit)
+
+
+@router.delete("/Chat/cache/{region_id}", summary="指定地域のチャット応答キャッシュを破棄")
+async def invalidate_chat_cache(region_id: str):
+    mcp_client.response_cache.invalidate(region_id)
+    return {"status": "ok"}
+
+
 @router.post("/new_add_reginions",summary = "自動生成IDで新しい地域を登録")
-def add_new_region(name:str): #フロントエンドから、地域の名前を取得
+async def add_new_region(name:str): #フロントエンドから、地域の名前を取得
     try:
-        New_regions_ref = db.collection("Regions")
-        # ドキュメントのデータを準備
-        region_data = {'Name': name}
-        # ドキュメントIDを自動生成して新しいドキュメントを追加
-        new_doc_ref = New_regions_ref.add(region_data)[1]
-        # 新しく追加されたドキュメントのIDを取得
-        new_region_id = new_doc_ref.id
+        # ドキュメントIDを自動生成して新しい地域を追加
+        new_region_id = await repository.add_region(name)
         return {
                 "message": "新しい地域が正常に登録されました",
                 "region_id": new_region_id, # 自動生成されたID
@@ -86,49 +181,43 @@ def add_new_region(name:str): #フロントエンドから、地域の名前を
         raise HTTPException(status_code=500, detail=f"地域の登録に失敗しました: {str(e)}")
 
 @router.get("/regions/view", summary="地域ID一覧の取得", response_model=List[str])
-def list_region_ids():
+async def list_region_ids():
     try:
-        regions_ref = db.collection("Regions")
-        docs = regions_ref.stream()
-        result = [doc.id for doc in docs]
-        return result
+        regions = await repository.list_regions()
+        return [region_id for region_id, _ in regions]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---- 隣接地域一覧取得 ----
 @router.get("/near_regions/view", summary="隣接地域一覧の取得")
-def get_near_regions(region_id: str):
+async def get_near_regions(region_id: str):
     try:
-        place_ref = db.collection("Regions").document(region_id).collection("near_regions")
-        docs = place_ref.stream()
-        return [{"id": doc.id, "data": doc.to_dict()} for doc in docs]
+        near_regions = await repository.list_near_regions(region_id)
+        return [{"id": doc_id, "data": data} for doc_id, data in near_regions]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---- 隣接地域の追加 ----
 @router.post("/near_regions/add", summary="隣接地域の追加")
-def add_near_region(region_id: str, region: NearRegion):
+async def add_near_region(region_id: str, region: NearRegion):
     try:
-        place_ref = db.collection("Regions").document(region_id).collection("near_regions")
-        new_doc = place_ref.add(region.dict())[1]
-        return {"message": "追加しました", "id": new_doc.id}
+        new_doc_id = await repository.add_near_region(region_id, region.dict())
+        return {"message": "追加しました", "id": new_doc_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---- 隣接地域の削除 ----
 @router.delete("/near_regions/delete", summary="隣接地域の削除")
-def delete_near_region(region_id: str, doc_id: str):
+async def delete_near_region(region_id: str, doc_id: str):
     try:
-        place_ref = db.collection("Regions").document(region_id).collection("near_regions")
-        place_ref.document(doc_id).delete()
+        await repository.delete_near_region(region_id, doc_id)
         return {"message": "削除しました"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---- ニュース追加 ----
 @router.post("/regions/{region_id}/news", response_model=NewsOut, summary="ニュースの追加")
-def add_news(region_id: str, news: NewsIn):
-    news_ref = db.collection('Regions').document(region_id).collection('News')
+async def add_news(region_id: str, news: NewsIn):
     start_time_dt = None
     if news.start_time:
         start_time_dt = datetime.fromisoformat(news.start_time)
@@ -139,18 +228,16 @@ def add_news(region_id: str, news: NewsIn):
         'columns': news.columns,
         'StartTime': start_time_dt
     }
-    doc_ref = news_ref.add(news_data)[1]
-    doc_id = doc_ref.id
+    doc_id = await repository.add_news(region_id, news_data)
+    mcp_client.response_cache.invalidate(region_id)
     return NewsOut(id=doc_id, title=news.title, text=news.text, time=news_data['Time'], columns=news.columns)
 
 # ---- ニュース編集 ----
 @router.put("/regions/{region_id}/news/{news_id}", response_model=NewsOut, summary="ニュースの編集")
-def edit_news(region_id: str, news_id: str, news: NewsEdit):
-    news_ref = db.collection('Regions').document(region_id).collection('News').document(news_id)
-    doc = news_ref.get()
-    if not doc.exists:
+async def edit_news(region_id: str, news_id: str, news: NewsEdit):
+    current_data = await repository.get_news(region_id, news_id)
+    if current_data is None:
         raise HTTPException(status_code=404, detail="News not found")
-    current_data = doc.to_dict()
     start_time_dt = None
     if news.start_time:
         start_time_dt = datetime.fromisoformat(news.start_time)
@@ -161,105 +248,115 @@ def edit_news(region_id: str, news_id: str, news: NewsEdit):
         'columns': news.columns or current_data.get('columns', ''),
         'StartTime': start_time_dt
     }
-    news_ref.update(update_data)
+    await repository.update_news(region_id, news_id, update_data)
+    mcp_client.response_cache.invalidate(region_id)
     return NewsOut(id=news_id, title=update_data['Title'], text=update_data['Text'], time=update_data['Time'], columns=update_data['columns'])
 
 # ---- ニュース削除 ----
 @router.delete("/regions/{region_id}/news/{news_id}", summary="ニュースの削除")
-def delete_news(region_id: str, news_id: str):
-    news_ref = db.collection('Regions').document(region_id).collection('News').document(news_id)
-    if not news_ref.get().exists:
+async def delete_news(region_id: str, news_id: str):
+    if not await repository.delete_news(region_id, news_id):
         raise HTTPException(status_code=404, detail="News not found")
-    news_ref.delete()
+    mcp_client.response_cache.invalidate(region_id)
     return {"detail": "News deleted successfully."}
 
 # ---- ニュース一覧取得（追加） ----
 @router.get("/regions/{region_id}/news", response_model=List[NewsOut], summary="ニュース一覧の取得")
-def list_news(region_id: str):
+async def list_news(
+    region_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="取得する最大件数（省略時は全件）"),
+    cursor: Optional[str] = Query(None, description="前回のレスポンスヘッダー X-Next-Cursor の値"),
+    order_by: Optional[Literal["Time", "StartTime"]] = Query(None, description="並び替えに使うフィールド（省略時はドキュメントID順。指定するとそのフィールドの無いニュースは含まれない）"),
+    descending: bool = Query(True, description="降順で並べるかどうか（order_by または since を指定した場合のみ）"),
+    columns: Optional[List[str]] = Query(None, description="取得するカテゴリ（複数指定可、最大30件）"),
+    since: Optional[datetime] = Query(None, description="order_byのフィールド（省略時はTime）がこの時刻以降のものだけを取得（Timeは編集時にも更新されるので、前回以降に追加・編集されたニュースの差分取得に使える）"),
+):
+    if columns and len(columns) > 30:
+        raise HTTPException(status_code=400, detail="columns は最大30件まで指定できます")
     try:
-        news_ref = db.collection('Regions').document(region_id).collection('News')
-        docs = news_ref.stream()
-        result = []
-        for doc in docs:
-            d = doc.to_dict()
-            result.append(NewsOut(
-                id=doc.id,
-                title=d.get('Title', ''),
-                text=d.get('Text', ''),
-                time=d.get('Time', datetime.now()),
-                columns=d.get('columns', ''),
-                starttime=d.get('StartTime')  # ← 追加
-            ))
-        return result
+        # ニュースを読む前に版を確認し、If-None-Match が一致すれば304を返す
+        etag = compute_etag(request, await repository.news_version(region_id))
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        docs, next_cursor = await repository.list_news_page(region_id, limit=limit, cursor=cursor, order_by=order_by,
+                                                            descending=descending, columns=columns, since=since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    # 次ページがある場合はカーソルをヘッダーで返す（本文は従来どおりリスト）
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    result = []
+    for doc_id, d in docs:
+        result.append(NewsOut(
+            id=doc_id,
+            title=d.get('Title', ''),
+            text=d.get('Text', ''),
+            time=d.get('Time', datetime.now()),
+            columns=d.get('columns', ''),
+            starttime=d.get('StartTime')  # ← 追加
+        ))
+    return etag_json_response(result, etag, headers=headers)
     
 
 # ---- ニュース一覧取得（隣接地域） ----
 @router.get("/regions/{region_id}/news/near_regions", response_model=List[NewsOut], summary="隣接する地域のニュース")
-def near_regions_news(region_id: str):
+async def near_regions_news(region_id: str, request: Request,
+                            limit: int = Query(config.NEAR_REGIONS_NEWS_LIMIT, ge=1, le=500, description="取得する最大件数"),
+                            since: Optional[datetime] = Query(None, description="Timeがこの時刻以降のニュースだけを取得（差分取得）")):
     try:
-        #サブコレクション参照
-        near_regions = db.collection("Regions").document(region_id).collection("near_regions")
-
-        #ドキュメント取得
-        id_docs = near_regions.stream()
-
-        #IDリスト
-        id_list = []
-
-        #ニュース出力
-        result = []
+        etag = compute_etag(request, await repository.near_regions_news_version(region_id))
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        #隣接地域のニュースを並列に取得し、新しい順に統合する
+        docs = await repository.list_near_regions_news(region_id, limit=limit, since=since)
+        result = [
+            NewsOut(
+                id=doc_id,
+                title=d.get('Title', ''),
+                text=d.get('Text', ''),
+                time=d['Time'],
+                columns=d.get('columns', ''),
+                starttime=d.get('StartTime')
+            )
+            for doc_id, d in docs
+        ]
+        return etag_json_response(result, etag)
 
-        #ドキュメント内のIDだけをリスト化
-        for doc in id_docs:
-            data = doc.to_dict()
-            if "ID" in data:
-                id_list.append(data["ID"])
-
-        #リスト化したIDを使って隣接する地域のnewsを一括取得
-        for id in id_list:
-            news_ref = db.collection("Regions").document(id).collection('news')
-            news_docs = news_ref.stream()
-            for doc in news_docs:
-                d = doc.to_dict()
-                result.append(NewsOut(
-                    id=doc.id,
-                    title=d.get('Title', ''),
-                    text=d.get('Text', ''),
-                    time=d.get('Time', datetime.now()),
-                    columns=d.get('columns', '')
-                    ))
-        return result
-    
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"隣接地域のニュース取得中にエラーが発生しました: {str(e)}")
 
 @router.get("/users/messages", summary="ユーザーメッセージの取得")
-def get_user_messages(user_id: str):
+async def get_user_messages(user_id: str, request: Request,
+                            since: Optional[datetime] = Query(None, description="この時刻以降に送信・既読化されたメッセージだけを取得（差分取得）")):
     try:
-        messages_ref = db.collection("Users").document(user_id).collection("Messages")
-        docs = messages_ref.stream()
+        etag = compute_etag(request, await repository.messages_version(user_id))
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        docs = await repository.list_messages(user_id, since=since)
         result = []
-        for doc in docs:
-            d = doc.to_dict()
+        for doc_id, d in docs:
             result.append({
-                "id": doc.id,
+                "id": doc_id,
                 "Title": d.get("Title", ""),
                 "Text": d.get("Text", ""),
                 "Senttime": d.get("SentTime", datetime.now()),
                 "read": d.get("read", ""),
-                "author": d.get("author", "")
+                "author": d.get("author", ""),
+                "UpdatedTime": d.get("UpdatedTime", d.get("SentTime")),
             })
-        return result
+        return etag_json_response(result, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/users/post/messages", summary="ユーザーメッセージの送信")
-def post_user_message(user_id: str, user_message: UserMessageIn):
-    print(uuid.uuid4())
+async def post_user_message(user_id: str, user_message: UserMessageIn):
     try:
-        messages_ref = db.collection("Users").document(user_id).collection("Messages")
         message_data = {
             "Title": user_message.title,
             "Text": user_message.text,
@@ -267,14 +364,14 @@ def post_user_message(user_id: str, user_message: UserMessageIn):
             "read": False,
             "author": user_message.author,
         }
-        new_doc = messages_ref.add(message_data)[1]
-        return {"message": "メッセージを送信しました", "id": new_doc.id}
+        new_doc_id = await repository.post_message(user_id, message_data)
+        return {"message": "メッセージを送信しました", "id": new_doc_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/regist/userid", summary="ユーザーIDを登録します。")
-def regist_user_id(request: UserRegistRequest):
-    db.collection("Users").document(request.user_id).set({
+async def regist_user_id(request: UserRegistRequest):
+    await repository.set_user(request.user_id, {
         "birthday_yyyymmdd": request.birthday,
         "name": request.name,
         "phone_number": request.phone_number,
@@ -285,34 +382,28 @@ def regist_user_id(request: UserRegistRequest):
     return {"status": "success"}
 
 @router.post("/regist/region", summary="町会を登録します。")
-def regist_region(region_id: str, region_name: str):
-    db.collection("Regions").document(region_id).set({
-        "Name": region_name,
-    })
+async def regist_region(region_id: str, region_name: str):
+    await repository.set_region(region_id, region_name)
     return 200
     
 @router.get("/users/get/id", summary="ユーザーID一覧の取得")
-def get_user_ids():
+async def get_user_ids():
     try:
-        users_ref = db.collection("Users")
-        docs = users_ref.stream()
-        user_ids = [doc.id for doc in docs]
+        user_ids = await repository.list_user_ids()
         return {"user_ids": user_ids}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     
 @router.get("/regions/names", summary="すべての地域名を取得")
-def get_region_names():
+async def get_region_names():
     try:
-        regions_ref = db.collection("Regions")
-        docs = regions_ref.stream()
+        regions = await repository.list_regions()
 
         result = []
-        for doc in docs:
-            data = doc.to_dict()
+        for region_id, data in regions:
             result.append({
-                "id": doc.id,
+                "id": region_id,
                 "name": data.get("Name", "")
             })
 
@@ -320,54 +411,16 @@ def get_region_names():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# ---- ニュース一覧取得（隣接地域） ----
-@router.get("/regions/{region_id}/news/near_regions", response_model=List[NewsOut], summary="隣接する地域のニュース")
-def near_regions_news(region_id: str):
-    try:
-        #サブコレクション参照
-        near_regions_ref = db.collection("Regions").document(region_id).collection("near_regions")
-
-        #ドキュメント取得
-        id_docs = near_regions_ref.stream()
-
-        #IDリスト
-        id_list = [doc.to_dict().get("ID") for doc in id_docs if doc.to_dict().get("ID")]
-
-        #ニュース出力
-        result = []
-
-        #リスト化したIDを使って隣接する地域のnewsを一括取得
-        for id in id_list:
-            news_ref = db.collection("Regions").document(id).collection('News')
-            news_docs = news_ref.stream()
-            for doc in news_docs:
-                d = doc.to_dict()
-                result.append(NewsOut(
-                    id=doc.id,
-                    title=d.get('Title', ''),
-                    text=d.get('Text', ''),
-                    time=d.get('Time') or datetime.now(),
-                    columns=d.get('columns', '')
-                ))
-        return result
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"隣接地域のニュース取得中にエラーが発生しました: {str(e)}")
-
-
 #指定地域のユーザー一覧を取得
 @router.get("/regions/{region_id}/users", summary="指定地域のユーザー一覧を取得")
-def get_region_users(region_id: str):
+async def get_region_users(region_id: str):
     try:
-        users_ref = db.collection("Users")
-        query = users_ref.where("RegionID", "==", region_id)
-        results = query.stream()
+        results = await repository.list_region_users(region_id)
 
         users = []
-        for doc in results:
-            data = doc.to_dict()
+        for user_id, data in results:
             users.append({
-                "id": doc.id,
+                "id": user_id,
                 "name": data.get("name", "(名前なし)"),
             })
 
@@ -376,63 +429,154 @@ def get_region_users(region_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/user/{user_id}/info", summary="ユーザー情報を取得します。")
-def get_user_infomation(user_id: str):
+async def get_user_infomation(user_id: str):
     try:
-        user_info = db.collection("Users").document(user_id)
-        doc = user_info.get()
-        return doc.to_dict()
+        return await repository.get_user(user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @router.post("/user/update/read", summary="メッセージを既読にします。")
-def set_read(args: SetReadState):
+async def set_read(args: SetReadState):
     try:
-        message_ref = db.collection("Users").document(args.user_id).collection("Messages").document(args.message_id)
-        message_ref.update({"read": True})
-        return {"status": "ok"}
+        found = await repository.mark_message_read(args.user_id, args.message_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-
+    if not found:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {"status": "ok"}
+
+
+async def read_image_body(request: Request) -> bytes:
+    """リクエストの画像を読み込む。上限を超える場合は、本文を読み切る前に413を返す。"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > config.OCR_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="画像のサイズが大きすぎます")
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > config.OCR_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="画像のサイズが大きすぎます")
+    if not body:
+        raise HTTPException(status_code=400, detail="画像が空です")
+    return bytes(body)
 
 @router.post("/upload-binary-image")
 async def upload_binary_image(request: Request):
+    body = await read_image_body(request)
     try:
-        # バイナリから画像を読み込む
-        body = await request.body()
-        image = Image.open(io.BytesIO(body))
-        if image.mode == "RGBA":
-            image = image.convert("RGB")
-        # OCR実行
-        text = ocr_engine.image_to_text(image)
+        # 向きの補正・縮小・グレースケール化をしてからOCRする（結果を待つ間もイベントループを止めない）
+        text = await ocr_jobs.ocr_image(body)
         print("OCR結果：", text)
-        article_text = article.create(text)
+        article_text = await ocr_jobs.create_article(text)
         print("生成した記事：", article_text)
         return article_text
 
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"OCRに失敗しました: {e}")
+
+async def read_upload(upload: UploadFile, limit: int) -> bytes:
+    """アップロードされたファイルを少しずつ読み込み、limit バイトを超えた時点で413を返す。"""
+    if upload.size is not None and upload.size > limit:
+        raise HTTPException(status_code=413, detail=f"{upload.filename} のサイズが大きすぎます")
+    body = bytearray()
+    while chunk := await upload.read(1024 * 1024):
+        body.extend(chunk)
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail=f"{upload.filename} のサイズが大きすぎます")
+    return bytes(body)
+
+async def read_batch_pages(files: List[UploadFile]) -> list[bytes]:
+    """
+    アップロードされた画像（またはzip内の画像）をページ順のリストにする。
+    zipの中の画像はファイル名順に並べる。
+
+    画像は1枚 OCR_MAX_UPLOAD_BYTES まで、zipは OCR_MAX_UPLOAD_BYTES × OCR_BATCH_MAX_PAGES までで、
+    サイズが分からないアップロードも上限を超えた時点で読み込みをやめる。
+    """
+    pages = []
+    for upload in files:
+        if upload.content_type in ("application/zip", "application/x-zip-compressed") or (upload.filename or "").lower().endswith(".zip"):
+            content = await read_upload(upload, config.OCR_MAX_UPLOAD_BYTES * config.OCR_BATCH_MAX_PAGES)
+            try:
+                with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                    entries = sorted((info for info in archive.infolist() if not info.is_dir()), key=lambda info: info.filename)
+                    for info in entries:
+                        if info.file_size > config.OCR_MAX_UPLOAD_BYTES:
+                            raise HTTPException(status_code=413, detail=f"{info.filename} のサイズが大きすぎます")
+                        if len(pages) >= config.OCR_BATCH_MAX_PAGES:
+                            raise HTTPException(status_code=413, detail=f"ページ数は{config.OCR_BATCH_MAX_PAGES}枚までです")
+                        # zipに書かれたサイズは偽れるので、展開した量でも確認する
+                        with archive.open(info) as entry:
+                            page = entry.read(config.OCR_MAX_UPLOAD_BYTES + 1)
+                        if len(page) > config.OCR_MAX_UPLOAD_BYTES:
+                            raise HTTPException(status_code=413, detail=f"{info.filename} のサイズが大きすぎます")
+                        pages.append(page)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{upload.filename} はzipファイルとして読み込めません")
+        else:
+            if len(pages) >= config.OCR_BATCH_MAX_PAGES:
+                raise HTTPException(status_code=413, detail=f"ページ数は{config.OCR_BATCH_MAX_PAGES}枚までです")
+            pages.append(await read_upload(upload, config.OCR_MAX_UPLOAD_BYTES))
+    if not pages:
+        raise HTTPException(status_code=400, detail="画像が空です")
+    return pages
+
+@router.post("/ocr/batch", summary="複数ページの画像（回覧板など）をまとめてOCRし、1つの記事を生成")
+async def ocr_batch(files: List[UploadFile] = File(..., description="ページ順の画像、または画像をまとめたzip"),
+                    region_id: Optional[str] = Query(None, description="指定した場合、生成した記事をその地域のニュースとして投稿する"),
+                    title: Optional[str] = Query(None, description="ニュースのタイトル（省略時は記事の1行目）"),
+                    columns: str = Query("回覧板", description="ニュースのカテゴリ")):
+    pages = await read_batch_pages(files)
+    try:
+        texts = await ocr_jobs.ocr_pages(pages, max_concurrency=config.OCR_BATCH_CONCURRENCY)
+        text = ocr_jobs.merge_pages(texts)
+        print("OCR結果：", text)
+        # ページごとではなく、まとめて1回だけ記事を生成する
+        article_text = await ocr_jobs.create_article(text)
+        print("生成した記事：", article_text)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCRに失敗しました: {e}")
+
+    news = None
+    if region_id:
+        first_line = next((line.strip(" #【】") for line in article_text.splitlines() if line.strip(" #【】")), "回覧板")
+        news = await add_news(region_id, NewsIn(title=title or first_line[:50], text=article_text, columns=columns))
+    return {"pages": len(pages), "text": text, "article": article_text, "news": news}
+
+# ---- OCRジョブ ----
+@router.post("/ocr/jobs", status_code=202, summary="ポスター画像のOCRと記事生成をジョブとして開始")
+async def submit_ocr_job(request: Request):
+    body = await read_image_body(request)
+    job = ocr_jobs.submit(body)
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@router.get("/ocr/jobs/{job_id}", summary="OCRジョブの状態と結果を取得")
+async def get_ocr_job(job_id: str):
+    job = ocr_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
     
 @router.get("/regions/{region_id}/users/messages", summary="指定地域のユーザー全員のメッセージ既読状態を取得")
-def get_region_users_messages(region_id: str):
+async def get_region_users_messages(region_id: str, mode: Literal["full", "summary"] = Query("full", description="summary: メッセージごとの既読集計のみを返す")):
     try:
-        users_ref = db.collection("Users")
-        query = users_ref.where("RegionID", "==", region_id)
-        user_docs = query.stream()
+        if mode == "summary":
+            return await repository.read_receipt_summary(region_id)
 
-        result = []
+        user_docs = await repository.list_region_users_messages(region_id)
 
-        for user_doc in user_docs:
-            user_id = user_doc.id
-            user_data = user_doc.to_dict()
-            messages_ref = db.collection("Users").document(user_id).collection("Messages")
-            message_docs = messages_ref.stream()
+        result = []
 
+        for user_id, user_data, message_docs in user_docs:
             messages = []
-            for msg_doc in message_docs:
-                msg_data = msg_doc.to_dict()
+            for msg_id, msg_data in message_docs:
                 messages.append({
-                    "message_id": msg_doc.id,
+                    "message_id": msg_id,
                     "Title": msg_data.get("Title", ""),
                     "Text": msg_data.get("Text", ""),
                     "SentTime": msg_data.get("SentTime"),
@@ -451,6 +595,15 @@ def get_region_users_messages(region_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/regions/{region_id}/users/messages/rebuild", summary="指定地域のメッセージ既読集計を作り直す")
+async def rebuild_region_read_receipts(region_id: str):
+    try:
+        count = await repository.rebuild_read_receipts(region_id)
+        return {"status": "ok", "receipts": count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 """
 Copyright (c) 2025 YukiTakayama, SaihaHatanaka, ShingoNakano
 このソースコードは自由に使用、複製、改変、再配布することができます。
@@ -0,0 +1,113 @@
+import os
+import dotenv
+
+dotenv.load_dotenv()
+
+# ---- Firestore ----
+# Firestoreの同期クライアントを実行する専用スレッドプールのサイズ
+FIRESTORE_MAX_WORKERS = int(os.getenv("FIRESTORE_MAX_WORKERS", "16"))
+# 隣接地域ニュースの最大取得件数
+NEAR_REGIONS_NEWS_LIMIT = int(os.getenv("NEAR_REGIONS_NEWS_LIMIT", "50"))
+# 地域一覧・隣接地域・ユーザー情報の読み込みキャッシュ（有効期限は秒）
+FIRESTORE_CACHE_ENABLED = os.getenv("FIRESTORE_CACHE_ENABLED", "true").lower() == "true"
+FIRESTORE_CACHE_REGIONS_TTL = float(os.getenv("FIRESTORE_CACHE_REGIONS_TTL", "300"))
+FIRESTORE_CACHE_NEAR_REGIONS_TTL = float(os.getenv("FIRESTORE_CACHE_NEAR_REGIONS_TTL", "300"))
+FIRESTORE_CACHE_USERS_TTL = float(os.getenv("FIRESTORE_CACHE_USERS_TTL", "60"))
+FIRESTORE_CACHE_MAX_ENTRIES = int(os.getenv("FIRESTORE_CACHE_MAX_ENTRIES", "10000"))
+# trueの場合、on_snapshotで変更を監視して他のワーカーからの書き込みでもキャッシュを破棄する
+FIRESTORE_CACHE_LISTENERS = os.getenv("FIRESTORE_CACHE_LISTENERS", "false").lower() == "true"
+
+# ---- MCP ----
+# ツールごとの引数生成〜実行のタイムアウト（秒）。遅いツールが他のツールの結果を待たせないようにする
+MCP_TOOL_TIMEOUT_DEFAULT = float(os.getenv("MCP_TOOL_TIMEOUT_DEFAULT", "15"))
+MCP_TOOL_TIMEOUTS = {
+    "search_collection": float(os.getenv("MCP_SEARCH_COLLECTION_TIMEOUT", "10")),
+    "fetch_tool": float(os.getenv("MCP_FETCH_TOOL_TIMEOUT", "12")),
+}
+# 1つのMCPサーバーに同時に送る呼び出しの上限
+MCP_MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "8"))
+# MCPサーバーの死活監視(ping)の間隔（秒）
+MCP_HEALTH_CHECK_INTERVAL = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "30"))
+# MCPサーバーへの接続を待つ時間（秒）
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "10"))
+
+# ---- Chat ----
+# ツールの選択方法。"staged"（選択と引数生成を別々に行う）または "function_calling"（1回でまとめて行う）
+CHAT_PLANNER_MODE = os.getenv("CHAT_PLANNER_MODE", "staged")
+# 似た質問への応答を使い回すキャッシュの設定
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"
+CHAT_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("CHAT_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "1800"))
+CHAT_CACHE_MAX_ENTRIES_PER_REGION = int(os.getenv("CHAT_CACHE_MAX_ENTRIES_PER_REGION", "256"))
+# 応答生成のプロンプトに入れるツール出力のトークン数の上限と、重複とみなす類似度
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "2000"))
+CHAT_CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CHAT_CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# トークン数を数える tiktoken のエンコーディング（読み込めない場合は概算）。Dockerfileでビルド時に取得するものと合わせる
+CHAT_CONTEXT_ENCODING = os.getenv("CHAT_CONTEXT_ENCODING", "o200k_base")
+
+# ---- Embedding ----
+# 1回の埋め込みリクエストに含める最大件数・最大文字数
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+EMBEDDING_BATCH_MAX_CHARS = int(os.getenv("EMBEDDING_BATCH_MAX_CHARS", "100000"))
+# メモリ上に保持する埋め込みの件数
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# 埋め込みを永続化するSQLiteファイルのパス（未設定の場合はメモリのみ）
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
+
+# ---- Azure OpenAI ----
+# デプロイメントごとの同時リクエスト数の上限
+AZURE_OPENAI_MAX_CONCURRENCY = int(os.getenv("AZURE_OPENAI_MAX_CONCURRENCY", "8"))
+# 429・タイムアウト・5xxのときの再試行回数と、待ち時間（秒）の基準値・上限
+AZURE_OPENAI_MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "5"))
+AZURE_OPENAI_BACKOFF_BASE = float(os.getenv("AZURE_OPENAI_BACKOFF_BASE", "0.5"))
+AZURE_OPENAI_BACKOFF_MAX = float(os.getenv("AZURE_OPENAI_BACKOFF_MAX", "20"))
+# 1回のリクエストのタイムアウト（秒）
+AZURE_OPENAI_TIMEOUT = float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+
+# ---- Tracing ----
+# チャットの各段階の処理時間・トークン数の記録と、メモリに保持するスパンの件数
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+
+# ---- Qdrant ----
+# 起動時に地域の情報を投入するQdrantの接続先（ベンチマークではローカルのQdrantを指定する）
+QDRANT_HOST = os.getenv("QDRANT_HOST", "qdrant")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+
+# ---- Warmup ----
+# 起動時のベクトルストアへの投入を試みる回数
+WARMUP_MAX_ATTEMPTS = int(os.getenv("WARMUP_MAX_ATTEMPTS", "5"))
+
+# ---- OCR ----
+# OCRジョブの結果を保持する時間（秒）と件数
+OCR_JOB_TTL = float(os.getenv("OCR_JOB_TTL", "3600"))
+OCR_MAX_JOBS = int(os.getenv("OCR_MAX_JOBS", "1000"))
+# 同時に実行するOCRジョブの数
+OCR_MAX_CONCURRENT_JOBS = int(os.getenv("OCR_MAX_CONCURRENT_JOBS", "4"))
+# Azureの読み取り結果を待つ最大時間（秒）
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "30"))
+# OCRジョブの完了を通知するURL（未設定の場合は通知しない）
+OCR_WEBHOOK_URL = os.getenv("OCR_WEBHOOK_URL") or None
+# 受け付ける画像の最大バイト数・最大画素数
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", "50000000"))
+# OCRに送る前に縮小する長辺の画素数、グレースケール化、エンコード形式（JPEG / PNG）とJPEGの品質
+OCR_MAX_LONG_EDGE = int(os.getenv("OCR_MAX_LONG_EDGE", "2048"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
+OCR_IMAGE_FORMAT = os.getenv("OCR_IMAGE_FORMAT", "JPEG").upper()
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+# まとめてOCRする（回覧板など）ときの最大ページ数と、同時にOCRするページ数
+OCR_BATCH_MAX_PAGES = int(os.getenv("OCR_BATCH_MAX_PAGES", "20"))
+OCR_BATCH_CONCURRENCY = int(os.getenv("OCR_BATCH_CONCURRENCY", "4"))
+# OCR結果（画像のpHashとファイルのSHA-256がキー）と生成した記事（OCRテキストのハッシュがキー）のキャッシュ
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "512"))
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", "86400"))
+ARTICLE_CACHE_SIZE = int(os.getenv("ARTICLE_CACHE_SIZE", "512"))
+ARTICLE_CACHE_TTL = float(os.getenv("ARTICLE_CACHE_TTL", "86400"))
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -0,0 +1,235 @@
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+import uuid
+
+from core import config
+
+
+class Span:
+    """
+    処理の1区間。OpenTelemetryのスパンと同じく trace_id / span_id / parent_id と属性を持つ。
+    """
+    def __init__(self, name: str, parent: "Span | None" = None, attributes: dict | None = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    @property
+    def root(self) -> "Span":
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def add_to_attribute(self, key: str, value: float):
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class InMemorySpanExporter:
+    """終了したスパンを新しいものから max_spans 件まで保持する。"""
+    def __init__(self, max_spans: int = 2000):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span.to_dict())
+
+    def traces(self, limit: int = 20) -> list[dict]:
+        """最近のトレースを、ルートスパンとその配下のスパンの一覧にまとめて返す。"""
+        with self._lock:
+            spans = list(self._spans)
+        grouped = {}
+        for span in reversed(spans):
+            grouped.setdefault(span["trace_id"], []).append(span)
+        result = []
+        for trace_id, trace_spans in grouped.items():
+            root = next((span for span in trace_spans if span["parent_id"] is None), None)
+            if root is None:
+                continue
+            result.append({"trace_id": trace_id, "root": root["name"], "duration": root["duration"],
+                           "attributes": root["attributes"],
+                           "spans": sorted(trace_spans, key=lambda span: span["start_time"])})
+            if len(result) >= limit:
+                break
+        return result
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+
+    def inc(self, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0.0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str,
+                 buckets: tuple = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # labels -> [バケットごとの件数, 合計, 件数]
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+        counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+        self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._values.items():
+            for bound, c in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', str(bound)),))} {c}")
+            lines.append(f"{self.name}_bucket{format_labels(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+
+def format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in key]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Tracer:
+    """
+    チャットの各段階（ツール選択・引数生成・埋め込み・MCP呼び出し・応答生成など）の処理時間と
+    トークン使用量を記録する。
+
+    スパンは contextvars で親子関係を引き継ぐので、asyncio.gather や asyncio.to_thread の先でも
+    同じトレースに入ります。終了したスパンは exporter に保存し、Prometheusの形式でも集計します。
+    """
+    def __init__(self, enabled: bool = True, max_spans: int = 2000):
+        self.enabled = enabled
+        self.exporter = InMemorySpanExporter(max_spans=max_spans)
+        self._current = contextvars.ContextVar("current_span", default=None)
+        self._lock = threading.Lock()
+        self.stage_duration = Histogram("chat_stage_duration_seconds", "Duration of each traced stage")
+        self.tokens = Counter("openai_tokens_total", "Azure OpenAI tokens by deployment, kind and region")
+        self.cache_lookups = Counter("chat_cache_lookups_total", "Chat response cache lookups by region and result")
+        self.tool_selections = Counter("chat_tool_selected_total", "Tools selected for chat requests")
+        self.errors = Counter("traced_stage_errors_total", "Traced stages that raised an exception")
+
+    @property
+    def current_span(self) -> Span | None:
+        return self._current.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, parent=self._current.get(), attributes=attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            try:
+                self._current.reset(token)
+            except ValueError:
+                # 非同期ジェネレーターが別のコンテキストで閉じられた場合
+                self._current.set(span.parent)
+            span.duration = time.perf_counter() - span._started
+            with self._lock:
+                self.stage_duration.observe(span.duration, stage=name)
+                if span.status == "error":
+                    self.errors.inc(stage=name)
+            self.exporter.export(span)
+
+    def set_attribute(self, key: str, value):
+        span = self._current.get()
+        if span is not None:
+            span.set_attribute(key, value)
+
+    def record_usage(self, deployment: str, usage):
+        """現在のスパンと、ルートスパンの region_id ごとの集計にトークン数を加える。"""
+        if not self.enabled or usage is None:
+            return
+        span = self._current.get()
+        region_id = span.root.attributes.get("region_id", "") if span is not None else ""
+        for kind in ("prompt_tokens", "completion_tokens"):
+            value = getattr(usage, kind, 0) or 0
+            if span is not None:
+                span.add_to_attribute(kind, value)
+                if span.root is not span:
+                    span.root.add_to_attribute(kind, value)
+            with self._lock:
+                self.tokens.inc(value, deployment=deployment, kind=kind.removesuffix("_tokens"), region_id=region_id)
+
+    def record_cache_lookup(self, region_id: str, hit: bool):
+        self.set_attribute("cache_hit", hit)
+        with self._lock:
+            self.cache_lookups.inc(region_id=region_id, result="hit" if hit else "miss")
+
+    def record_tool_selection(self, tool_names: list[str]):
+        self.set_attribute("tools", tool_names)
+        with self._lock:
+            for tool_name in tool_names:
+                self.tool_selections.inc(tool=tool_name)
+
+    def render_metrics(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.stage_duration, self.tokens, self.cache_lookups, self.tool_selections, self.errors):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_tracer = None
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(enabled=config.TRACING_ENABLED, max_spans=config.TRACE_BUFFER_SIZE)
+    return _tracer
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
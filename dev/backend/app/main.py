@@ -12,8 +12,13 @@ API_KEY = os.getenv("BACKEND_API_KEY")
 
 app = FastAPI()
 
+# ヘルスチェック（コンテナのプローブ）はAPIキーなしで呼べるようにする
+PUBLIC_PATHS = {"/api/v1/health/live", "/api/v1/health/ready"}
+
 @app.middleware("http")
 async def verify_api_key(request: Request, call_next):
+    if request.url.path in PUBLIC_PATHS:
+        return await call_next(request)
     auth_header = request.headers.get("Authorization")
     if auth_header != f"Bearer {API_KEY}":
         return JSONResponse(status_code=401, content={"detail": "Invalid or missing API Key"})
@@ -27,6 +32,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 app.include_router(items.router, prefix="/api/v1")
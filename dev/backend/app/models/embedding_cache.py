@@ -0,0 +1,59 @@
+from array import array
+import hashlib
+import sqlite3
+import threading
+
+from core.cache import TTLCache
+
+
+class EmbeddingCache:
+    """
+    テキストの埋め込みを、モデル名と本文のハッシュをキーにして保存するキャッシュ。
+
+    メモリ上のLRUに加えて、path を指定するとSQLiteにfloat32で永続化し、
+    再起動後も同じテキストを埋め込みAPIに送らずに済むようにします。
+    """
+    def __init__(self, maxsize: int = 10000, path: str | None = None):
+        self.memory = TTLCache(maxsize=maxsize)
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x1f{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> list[float] | None:
+        vector = self.memory.get(key)
+        if vector is not None or self._conn is None:
+            return vector
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        vector = array("f", row[0]).tolist()
+        self.memory.set(key, vector)
+        return vector
+
+    def set_many(self, items: dict[str, list[float]]):
+        for key, vector in items.items():
+            self.memory.set(key, vector)
+        if self._conn is None or not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -1,6 +1,9 @@
 import os
-from openai import AzureOpenAI
 from dotenv import load_dotenv
+from core import config
+from models.embedding_cache import EmbeddingCache
+from models.openai_client import get_sync_client, get_async_client, call_with_retry, acall_with_retry, usage_tracker
+from core.tracing import get_tracer
 
 load_dotenv()
 
@@ -12,11 +15,9 @@ class AzureOpenAIChat:
         self.api_key = os.getenv("AZURE_OPENAI_API_KEY")
         self.api_version = os.getenv("API_VERSION")
 
-        self.client = AzureOpenAI(
-            azure_endpoint=self.endpoint,
-            api_key=self.api_key,
-            api_version=self.api_version,
-        )
+        # クライアントはプロセス内で共有し、HTTP接続を使い回す
+        self.client = get_sync_client(self.endpoint, self.api_key, self.api_version)
+        self.async_client = get_async_client(self.endpoint, self.api_key, self.api_version)
         self.system_prompt = self._read_system_prompt()
 
     def _read_system_prompt(self):
@@ -35,7 +36,7 @@ class AzureOpenAIChat:
                 {"role": "user", "content": [{"type": "text", "text": user_prompt}]}
             ]
 
-    def chat(self, prompt: list, **kwargs):
+    def _params(self, **kwargs) -> dict:
         default_params = {
             "model": self.deployment,
             "max_tokens": 300,
@@ -46,26 +47,118 @@ class AzureOpenAIChat:
             "stream": False
         }
         default_params.update(kwargs)
+        return default_params
+
+    def _record_usage(self, response, params: dict):
+        # ストリーミングの場合は使用量が返らないため、リクエスト数だけを数える
+        usage = None if params["stream"] else response.usage
+        usage_tracker.record(self.deployment, usage)
+        get_tracer().record_usage(self.deployment, usage)
+
+    def chat(self, prompt: list, **kwargs):
+        params = self._params(**kwargs)
+        response = call_with_retry(self.deployment, self.client.chat.completions.create, messages=prompt, **params)
+        self._record_usage(response, params)
+        return response
 
-        response = self.client.chat.completions.create(messages=prompt, **default_params)
+    async def achat(self, prompt: list, **kwargs):
+        """
+        chat の非同期版。stream=True の場合は LimitedAsyncStream を返す（再試行はストリームの開始まで）。
+        読み終わるか閉じるまで、デプロイメントの同時実行数の枠を使い続ける。
+        """
+        params = self._params(**kwargs)
+        response = await acall_with_retry(self.deployment, self.async_client.chat.completions.create, messages=prompt, **params)
+        self._record_usage(response, params)
         return response
     
+
 class AzureOpenAIEmbedding:
     def __init__(self):
         self.api_key = os.getenv("EMBEDDING_API_KEY")
         self.api_version = os.getenv("EMBEDDING_API_VERSION")
         self.endpoint = os.getenv("EMBEDDING_ENDPOINT_URL")
-        self.client = AzureOpenAI(
-            api_key=self.api_key,
-            api_version=self.api_version,
-            azure_endpoint=self.endpoint
-        )
+        self.model = os.getenv("EMBEDDING_MODEL")
+        self.client = get_sync_client(self.endpoint, self.api_key, self.api_version)
+        self.async_client = get_async_client(self.endpoint, self.api_key, self.api_version)
+        self.cache = get_embedding_cache()
+
     def get_embedding(self, text: str) -> list[float]:
-        response = self.client.embeddings.create(
-            input=text,
-            model=os.getenv("EMBEDDING_MODEL")
-        )
-        return response.data[0].embedding
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """
+        複数のテキストをまとめて埋め込む。キャッシュにあるものはAPIを呼ばずに返す。
+
+        1回のリクエストに含める件数と文字数は EMBEDDING_BATCH_SIZE / EMBEDDING_BATCH_MAX_CHARS で制限する。
+        """
+        results, missing = self._lookup_cache(texts)
+        for batch in self._split_batches(list(missing.items())):
+            response = call_with_retry(self.model, self.client.embeddings.create,
+                                       input=[text for _, (text, _) in batch],
+                                       model=self.model)
+            self._store_batch(results, batch, response)
+        return results
+
+    async def aget_embedding(self, text: str) -> list[float]:
+        return (await self.aget_embeddings([text]))[0]
+
+    async def aget_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """get_embeddings の非同期版。"""
+        results, missing = self._lookup_cache(texts)
+        for batch in self._split_batches(list(missing.items())):
+            response = await acall_with_retry(self.model, self.async_client.embeddings.create,
+                                              input=[text for _, (text, _) in batch],
+                                              model=self.model)
+            self._store_batch(results, batch, response)
+        return results
+
+    def _lookup_cache(self, texts: list[str]) -> tuple[list, dict]:
+        results = [None] * len(texts)
+        # 同じテキストが複数回含まれていても1回だけ埋め込む
+        missing = {}
+        for i, text in enumerate(texts):
+            key = self.cache.key(self.model, text)
+            vector = self.cache.get(key)
+            if vector is not None:
+                results[i] = vector
+            else:
+                missing.setdefault(key, (text, []))[1].append(i)
+        return results, missing
+
+    def _store_batch(self, results: list, batch: list, response):
+        usage_tracker.record(self.model, response.usage)
+        get_tracer().record_usage(self.model, response.usage)
+        embeddings = {}
+        for (key, (_, indices)), data in zip(batch, sorted(response.data, key=lambda d: d.index)):
+            embeddings[key] = data.embedding
+            for i in indices:
+                results[i] = data.embedding
+        self.cache.set_many(embeddings)
+
+    def _split_batches(self, items: list):
+        batch = []
+        batch_chars = 0
+        for item in items:
+            text_length = len(item[1][0])
+            if batch and (len(batch) >= config.EMBEDDING_BATCH_SIZE or batch_chars + text_length > config.EMBEDDING_BATCH_MAX_CHARS):
+                yield batch
+                batch = []
+                batch_chars = 0
+            batch.append(item)
+            batch_chars += text_length
+        if batch:
+            yield batch
+
+
+_embedding_cache = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """プロセス内のすべての AzureOpenAIEmbedding で共有するキャッシュを返す。"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(maxsize=config.EMBEDDING_CACHE_SIZE,
+                                          path=config.EMBEDDING_CACHE_PATH)
+    return _embedding_cache
 
 
 # --- 使用例 ---
@@ -0,0 +1,322 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+
+import openai
+from openai import AzureOpenAI, AsyncAzureOpenAI
+
+from core import config
+
+
+# (endpoint, api_version, api_key) -> クライアント。同じエンドポイントへの接続をプロセス内で使い回す
+_sync_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_sync_client(endpoint: str, api_key: str, api_version: str) -> AzureOpenAI:
+    with _clients_lock:
+        key = (endpoint, api_version, api_key)
+        if key not in _sync_clients:
+            # 再試行は call_with_retry で行うので、SDK自身の再試行は無効にする
+            _sync_clients[key] = AzureOpenAI(azure_endpoint=endpoint, api_key=api_key, api_version=api_version,
+                                             max_retries=0, timeout=config.AZURE_OPENAI_TIMEOUT)
+        return _sync_clients[key]
+
+
+def get_async_client(endpoint: str, api_key: str, api_version: str) -> AsyncAzureOpenAI:
+    with _clients_lock:
+        key = (endpoint, api_version, api_key)
+        if key not in _async_clients:
+            _async_clients[key] = AsyncAzureOpenAI(azure_endpoint=endpoint, api_key=api_key, api_version=api_version,
+                                                   max_retries=0, timeout=config.AZURE_OPENAI_TIMEOUT)
+        return _async_clients[key]
+
+
+async def close_clients():
+    with _clients_lock:
+        async_clients = list(_async_clients.values())
+        sync_clients = list(_sync_clients.values())
+        _async_clients.clear()
+        _sync_clients.clear()
+    for client in async_clients:
+        await client.close()
+    for client in sync_clients:
+        client.close()
+
+
+class UsageTracker:
+    """デプロイメントごとのリクエスト数・トークン数・再試行回数を集計する。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage = {}
+
+    def _entry(self, deployment: str) -> dict:
+        return self._usage.setdefault(deployment, {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "retries": 0,
+            "throttled": 0,
+            "failures": 0,
+        })
+
+    def record(self, deployment: str, usage=None):
+        with self._lock:
+            entry = self._entry(deployment)
+            entry["requests"] += 1
+            if usage is not None:
+                entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                entry["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+                entry["total_tokens"] += getattr(usage, "total_tokens", 0) or 0
+
+    def record_retry(self, deployment: str, throttled: bool):
+        with self._lock:
+            entry = self._entry(deployment)
+            entry["retries"] += 1
+            if throttled:
+                entry["throttled"] += 1
+
+    def record_failure(self, deployment: str):
+        with self._lock:
+            self._entry(deployment)["failures"] += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {deployment: dict(entry) for deployment, entry in self._usage.items()}
+
+
+usage_tracker = UsageTracker()
+
+class ConcurrencyLimiter:
+    """
+    同期（スレッド）と非同期の呼び出しで共有する、同時実行数の上限。
+
+    待っている呼び出しは同期・非同期を問わず1つの待ち行列に並び、空いた枠は先に待ち始めたものへそのまま渡す
+    （非同期の呼び出しが途切れなくても、スレッドからの埋め込みなどが待たされ続けないように）。
+    非同期の待ちはイベントループをブロックしないように Future で待つ。
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._in_use = 0
+        self._lock = threading.Lock()
+        # ("sync", threading.Event) または ("async", (loop, future)) の待ち行列
+        self._waiters = collections.deque()
+
+    def acquire(self):
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return
+            event = threading.Event()
+            self._waiters.append(("sync", event))
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return
+            waiter = ("async", (loop, loop.create_future()))
+            self._waiters.append(waiter)
+        try:
+            await waiter[1][1]
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    handed_over = False
+                except ValueError:
+                    # キャンセルと同時に枠を渡されていた
+                    handed_over = True
+            if handed_over:
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                # 枠を返さずに、最も先に待ち始めた呼び出しへそのまま渡す
+                kind, waiter = self._waiters.popleft()
+                if kind == "sync":
+                    waiter.set()
+                    return
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(_wake, future)
+                    return
+                except RuntimeError:
+                    # イベントループが既に閉じられている
+                    continue
+            self._in_use -= 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+# デプロイメントごとの同時リクエスト数の制限（同期・非同期の呼び出しで共有する）
+_limiters = {}
+
+
+def _limiter(deployment: str) -> ConcurrencyLimiter:
+    with _clients_lock:
+        return _limiters.setdefault(deployment, ConcurrencyLimiter(config.AZURE_OPENAI_MAX_CONCURRENCY))
+
+
+class LimitedStream:
+    """ストリーミングの応答を読み終わるか閉じるまで、同時実行数の枠を保持する。"""
+    def __init__(self, stream, limiter: ConcurrencyLimiter):
+        self._stream = stream
+        self._limiter = limiter
+        self._released = False
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._limiter.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class LimitedAsyncStream(LimitedStream):
+    """LimitedStream の非同期版。"""
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            await self.close()
+
+    async def close(self):
+        try:
+            await self._stream.close()
+        finally:
+            self._release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    再試行までの待ち時間。Retry-After（retry-after-ms / retry-after）があればそれに従い、
+    無ければ指数バックオフにジッターを加える（同時に429を受けたリクエストが一斉に再送しないように）。
+    """
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return min(float(value) * scale, config.AZURE_OPENAI_BACKOFF_MAX) + random.uniform(0, 0.25)
+            except ValueError:
+                pass
+    return random.uniform(0, min(config.AZURE_OPENAI_BACKOFF_MAX, config.AZURE_OPENAI_BACKOFF_BASE * 2 ** attempt))
+
+
+def call_with_retry(deployment: str, func, *args, **kwargs):
+    """
+    同期クライアントの呼び出しを、同時実行数の制限と再試行付きで行う。
+    ストリーミングの場合は、ストリームを閉じるまで枠を保持する LimitedStream を返す。
+    """
+    limiter = _limiter(deployment)
+    for attempt in range(config.AZURE_OPENAI_MAX_RETRIES + 1):
+        try:
+            limiter.acquire()
+            try:
+                response = func(*args, **kwargs)
+            except BaseException:
+                limiter.release()
+                raise
+            if isinstance(response, openai.Stream):
+                return LimitedStream(response, limiter)
+            limiter.release()
+            return response
+        except RETRYABLE_ERRORS as e:
+            if attempt >= config.AZURE_OPENAI_MAX_RETRIES:
+                usage_tracker.record_failure(deployment)
+                raise
+            delay = retry_delay(e, attempt)
+            usage_tracker.record_retry(deployment, throttled=isinstance(e, openai.RateLimitError))
+            print(f"Azure OpenAI（{deployment}）の呼び出しに失敗したため{delay:.1f}秒後に再試行します：{type(e).__name__}")
+            time.sleep(delay)
+
+
+async def acall_with_retry(deployment: str, func, *args, **kwargs):
+    """
+    非同期クライアントの呼び出しを、同時実行数の制限と再試行付きで行う。
+    ストリーミングの場合は、ストリームを閉じるまで枠を保持する LimitedAsyncStream を返す。
+    """
+    limiter = _limiter(deployment)
+    for attempt in range(config.AZURE_OPENAI_MAX_RETRIES + 1):
+        try:
+            await limiter.aacquire()
+            try:
+                response = await func(*args, **kwargs)
+            except BaseException:
+                limiter.release()
+                raise
+            if isinstance(response, openai.AsyncStream):
+                return LimitedAsyncStream(response, limiter)
+            limiter.release()
+            return response
+        except RETRYABLE_ERRORS as e:
+            if attempt >= config.AZURE_OPENAI_MAX_RETRIES:
+                usage_tracker.record_failure(deployment)
+                raise
+            delay = retry_delay(e, attempt)
+            usage_tracker.record_retry(deployment, throttled=isinstance(e, openai.RateLimitError))
+            print(f"Azure OpenAI（{deployment}）の呼び出しに失敗したため{delay:.1f}秒後に再試行します：{type(e).__name__}")
+            await asyncio.sleep(delay)
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
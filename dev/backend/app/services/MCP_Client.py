@@ -1,17 +1,35 @@
 import asyncio
-from fastmcp.client.transports import SSETransport
-from fastmcp.client import Client
+import os
 from models import model  # AzureOpenAIChat を含む独自モジュール
 import json
 import datetime
+import time
+from core import config
 
 from services.prototype import Prototype
+from services.mcp_session_pool import MCPSessionPool
+from services.semantic_cache import SemanticResponseCache
+from services.warmup import WarmupStatus
+from services.context_builder import ContextBuilder, TokenCounter
+from core.tracing import get_tracer
+
+tracer = get_tracer()
 
 class MCPServers:
-    qdrant: str = "http://mcp-server-qdrant:8000/sse"
-    web_search: str = "http://mcp-server-web-search:8001/sse"
+    qdrant: str = os.getenv("MCP_QDRANT_URL", "http://mcp-server-qdrant:8000/sse")
+    web_search: str = os.getenv("MCP_WEB_SEARCH_URL", "http://mcp-server-web-search:8001/sse")
 
 class ChatAgent:
+    # fill_tool_args でサーバー側が値を埋める引数。関数呼び出しのスキーマには含めない
+    server_filled_args = {
+        "search_collection": {"collection_name", "query_vector", "payload_id", "limit", "query_text", "score_threshold"},
+    }
+    # コンテキストに入れるときのツールごとの見出し
+    context_titles = {
+        "search_collection": "ユーザーが所属している町内会に関する情報：",
+        "fetch_tool": "WEBでの検索結果（関係のない情報が入っているかもしれません）：",
+    }
+
     def __init__(self):
         self.mcp_endpoints = [MCPServers.qdrant,
                               MCPServers.web_search]
@@ -20,18 +38,64 @@ class ChatAgent:
         self.temp_dict = {}
         self.endpoint_tool_map = {}
         self.tool_descriptions = {}
-        Prototype().setup()
+        # "staged": ツール選択と引数生成を別々に行う / "function_calling": 1回の関数呼び出しでまとめて行う
+        self.planner_mode = config.CHAT_PLANNER_MODE
+        # エンドポイントごとに接続を張ったままにして、チャットのたびの接続・初期化を省く
+        self.mcp_pool = MCPSessionPool(self.mcp_endpoints,
+                                       max_in_flight=config.MCP_MAX_IN_FLIGHT,
+                                       health_check_interval=config.MCP_HEALTH_CHECK_INTERVAL,
+                                       connect_timeout=config.MCP_CONNECT_TIMEOUT,
+                                       on_tools_changed=self.register_tools)
+        # 地域ごとに、似た質問への応答を使い回すためのキャッシュ
+        self.response_cache = SemanticResponseCache(threshold=config.CHAT_CACHE_SIMILARITY_THRESHOLD,
+                                                    ttl=config.CHAT_CACHE_TTL,
+                                                    max_entries_per_region=config.CHAT_CACHE_MAX_ENTRIES_PER_REGION)
+        # ベクトルストアへの投入は warmup でバックグラウンドに行う
+        self.warmup_status = WarmupStatus()
+        # ツールの出力を重複除去・順位付けし、トークン数の上限内に収める
+        self.context_builder = ContextBuilder(max_tokens=config.CHAT_CONTEXT_MAX_TOKENS,
+                                              dedup_threshold=config.CHAT_CONTEXT_DEDUP_THRESHOLD,
+                                              source_titles=self.context_titles,
+                                              counter=TokenCounter(config.CHAT_CONTEXT_ENCODING))
         
-    async def get_tools_from_mcp_server(self):
-        for endpoint in self.mcp_endpoints:
-            transport = SSETransport(endpoint)
-            async with Client(transport=transport) as client:
-                tools = await client.list_tools()
-                self.endpoint_tool_map[endpoint] = tools
-                for tool in tools:
-                    self.tool_descriptions[tool.name] = tool.description
+    def register_tools(self, endpoint: str, tools: list):
+        """MCPサーバーへの(再)接続時に呼ばれ、ツール一覧を最新の内容に置き換える。"""
+        self.endpoint_tool_map[endpoint] = tools
+        self.tool_descriptions = {
+            tool.name: tool.description
+            for endpoint_tools in self.endpoint_tool_map.values()
+            for tool in endpoint_tools
+        }
         print(self.tool_descriptions)
 
+    async def get_tools_from_mcp_server(self):
+        await self.mcp_pool.start()
+
+    async def warmup(self):
+        """
+        MCPサーバーへの接続とベクトルストアへの投入を行う。起動をブロックしないように
+        lifespan からバックグラウンドタスクとして実行される。
+        """
+        self.warmup_status.start()
+        await self.get_tools_from_mcp_server()
+        error = None
+        for attempt in range(config.WARMUP_MAX_ATTEMPTS):
+            try:
+                await asyncio.to_thread(Prototype().setup,
+                                        on_region_updated=self.response_cache.invalidate,
+                                        on_progress=self.warmup_status.progress)
+                self.warmup_status.finish()
+                return
+            except Exception as e:
+                print(f"ベクトルストアへの投入に失敗しました（{attempt + 1}/{config.WARMUP_MAX_ATTEMPTS}回目）：{e}")
+                error = e
+                if attempt + 1 < config.WARMUP_MAX_ATTEMPTS:
+                    await asyncio.sleep(min(2 ** attempt, 60))
+        self.warmup_status.finish(error=error)
+
+    async def close(self):
+        await self.mcp_pool.close()
+
     def get_endpoint_by_tool_name(self, tool_name: str) -> str | None:
         for endpoint, tools in self.endpoint_tool_map.items():
             for tool in tools:
@@ -39,17 +103,8 @@ class ChatAgent:
                     return endpoint
         return None
 
-    def extract_tool_args_from_endpoints(self, endpoint_url: str, tool_name: str):
-        """
-        任意のツールに対して、引数情報（型と説明）を返す汎用関数。
-
-        Parameters:
-            endpoint_url (str): ツールが属するエンドポイントのURL
-            tool_name (str): 抽出対象のツール名
-
-        Returns:
-            dict: {'ツール名': {'args': {引数名: {'type': 型, 'description': 説明}}}} 形式
-        """
+    def get_tool_args_properties(self, endpoint_url: str, tool_name: str) -> dict:
+        """ツールの inputSchema から、引数モデル(args)の properties を取り出す。"""
         tools = self.endpoint_tool_map.get(endpoint_url, [])
         target_tool = next((t for t in tools if t.name == tool_name), None)
         if not target_tool:
@@ -66,6 +121,51 @@ class ChatAgent:
 
         if not args_properties:
             raise ValueError(f"ツール '{tool_name}' の inputSchema に有効な properties が見つかりません。")
+        return args_properties
+
+    def build_function_tools(self) -> list[dict]:
+        """
+        MCPサーバーから取得したツールのスキーマを、Chat Completions の tools（関数呼び出し）形式に変換する。
+
+        Returns:
+            list: [{'type': 'function', 'function': {'name': ..., 'description': ..., 'parameters': {...}}}, ...]
+        """
+        function_tools = []
+        for endpoint, tools in self.endpoint_tool_map.items():
+            for tool in tools:
+                try:
+                    args_properties = self.get_tool_args_properties(endpoint_url=endpoint, tool_name=tool.name)
+                except ValueError:
+                    continue
+                properties = {}
+                for arg_name, arg_info in args_properties.items():
+                    if arg_name in self.server_filled_args.get(tool.name, set()):
+                        continue
+                    prop = {key: arg_info[key] for key in ("type", "description", "items", "enum") if key in arg_info}
+                    properties[arg_name] = prop
+                function_tools.append({
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description or "",
+                        # サーバー側で埋める引数もあるため、必須にはしない
+                        "parameters": {"type": "object", "properties": properties},
+                    }
+                })
+        return function_tools
+
+    def extract_tool_args_from_endpoints(self, endpoint_url: str, tool_name: str):
+        """
+        任意のツールに対して、引数情報（型と説明）を返す汎用関数。
+
+        Parameters:
+            endpoint_url (str): ツールが属するエンドポイントのURL
+            tool_name (str): 抽出対象のツール名
+
+        Returns:
+            dict: {'ツール名': {'args': {引数名: {'type': 型, 'description': 説明}}}} 形式
+        """
+        args_properties = self.get_tool_args_properties(endpoint_url=endpoint_url, tool_name=tool_name)
 
         return {
             tool_name: {
@@ -141,35 +241,40 @@ class ChatAgent:
         return prompt
     
     async def use_mcp_server(self, user_query: str, region_id: str, tool_name: str, endpoint: str, tool_args: str):
-        tool_args_json = self.fill_tool_args(user_query=user_query,
-                                             region_id=region_id,
-                                             tool_args=tool_args,
-                                             endpoint=endpoint,
-                                             tool_name=tool_name)
+        tool_args_json = await self.fill_tool_args(user_query=user_query,
+                                                   region_id=region_id,
+                                                   tool_args=tool_args,
+                                                   endpoint=endpoint,
+                                                   tool_name=tool_name)
+        # 見出しの付与や整形は ContextBuilder で行うため、ここではツールの出力をそのまま返す
+        context = ""
         if endpoint == MCPServers.qdrant:
             if tool_name == "search_collection":
-                transport = SSETransport(endpoint)
-                async with Client(transport=transport) as client:
-                    result = await client.call_tool(tool_name, tool_args_json)
-                context = "\n\nユーザーが所属している町内会に関する情報：\n" + result[-1].text
+                with tracer.span("mcp_call", tool=tool_name):
+                    result = await self.mcp_pool.call_tool(endpoint, tool_name, tool_args_json)
+                context = result[-1].text
         elif endpoint == MCPServers.web_search:
             if tool_name == "fetch_tool":
-                transport = SSETransport(endpoint)
-                async with Client(transport=transport) as client:
-                    result = await client.call_tool(tool_name, tool_args_json)
-                context = "\n\nWEBでの検索結果（関係のない情報が入っているかもしれません）：" + result[-1].text
+                with tracer.span("mcp_call", tool=tool_name):
+                    result = await self.mcp_pool.call_tool(endpoint, tool_name, tool_args_json)
+                context = result[-1].text
         print(context)
         return context
     
-    def fill_tool_args(self, user_query: str, region_id: str, tool_args: str, endpoint: str, tool_name: str) -> dict:
+    async def fill_tool_args(self, user_query: str, region_id: str, tool_args: str, endpoint: str, tool_name: str) -> dict:
         tool_args_json = json.loads(tool_args)
         if endpoint == MCPServers.qdrant:
             if tool_name == "search_collection":
-                query_vector = self.embedding_client.get_embedding(user_query)
+                with tracer.span("embedding"):
+                    query_vector = await self.embedding_client.aget_embedding(user_query)
                 tool_args_json["args"]["collection_name"] = "region"
                 tool_args_json["args"]["query_vector"] = query_vector
                 tool_args_json["args"]["payload_id"] = region_id
                 tool_args_json["args"]["limit"] = 5
+                # 地名や日付などの語の一致でも検索できるように、質問文もそのまま渡す
+                tool_args_json["args"]["query_text"] = user_query
+                # 閾値はサーバー側の設定（QDRANT_SCORE_THRESHOLD）を使う
+                tool_args_json["args"]["score_threshold"] = None
             elif tool_name == "write_to_collection":
                 pass
                 # query_vector = self.embedding_client.get_embedding(user_query)
@@ -182,51 +287,270 @@ class ChatAgent:
                 pass
         return tool_args_json
     
-    async def chat(self, query: str, region_id: str, region_name: str) -> str:
+    def sort_selected_tools(self, tools: list[dict]) -> list[str]:
+        """
+        LLMが選んだツールを重複なく、エンドポイントの登録順・ツール名順に並べる。
+        LLMの出力順に左右されずにコンテキストの並びを決めるために使う。
+        """
+        endpoint_order = {endpoint: i for i, endpoint in enumerate(self.mcp_endpoints)}
+        tool_names = []
+        for tool in tools:
+            tool_name = tool["name"]
+            if tool_name in tool_names:
+                continue
+            if self.get_endpoint_by_tool_name(tool_name=tool_name) is None:
+                print(f"未登録のツールが選択されました：{tool_name}")
+                continue
+            tool_names.append(tool_name)
+        return sorted(tool_names, key=lambda name: (endpoint_order[self.get_endpoint_by_tool_name(tool_name=name)], name))
+
+    async def run_tool_pipeline(self, query: str, region_id: str, region_name: str, tool_name: str) -> str:
+        """1つのツールについて、引数の生成からツールの実行までを行いコンテキストを返す。"""
+        endpoint = self.get_endpoint_by_tool_name(tool_name=tool_name)
+        # 使用するツールの引数, 型などを取得
+        args_tools_dict = self.extract_tool_args_from_endpoints(endpoint_url=endpoint, tool_name=tool_name)
+        # ツールの引数を埋めるプロンプトを生成
+        fill_in_prompt = self.generate_use_tool_llm_prompt(tool_args_dict=args_tools_dict, user_query=query, region_name=region_name)
+        fill_in_prompt = self.chat_client.create_prompt(
+            user_prompt=fill_in_prompt,
+            use_system_prompt=True
+        )
+        # ツールの引数を埋める
+        with tracer.span("fill_args", tool=tool_name):
+            filled_args_tool = await self.chat_client.achat(fill_in_prompt)
+        tool_args = filled_args_tool.choices[0].message.content
+        print("ツールの引数を埋めた結果：", tool_args)
+        # ツールを実行してコンテキストを取得
+        return await self.use_mcp_server(user_query=query,
+                                         region_id=region_id,
+                                         tool_name=tool_name,
+                                         endpoint=endpoint,
+                                         tool_args=tool_args)
+
+    async def run_with_tool_timeout(self, tool_name: str, coro) -> str | None:
+        """ツールごとのタイムアウトを適用し、失敗した場合は None を返す。"""
+        timeout = config.MCP_TOOL_TIMEOUTS.get(tool_name, config.MCP_TOOL_TIMEOUT_DEFAULT)
+        try:
+            with tracer.span(f"tool.{tool_name}", tool=tool_name):
+                return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"ツール「{tool_name}」が{timeout}秒以内に完了しなかったため、結果を使わずに続行します。")
+        except Exception as e:
+            print(f"ツール「{tool_name}」の実行に失敗しました：{e}")
+        return None
+
+    def create_tool_selection_prompt(self, query: str) -> str:
+        return 'ユーザーはあなたのことを町内会の役員の方だと思っています。\nユーザーの質問を基に、最も適切なツールまたはツールの組み合わせを選択してください。\n以下の「使えるツール」の中から、質問に答えるために必要なものを1つ以上選んでください。  \n必ず「使えるツール」のリストにある名前から選んでください。それ以外は使用できません。  \n\n出力形式は**厳密に**以下に従ってください（理由の記載は不要です）：  \n{"tools": [{"name": "xxx"}, {"name": "xxx"}]}\n\n---\n\n' \
+               + f"ユーザーの質問: {query}\n\n使えるツール:\n{self.tool_descriptions}"
+
+    async def collect_context_staged(self, query: str, region_id: str, region_name: str, on_progress=None) -> tuple[str, bool]:
+        """
+        ツール選択 → ツールごとの引数生成 → ツール実行 の3段階でコンテキストを作る（従来の方式）。
+        """
         # ツール選択
-        user_prompt = 'ユーザーはあなたのことを町内会の役員の方だと思っています。\nユーザーの質問を基に、最も適切なツールまたはツールの組み合わせを選択してください。\n以下の「使えるツール」の中から、質問に答えるために必要なものを1つ以上選んでください。  \n必ず「使えるツール」のリストにある名前から選んでください。それ以外は使用できません。  \n\n出力形式は**厳密に**以下に従ってください（理由の記載は不要です）：  \n{"tools": [{"name": "xxx"}, {"name": "xxx"}]}\n\n---\n\n' \
-                      + f"ユーザーの質問: {query}\n\n使えるツール:\n{self.tool_descriptions}"
+        await notify_progress(on_progress, "tool_selection")
         prompt = self.chat_client.create_prompt(
-                user_prompt=user_prompt,
+                user_prompt=self.create_tool_selection_prompt(query),
                 use_system_prompt=True
             )
-        tool_response = self.chat_client.chat(prompt)
-        tool_response_text = tool_response.choices[0].message.content
-        print("選択したツール：", tool_response_text)
-        
-        # 選択したツールの引数を埋めてコンテキストを作成する。そして、統合する
-        parsed = json.loads(tool_response_text)
-        result_context = ""
-        for tool in parsed['tools']:
-            tool_name = tool["name"]
-            endpoint = self.get_endpoint_by_tool_name(tool_name=tool_name)
-            # 使用するツールの引数, 型などを取得
-            args_tools_dict = self.extract_tool_args_from_endpoints(endpoint_url=endpoint, tool_name=tool_name)
-            # ツールの引数を埋めるプロンプトを生成
-            fill_in_prompt = self.generate_use_tool_llm_prompt(tool_args_dict=args_tools_dict, user_query=query, region_name=region_name)
-            fill_in_prompt = self.chat_client.create_prompt(
-                user_prompt=fill_in_prompt,
-                use_system_prompt=True
-            )
-            # ツールの引数を埋める
-            filled_args_tool = self.chat_client.chat(fill_in_prompt)
-            tool_args = filled_args_tool.choices[0].message.content
-            print("ツールの引数を埋めた結果：", tool_args)
-            # ツールを実行してコンテキストを取得
-            context = await self.use_mcp_server(user_query=query,
-                                          region_id=region_id,
-                                          tool_name=tool_name,
-                                          endpoint=endpoint,
-                                          tool_args=tool_args)
-            result_context += context
-        # 最終的な応答生成
-        print(f"ユーザーの質問: {query}\n\nユーザーが所属している町内会名：{region_name}\n\n今日の日付:{datetime.datetime.now()}\n\n{result_context}")
-        prompt = self.chat_client.create_prompt(user_prompt=f"ユーザーの質問: {query}\n\nユーザーが所属している町内会名：{region_name}\n\n今日の日付:{datetime.datetime.now()}\n\n{result_context}", use_system_prompt=True)
-        response = self.chat_client.chat(prompt)
-        response_text = response.choices[0].message.content
+        with tracer.span("tool_selection", planner_mode="staged"):
+            tool_response = await self.chat_client.achat(prompt)
+            tool_response_text = tool_response.choices[0].message.content
+            print("選択したツール：", tool_response_text)
+
+            # 選択したツールごとの引数生成・実行を並列に行い、決まった順番でコンテキストを統合する
+            parsed = json.loads(tool_response_text)
+            tool_names = self.sort_selected_tools(parsed['tools'])
+            tracer.record_tool_selection(tool_names)
+        await notify_progress(on_progress, "retrieval", tools=tool_names)
+        contexts = await asyncio.gather(*[
+            self.run_with_tool_timeout(tool_name, self.run_tool_pipeline(query=query, region_id=region_id, region_name=region_name, tool_name=tool_name))
+            for tool_name in tool_names
+        ])
+        return self.build_context(query, tool_names, contexts)
+
+    async def collect_context_function_calling(self, query: str, region_id: str, region_name: str, on_progress=None) -> tuple[str, bool]:
+        """
+        関数呼び出しを使い、1回の応答でツールの選択と引数の生成をまとめて行ってからツールを実行する。
+        """
+        await notify_progress(on_progress, "tool_selection")
+        user_prompt = 'ユーザーはあなたのことを町内会の役員の方だと思っています。\nユーザーの質問に答えるために必要なツールを1つ以上呼び出してください。\n' \
+                      + f"今の日付と時間：{datetime.datetime.now()}\nあなたが担当している町内会：{region_name}\nユーザーの質問: {query}"
+        prompt = self.chat_client.create_prompt(user_prompt=user_prompt, use_system_prompt=True)
+        with tracer.span("tool_selection", planner_mode="function_calling"):
+            plan_response = await self.chat_client.achat(prompt,
+                                                         tools=self.build_function_tools(),
+                                                         tool_choice="auto")
+            tool_calls = plan_response.choices[0].message.tool_calls or []
+            planned_args = {}
+            for tool_call in tool_calls:
+                try:
+                    planned_args.setdefault(tool_call.function.name, json.loads(tool_call.function.arguments or "{}"))
+                except json.JSONDecodeError:
+                    print(f"ツール「{tool_call.function.name}」の引数を解釈できませんでした：{tool_call.function.arguments}")
+            print("選択したツールと引数：", planned_args)
+
+            tool_names = self.sort_selected_tools([{"name": name} for name in planned_args])
+            tracer.record_tool_selection(tool_names)
+        await notify_progress(on_progress, "retrieval", tools=tool_names)
+        contexts = await asyncio.gather(*[
+            self.run_with_tool_timeout(tool_name, self.use_mcp_server(user_query=query,
+                                                                      region_id=region_id,
+                                                                      tool_name=tool_name,
+                                                                      endpoint=self.get_endpoint_by_tool_name(tool_name=tool_name),
+                                                                      tool_args=json.dumps({"args": planned_args[tool_name]}, ensure_ascii=False)))
+            for tool_name in tool_names
+        ])
+        return self.build_context(query, tool_names, contexts)
+
+    def build_context(self, query: str, tool_names: list[str], contexts: list[str | None]) -> tuple[str, bool]:
+        """
+        ツールの結果からコンテキストを作る。
+
+        Returns:
+            tuple: (コンテキスト, 選択したツールがすべて成功したかどうか)
+        """
+        complete = all(context is not None for context in contexts)
+        results = [(tool_name, context or "") for tool_name, context in zip(tool_names, contexts)]
+        with tracer.span("context_build", complete=complete) as span:
+            context = self.context_builder.build(query, results)
+            if span is not None:
+                span.set_attribute("context_tokens", self.context_builder.counter.count(context))
+            return context, complete
+
+    async def collect_context(self, query: str, region_id: str, region_name: str, on_progress=None) -> tuple[str, bool]:
+        if self.planner_mode == "function_calling":
+            return await self.collect_context_function_calling(query=query, region_id=region_id, region_name=region_name, on_progress=on_progress)
+        return await self.collect_context_staged(query=query, region_id=region_id, region_name=region_name, on_progress=on_progress)
+
+    def create_answer_prompt(self, query: str, region_name: str, result_context: str) -> list:
+        user_prompt = f"ユーザーの質問: {query}\n\nユーザーが所属している町内会名：{region_name}\n\n今日の日付:{datetime.datetime.now()}\n\n{result_context}"
+        print(user_prompt)
+        return self.chat_client.create_prompt(user_prompt=user_prompt, use_system_prompt=True)
+
+    async def lookup_response_cache(self, query: str, region_id: str, started_at: float):
+        """
+        質問を埋め込み、同じ地域で似た質問への応答が保存されていればそれを返す。
+
+        Returns:
+            tuple: (キャッシュの結果 または None, 質問の埋め込み)
+        """
+        if not config.CHAT_CACHE_ENABLED:
+            return None, None
+        with tracer.span("cache_lookup"):
+            query_vector = await self.embedding_client.aget_embedding(query)
+            hit = self.response_cache.lookup(region_id, query_vector)
+            tracer.record_cache_lookup(region_id, hit is not None)
+        if hit is None:
+            self.response_cache.record_miss()
+            return None, query_vector
+        self.response_cache.record_hit(hit, time.perf_counter() - started_at)
+        print(f"キャッシュされた応答を使用します（類似度 {hit['similarity']:.3f}、元の質問：{hit['query']}）")
+        return hit, query_vector
+
+    def store_response_cache(self, query: str, region_id: str, query_vector, response_text: str, started_at: float,
+                             complete: bool, finish_reason: str | None):
+        """
+        応答をキャッシュに保存する。ツールの失敗・タイムアウトで一部のコンテキストが欠けた応答や、
+        途中で打ち切られた応答（finish_reason が stop 以外）は、同じ質問の利用者全員に返ってしまうので保存しない。
+        """
+        if query_vector is None or not response_text:
+            return
+        if not complete or finish_reason != "stop":
+            print("ツールの結果が欠けているか応答が完了していないため、応答をキャッシュしません")
+            return
+        self.response_cache.store(region_id, query, query_vector, response_text, time.perf_counter() - started_at)
+
+    async def chat(self, query: str, region_id: str, region_name: str) -> str:
+        with tracer.span("chat", region_id=region_id, planner_mode=self.planner_mode):
+            started_at = time.perf_counter()
+            hit, query_vector = await self.lookup_response_cache(query=query, region_id=region_id, started_at=started_at)
+            if hit is not None:
+                return hit["answer"]
+
+            result_context, complete = await self.collect_context(query=query, region_id=region_id, region_name=region_name)
+            # 最終的な応答生成
+            prompt = self.create_answer_prompt(query=query, region_name=region_name, result_context=result_context)
+            with tracer.span("generation"):
+                response = await self.chat_client.achat(prompt)
+            response_text = response.choices[0].message.content
+
+            print("応答:", response_text)
+            self.store_response_cache(query=query, region_id=region_id, query_vector=query_vector,
+                                      response_text=response_text, started_at=started_at,
+                                      complete=complete, finish_reason=response.choices[0].finish_reason)
+            return response_text
+
+    async def chat_stream(self, query: str, region_id: str, region_name: str):
+        """
+        chat と同じ処理を行い、途中経過と最終応答のトークンを順にイベントとして返す非同期ジェネレータ。
+
+        Yields:
+            dict: {'event': 'progress' | 'token' | 'done', 'data': {...}}
+        """
+        with tracer.span("chat_stream", region_id=region_id, planner_mode=self.planner_mode):
+            async for event in self._chat_stream(query=query, region_id=region_id, region_name=region_name):
+                yield event
+
+    async def _chat_stream(self, query: str, region_id: str, region_name: str):
+        started_at = time.perf_counter()
+        hit, query_vector = await self.lookup_response_cache(query=query, region_id=region_id, started_at=started_at)
+        if hit is not None:
+            yield {"event": "progress", "data": {"stage": "cache_hit"}}
+            yield {"event": "token", "data": {"text": hit["answer"]}}
+            yield {"event": "done", "data": {"text": hit["answer"]}}
+            return
+
+        events = asyncio.Queue()
+
+        async def on_progress(stage: str, **detail):
+            await events.put({"event": "progress", "data": {"stage": stage, **detail}})
+
+        # コンテキスト収集中の進捗イベントを、完了を待ちながら順に流す
+        context_task = asyncio.create_task(
+            self.collect_context(query=query, region_id=region_id, region_name=region_name, on_progress=on_progress)
+        )
+        try:
+            while not context_task.done() or not events.empty():
+                get_event = asyncio.create_task(events.get())
+                done, _ = await asyncio.wait({get_event, context_task}, return_when=asyncio.FIRST_COMPLETED)
+                if get_event in done:
+                    yield get_event.result()
+                else:
+                    get_event.cancel()
+            result_context, complete = context_task.result()
+        finally:
+            if not context_task.done():
+                context_task.cancel()
+
+        # 最終的な応答生成（トークン単位で返す）
+        yield {"event": "progress", "data": {"stage": "generation"}}
+        prompt = self.create_answer_prompt(query=query, region_name=region_name, result_context=result_context)
+        with tracer.span("generation", stream=True):
+            stream = await self.chat_client.achat(prompt, stream=True)
+            response_text = ""
+            finish_reason = None
+            # クライアントが途中で切断しても、ストリームを閉じて同時実行数の枠を返す
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].finish_reason:
+                        finish_reason = chunk.choices[0].finish_reason
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    response_text += token
+                    yield {"event": "token", "data": {"text": token}}
 
         print("応答:", response_text)
-        return response_text
+        self.store_response_cache(query=query, region_id=region_id, query_vector=query_vector,
+                                  response_text=response_text, started_at=started_at,
+                                  complete=complete, finish_reason=finish_reason)
+        yield {"event": "done", "data": {"text": response_text}}
+
+
+async def notify_progress(on_progress, stage: str, **detail):
+    if on_progress is not None:
+        await on_progress(stage, **detail)
 
 
 if __name__ == "__main__":
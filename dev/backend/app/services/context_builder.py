@@ -0,0 +1,145 @@
+import math
+import re
+import unicodedata
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken が無い環境では文字数からの概算を使う
+    tiktoken = None
+
+
+class TokenCounter:
+    """
+    プロンプトのトークン数を数える。tiktoken があれば実際のエンコーディングで数え、
+    無ければ「日本語は1文字1トークン、それ以外は4文字1トークン」として多めに見積もる。
+
+    tiktoken.get_encoding は初回にBPEファイルをダウンロードし、TIKTOKEN_CACHE_DIR（未設定なら一時ディレクトリ）に保存します。
+    コンテナではビルド時に TIKTOKEN_CACHE_DIR へ取得しておくので、起動後にネットワークへ接続しません（Dockerfile）。
+    """
+    def __init__(self, encoding_name: str = "o200k_base"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                print(f"tiktoken のエンコーディング「{encoding_name}」を読み込めないため概算を使います：{e}")
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        wide = sum(1 for char in text if ord(char) > 0x2e7f)
+        return wide + math.ceil((len(text) - wide) / 4)
+
+
+def shingles(text: str) -> set[str]:
+    """表記ゆれを除いた本文の文字2-gramの集合（重複判定と質問との重なりの計算に使う）。"""
+    text = "".join(re.findall(r"\w+", unicodedata.normalize("NFKC", text).lower()))
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def split_passages(text: str) -> list[str]:
+    """
+    ツールの出力を段落に分ける。
+    "[1] ..." のような番号付きの出力（search_collection）は番号ごと、それ以外は空行ごと、
+    空行が無ければ行ごとに分ける。
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if re.match(r"\[\d+\] ", text):
+        parts = re.split(r"(?:^|\n+)\[\d+\] ", text)
+    else:
+        parts = re.split(r"\n\s*\n", text)
+        if len(parts) == 1:
+            parts = text.split("\n")
+    return [part.strip() for part in parts if part.strip()]
+
+
+class ContextBuilder:
+    """
+    ツールの出力を段落に分け、重複を除き、質問との関連度で並べて、トークン数の上限内に収める。
+
+    関連度は「質問の文字2-gramが段落に含まれる割合」と「ツールが返した順位」の和です。
+    上限に収まった段落は、ツールごと・元の順番で並べ直してから見出しを付けて返します。
+    """
+    def __init__(self, max_tokens: int = 2000, dedup_threshold: float = 0.8, rank_weight: float = 0.5,
+                 source_titles: dict[str, str] | None = None, counter: TokenCounter | None = None):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.rank_weight = rank_weight
+        self.source_titles = source_titles or {}
+        self.counter = counter or TokenCounter()
+
+    def parse(self, results: list[tuple[str, str]]) -> list[dict]:
+        """(ツール名, 出力) のリストを段落のリストにする。"""
+        passages = []
+        for source_index, (source, text) in enumerate(results):
+            for position, passage in enumerate(split_passages(text or "")):
+                passages.append({
+                    "source": source,
+                    "source_index": source_index,
+                    "position": position,
+                    "text": passage,
+                    "shingles": shingles(passage),
+                })
+        return passages
+
+    def deduplicate(self, passages: list[dict]) -> list[dict]:
+        """文字2-gramのJaccard係数が dedup_threshold 以上の段落は、先に出てきた方だけを残す。"""
+        kept = []
+        for passage in passages:
+            duplicated = False
+            for other in kept:
+                union = len(passage["shingles"] | other["shingles"])
+                if union and len(passage["shingles"] & other["shingles"]) / union >= self.dedup_threshold:
+                    duplicated = True
+                    break
+            if not duplicated:
+                kept.append(passage)
+        return kept
+
+    def rank(self, query: str, passages: list[dict]) -> list[dict]:
+        query_shingles = shingles(query)
+        for passage in passages:
+            overlap = len(query_shingles & passage["shingles"]) / len(query_shingles) if query_shingles else 0.0
+            passage["score"] = overlap + self.rank_weight / (passage["position"] + 1)
+        return sorted(passages, key=lambda passage: passage["score"], reverse=True)
+
+    def pack(self, passages: list[dict]) -> list[dict]:
+        """関連度の高い順に、見出しを含めて max_tokens に収まるだけ段落を選ぶ。"""
+        selected = []
+        used = 0
+        sources = set()
+        for passage in passages:
+            tokens = self.counter.count(passage["text"]) + 1
+            if passage["source"] not in sources:
+                tokens += self.counter.count(self.source_titles.get(passage["source"], passage["source"])) + 2
+            if used + tokens > self.max_tokens:
+                continue
+            selected.append(passage)
+            sources.add(passage["source"])
+            used += tokens
+        return selected
+
+    def build(self, query: str, results: list[tuple[str, str]]) -> str:
+        passages = self.parse(results)
+        ranked = self.rank(query, self.deduplicate(passages))
+        selected = self.pack(ranked)
+        print(f"コンテキスト：{len(passages)}段落 → 重複除去後{len(ranked)}段落 → {len(selected)}段落を使用")
+
+        sections = {}
+        for passage in sorted(selected, key=lambda passage: (passage["source_index"], passage["position"])):
+            sections.setdefault(passage["source"], []).append(passage["text"])
+        return "".join(
+            f"\n\n{self.source_titles.get(source, source)}\n" + "\n".join(texts)
+            for source, texts in sections.items()
+        )
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
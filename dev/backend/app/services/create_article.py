@@ -4,11 +4,18 @@ class Article:
     def __init__(self):
         self.chat_engine = AzureOpenAIChat()
 
-    def create(self, text: str):
-        prompt = self.chat_engine.create_prompt(
+    def create_prompt(self, text: str) -> list:
+        return self.chat_engine.create_prompt(
             user_prompt=f"以下はポスターから抽出されたテキストです。これを元に、町内会用の掲示板記事を生成してください。プレーンテキストで見やすくまとめて書いてください。：\n{text}"
         )
-        response = self.chat_engine.chat(prompt)
+
+    def create(self, text: str):
+        response = self.chat_engine.chat(self.create_prompt(text))
+        article = response.choices[0].message.content
+        return article
+
+    async def acreate(self, text: str):
+        response = await self.chat_engine.achat(self.create_prompt(text))
         article = response.choices[0].message.content
         return article
     
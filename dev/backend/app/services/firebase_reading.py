@@ -124,6 +124,64 @@ def get_all_news_json(region_id, page_size=100, last_doc=None):
             ensure_ascii=False
         )
 
+def query_news_page(db, region_id, limit=None, cursor=None, order_by=None,
+                    descending=True, columns=None, since=None):
+    """
+    指定されたRegionID配下のニュースを、条件をFirestoreのクエリに反映して1ページ分取得
+    
+    Args:
+        db: Firestoreクライアント
+        region_id (str): 地域ID
+        limit (int): 1ページあたりの取得件数（Noneの場合は全件）
+        cursor (str): 前回取得最後のドキュメントID（ページネーション用）
+        order_by (str): 並び替えに使うフィールド（"Time" または "StartTime"）。
+            Noneの場合は従来どおりドキュメントID順（Timeの無いドキュメントも含む）。sinceがあればTime
+        descending (bool): 降順で並べるかどうか（order_byまたはsinceを指定した場合のみ）
+        columns (list[str]): 取得するカテゴリ（最大30件）
+        since (datetime): order_byのフィールド（省略時はTime）がこの時刻以降のものだけを取得
+        
+    Returns:
+        tuple: (ドキュメントのリスト, 次ページ用カーソル)
+    
+    Raises:
+        ValueError: カーソルに対応するドキュメントが存在しない場合
+    """
+    news_collection = (
+        db.collection('Regions')
+        .document(region_id)
+        .collection('News')
+    )
+
+    # クエリ構築（フィルタ・並び替え・件数をすべてFirestore側で処理する）
+    query = news_collection
+    if columns:
+        query = query.where('columns', 'in', list(columns))
+    if since and order_by is None:
+        order_by = 'Time'
+    if since:
+        query = query.where(order_by, '>=', since)
+    if order_by:
+        # フィールドで並べると、そのフィールドの無いドキュメントはFirestoreの仕様で結果に含まれない
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        query = query.order_by(order_by, direction=direction)
+    else:
+        query = query.order_by('__name__')
+
+    # ページネーション処理（前回取得位置から再開）
+    if cursor:
+        last_snapshot = news_collection.document(cursor).get()
+        if not last_snapshot.exists:
+            raise ValueError(f"cursor '{cursor}' に対応するニュースが見つかりません")
+        query = query.start_after(last_snapshot)
+    if limit:
+        query = query.limit(limit)
+
+    docs = list(query.stream())
+
+    # 次ページ用カーソル（取得件数がlimitに満たなければ最終ページ）
+    next_cursor = docs[-1].id if limit and len(docs) == limit else None
+    return docs, next_cursor
+
 # 使用例 ---------------------------------------------------
 if __name__ == "__main__":
     # 地域ID指定（実際のIDに置き換える）
@@ -0,0 +1,116 @@
+import asyncio
+import copy
+import threading
+
+from core.cache import TTLCache
+
+_MISSING = object()
+
+
+class FirestoreReadCache:
+    """
+    ほとんど変わらないのに頻繁に読まれるドキュメント（地域一覧・隣接地域・ユーザー情報）の読み込みキャッシュ。
+
+    種類ごとに有効期限を持ち、同じキーの読み込みが同時に来た場合はFirestoreへの読み込みを1回にまとめます。
+    書き込みを行ったときは invalidate で破棄します。複数のワーカーで動かす場合は start_listeners で
+    on_snapshot を登録すると、他のワーカーからの書き込みでもキャッシュが破棄されます。
+    """
+    def __init__(self, ttls: dict[str, float], maxsize: int = 10000, enabled: bool = True):
+        self.enabled = enabled
+        self._caches = {kind: TTLCache(maxsize=maxsize, ttl=ttl) for kind, ttl in ttls.items()}
+        # 読み込み中に invalidate されたら、古い内容を保存しないように世代を数える
+        self._generations = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._watches = []
+        self.hits = {kind: 0 for kind in ttls}
+        self.misses = {kind: 0 for kind in ttls}
+        self.invalidations = {kind: 0 for kind in ttls}
+
+    async def get_or_load(self, kind: str, key, loader):
+        """
+        キャッシュにあればそのコピーを返し、無ければ loader() を await して保存する。
+        """
+        if not self.enabled:
+            return await loader()
+        value = self._caches[kind].get(key, _MISSING)
+        if value is not _MISSING:
+            with self._lock:
+                self.hits[kind] += 1
+            return copy.deepcopy(value)
+        with self._lock:
+            self.misses[kind] += 1
+            generation = self._generations.get((kind, key), 0)
+        task = self._in_flight.get((kind, key))
+        if task is None:
+            task = asyncio.ensure_future(self._load(kind, key, loader, generation))
+            self._in_flight[(kind, key)] = task
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _load(self, kind: str, key, loader, generation: int):
+        try:
+            value = await loader()
+            with self._lock:
+                if self._generations.get((kind, key), 0) == generation:
+                    self._caches[kind].set(key, value)
+            return value
+        finally:
+            # invalidate の後に始まった読み込みは残す
+            if self._in_flight.get((kind, key)) is asyncio.current_task():
+                self._in_flight.pop((kind, key), None)
+
+    def invalidate(self, kind: str, key):
+        with self._lock:
+            self._generations[(kind, key)] = self._generations.get((kind, key), 0) + 1
+            self.invalidations[kind] += 1
+        self._caches[kind].delete(key)
+        # 読み込み中のものは古い内容かもしれないので、以降の呼び出しでは待たずに読み直す
+        self._in_flight.pop((kind, key), None)
+
+    # ---- on_snapshot ----
+    def start_listeners(self, db):
+        """
+        Regions・near_regions・Users の変更を監視し、変更されたドキュメントのキャッシュを破棄する。
+        コールバックはFirestoreのスレッドから呼ばれます。登録した時点で全ドキュメントの読み込みが発生します。
+        """
+        def on_regions(docs, changes, read_time):
+            self.invalidate("regions", "all")
+
+        def on_near_regions(docs, changes, read_time):
+            for change in changes:
+                self.invalidate("near_regions", change.document.reference.parent.parent.id)
+
+        def on_users(docs, changes, read_time):
+            for change in changes:
+                self.invalidate("users", change.document.id)
+
+        self._watches = [
+            db.collection("Regions").on_snapshot(on_regions),
+            db.collection_group("near_regions").on_snapshot(on_near_regions),
+            db.collection("Users").on_snapshot(on_users),
+        ]
+
+    def stop_listeners(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                kind: {
+                    "hits": self.hits[kind],
+                    "misses": self.misses[kind],
+                    "hit_rate": self.hits[kind] / (self.hits[kind] + self.misses[kind]) if self.hits[kind] + self.misses[kind] else 0.0,
+                    "invalidations": self.invalidations[kind],
+                    "entries": len(cache),
+                }
+                for kind, cache in self._caches.items()
+            }
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
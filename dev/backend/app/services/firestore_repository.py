@@ -0,0 +1,253 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import asyncio
+import functools
+
+from firebase_admin import firestore
+
+from services.firebase_reading import query_news_page
+from services.firestore_cache import FirestoreReadCache
+from services.news_fanout import NearRegionsNewsFanout
+from services.read_receipts import ReadReceiptIndex
+
+
+class FirestoreRepository:
+    """
+    Regions / Users / News / Messages / near_regions コレクションへのアクセスをまとめたリポジトリ。
+
+    firebase_admin の同期クライアントはすべて専用のスレッドプール上で実行するため、
+    呼び出し側は await するだけでイベントループを塞がずに済みます。
+    ドキュメントは (ドキュメントID, 内容の辞書) のタプルで返します。
+    地域一覧・隣接地域・ユーザー情報は cache を通して読み、このリポジトリでの書き込み時に破棄します。
+    """
+    def __init__(self, db, max_workers: int = 16, cache: FirestoreReadCache | None = None):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firestore")
+        self.near_news_fanout = NearRegionsNewsFanout(db, executor=self.executor)
+        self.read_receipts = ReadReceiptIndex(db)
+        self.cache = cache or FirestoreReadCache({"regions": 300.0, "near_regions": 300.0, "users": 60.0})
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        self.cache.stop_listeners()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _regions(self):
+        return self.db.collection("Regions")
+
+    def _users(self):
+        return self.db.collection("Users")
+
+    def _news(self, region_id: str):
+        return self._regions().document(region_id).collection("News")
+
+    def _near_regions(self, region_id: str):
+        return self._regions().document(region_id).collection("near_regions")
+
+    def _messages(self, user_id: str):
+        return self._users().document(user_id).collection("Messages")
+
+    @staticmethod
+    def _version(query, *time_fields) -> tuple:
+        """
+        クエリの結果が変わったかどうかを判定する値（件数と、時刻フィールドごとに最も新しいドキュメント）。
+        ドキュメントの本文は読まず、集計クエリ1回と時刻フィールドごとに1件の読み込みで済む。
+        追加・削除は件数で、編集は時刻フィールドの更新で検知する。
+        """
+        count = query.count().get()[0][0].value
+        newest = []
+        for field in time_fields:
+            docs = list(query.order_by(field, direction=firestore.Query.DESCENDING).limit(1).select([field]).stream())
+            newest.append((docs[0].id, docs[0].get(field)) if docs else None)
+        return (count, *newest)
+
+    # ---- Regions ----
+    async def add_region(self, name: str) -> str:
+        def _add():
+            # ドキュメントIDを自動生成して新しいドキュメントを追加
+            return self._regions().add({"Name": name})[1].id
+        try:
+            return await self._run(_add)
+        finally:
+            self.cache.invalidate("regions", "all")
+
+    async def set_region(self, region_id: str, name: str):
+        try:
+            await self._run(self._regions().document(region_id).set, {"Name": name})
+        finally:
+            self.cache.invalidate("regions", "all")
+
+    async def list_regions(self) -> list[tuple[str, dict]]:
+        def _list():
+            return [(doc.id, doc.to_dict()) for doc in self._regions().stream()]
+        return await self.cache.get_or_load("regions", "all", lambda: self._run(_list))
+
+    # ---- near_regions ----
+    async def list_near_regions(self, region_id: str) -> list[tuple[str, dict]]:
+        def _list():
+            return [(doc.id, doc.to_dict()) for doc in self._near_regions(region_id).stream()]
+        return await self.cache.get_or_load("near_regions", region_id, lambda: self._run(_list))
+
+    async def add_near_region(self, region_id: str, data: dict) -> str:
+        def _add():
+            return self._near_regions(region_id).add(data)[1].id
+        try:
+            return await self._run(_add)
+        finally:
+            self.cache.invalidate("near_regions", region_id)
+
+    async def delete_near_region(self, region_id: str, doc_id: str):
+        try:
+            await self._run(self._near_regions(region_id).document(doc_id).delete)
+        finally:
+            self.cache.invalidate("near_regions", region_id)
+
+    # ---- News ----
+    async def add_news(self, region_id: str, news_data: dict) -> str:
+        def _add():
+            return self._news(region_id).add(news_data)[1].id
+        return await self._run(_add)
+
+    async def get_news(self, region_id: str, news_id: str) -> dict | None:
+        def _get():
+            doc = self._news(region_id).document(news_id).get()
+            return doc.to_dict() if doc.exists else None
+        return await self._run(_get)
+
+    async def update_news(self, region_id: str, news_id: str, update_data: dict):
+        await self._run(self._news(region_id).document(news_id).update, update_data)
+
+    async def delete_news(self, region_id: str, news_id: str) -> bool:
+        def _delete():
+            news_ref = self._news(region_id).document(news_id)
+            if not news_ref.get().exists:
+                return False
+            news_ref.delete()
+            return True
+        return await self._run(_delete)
+
+    async def list_news_page(self, region_id: str, **kwargs) -> tuple[list[tuple[str, dict]], str | None]:
+        def _list():
+            docs, next_cursor = query_news_page(self.db, region_id, **kwargs)
+            return [(doc.id, doc.to_dict()) for doc in docs], next_cursor
+        return await self._run(_list)
+
+    async def news_version(self, region_id: str) -> tuple:
+        """地域のニュースの版（ETag用）。ニュースは編集時にもTimeが更新される。"""
+        return await self._run(self._version, self._news(region_id), "Time")
+
+    async def list_near_regions_news(self, region_id: str, limit: int, since: datetime | None = None) -> list[tuple[str, dict]]:
+        near_ids = NearRegionsNewsFanout.near_region_ids(data for _, data in await self.list_near_regions(region_id))
+        return await self.near_news_fanout.fetch(region_id, limit=limit, near_ids=near_ids, since=since)
+
+    async def near_regions_news_version(self, region_id: str) -> tuple:
+        """隣接地域のニュースの版（ETag用）。隣接地域ごとの版を並列に取得する。"""
+        near_ids = NearRegionsNewsFanout.near_region_ids(data for _, data in await self.list_near_regions(region_id))
+        versions = await asyncio.gather(*[self._run(self._version, self._news(near_id), "Time") for near_id in near_ids])
+        return tuple(zip(near_ids, versions))
+
+    # ---- Users ----
+    async def set_user(self, user_id: str, data: dict):
+        try:
+            await self._run(self._users().document(user_id).set, data)
+        finally:
+            self.cache.invalidate("users", user_id)
+
+    async def get_user(self, user_id: str) -> dict | None:
+        def _get():
+            doc = self._users().document(user_id).get()
+            return doc.to_dict() if doc.exists else None
+        return await self.cache.get_or_load("users", user_id, lambda: self._run(_get))
+
+    async def list_user_ids(self) -> list[str]:
+        def _list():
+            return [doc.id for doc in self._users().stream()]
+        return await self._run(_list)
+
+    async def list_region_users(self, region_id: str) -> list[tuple[str, dict]]:
+        def _list():
+            query = self._users().where("RegionID", "==", region_id)
+            return [(doc.id, doc.to_dict()) for doc in query.stream()]
+        return await self._run(_list)
+
+    # ---- Messages ----
+    async def list_messages(self, user_id: str, since: datetime | None = None) -> list[tuple[str, dict]]:
+        """
+        since を指定した場合は、その時刻以降に送信・既読化されたメッセージだけを返す。
+        UpdatedTime の無い古いメッセージ（既読化されていないもの）は SentTime で判定する。
+        """
+        def _list():
+            query = self._messages(user_id)
+            if not since:
+                return [(doc.id, doc.to_dict()) for doc in query.stream()]
+            docs = {}
+            for field in ("UpdatedTime", "SentTime"):
+                for doc in query.where(field, ">=", since).stream():
+                    docs[doc.id] = doc.to_dict()
+            return sorted(docs.items())
+        return await self._run(_list)
+
+    async def messages_version(self, user_id: str) -> tuple:
+        """ユーザーのメッセージの版（ETag用）。既読化では UpdatedTime が、直接の書き込みでは件数か SentTime が変わる。"""
+        return await self._run(self._version, self._messages(user_id), "UpdatedTime", "SentTime")
+
+    async def post_message(self, user_id: str, message_data: dict) -> str:
+        user = await self.get_user(user_id)
+        region_id = user.get("RegionID") if user else None
+
+        def _post():
+            # メッセージの追加と既読集計の更新を1つのバッチで書き込む
+            batch = self.db.batch()
+            new_doc = self._messages(user_id).document()
+            message_data["UpdatedTime"] = firestore.SERVER_TIMESTAMP
+            if region_id:
+                receipt_id = self.read_receipts.receipt_id(message_data["Title"], message_data["Text"], message_data["author"])
+                message_data["RegionID"] = region_id
+                message_data["ReceiptID"] = receipt_id
+                self.read_receipts.on_message_posted(batch, region_id, receipt_id, user_id, new_doc.id, message_data)
+            batch.set(new_doc, message_data)
+            batch.commit()
+            return new_doc.id
+        return await self._run(_post)
+
+    async def mark_message_read(self, user_id: str, message_id: str) -> bool:
+        def _mark():
+            message_ref = self._messages(user_id).document(message_id)
+            message = message_ref.get()
+            if not message.exists:
+                return False
+            d = message.to_dict()
+            if d.get("read"):
+                return True
+            batch = self.db.batch()
+            batch.update(message_ref, {"read": True, "UpdatedTime": firestore.SERVER_TIMESTAMP})
+            if d.get("RegionID") and d.get("ReceiptID"):
+                self.read_receipts.on_message_read(batch, d["RegionID"], d["ReceiptID"], user_id, message_id)
+            batch.commit()
+            return True
+        return await self._run(_mark)
+
+    async def list_region_users_messages(self, region_id: str) -> list[tuple[str, dict, list[tuple[str, dict]]]]:
+        def _list():
+            result = []
+            for user_doc in self._users().where("RegionID", "==", region_id).stream():
+                messages = [(doc.id, doc.to_dict()) for doc in self._messages(user_doc.id).stream()]
+                result.append((user_doc.id, user_doc.to_dict(), messages))
+            return result
+        return await self._run(_list)
+
+    async def read_receipt_summary(self, region_id: str) -> list[dict]:
+        return await self._run(self.read_receipts.summary, region_id)
+
+    async def rebuild_read_receipts(self, region_id: str) -> int:
+        return await self._run(self.read_receipts.rebuild, region_id)
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
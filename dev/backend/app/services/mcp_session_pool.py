@@ -0,0 +1,153 @@
+import asyncio
+from fastmcp.client.transports import SSETransport
+from fastmcp.client import Client
+from fastmcp.exceptions import ToolError
+
+
+class MCPSession:
+    """
+    1つのMCPサーバーとの長寿命セッション。
+
+    接続は専用のタスクの中で開いたまま保持し、一定間隔のpingで死活監視を行います。
+    切断や応答なしを検知すると再接続し、そのたびにツール一覧を取り直します。
+    """
+    def __init__(self, endpoint: str, max_in_flight: int = 8, health_check_interval: float = 30.0,
+                 connect_timeout: float = 10.0, on_tools_changed=None):
+        self.endpoint = endpoint
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        # (endpoint, tools) を受け取るコールバック。接続のたびに呼ばれる
+        self.on_tools_changed = on_tools_changed
+        self.client = None
+        self.tools = []
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._ready = asyncio.Event()
+        self._reconnect_requested = asyncio.Event()
+        # 現在の接続が閉じられたときにセットされる（接続のたびに作り直す）
+        self._connection_closed = asyncio.Event()
+        self._closed = False
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"mcp-session:{self.endpoint}")
+
+    async def _run(self):
+        backoff = 1.0
+        while not self._closed:
+            try:
+                async with Client(transport=SSETransport(self.endpoint)) as client:
+                    self.tools = await client.list_tools()
+                    self._connection_closed = asyncio.Event()
+                    self.client = client
+                    if self.on_tools_changed:
+                        self.on_tools_changed(self.endpoint, self.tools)
+                    self._ready.set()
+                    print(f"MCPサーバーに接続しました：{self.endpoint}")
+                    backoff = 1.0
+                    await self._watch(client)
+            except Exception as e:
+                print(f"MCPサーバーとの接続に失敗しました：{self.endpoint} ({e})")
+            finally:
+                self.client = None
+                self._connection_closed.set()
+                self._ready.clear()
+                self._reconnect_requested.clear()
+            if not self._closed:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def _watch(self, client: Client):
+        """再接続の要求が来るか、pingに失敗するまで接続を保持する。"""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._reconnect_requested.wait(), timeout=self.health_check_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                alive = await asyncio.wait_for(client.ping(), timeout=self.connect_timeout)
+            except Exception:
+                alive = False
+            if not alive:
+                print(f"MCPサーバーのヘルスチェックに失敗しました：{self.endpoint}")
+                return
+
+    async def wait_ready(self) -> Client:
+        self.start()
+        await asyncio.wait_for(self._ready.wait(), timeout=self.connect_timeout)
+        client = self.client
+        if client is None:
+            # 接続を待っている間に、その接続が閉じられた
+            raise ConnectionError(f"MCPサーバーとの接続が閉じられました：{self.endpoint}")
+        return client
+
+    async def call_tool(self, tool_name: str, args: dict):
+        for attempt in range(2):
+            client = await self.wait_ready()
+            connection_closed = self._connection_closed
+            try:
+                async with self._semaphore:
+                    return await client.call_tool(tool_name, args)
+            except ToolError:
+                # ツール自体のエラーは接続の問題ではないのでそのまま返す
+                raise
+            except Exception as e:
+                if attempt == 1:
+                    raise
+                # 失敗した接続がまだ使われている場合だけ再接続を要求する
+                # （他の呼び出しの失敗で既に張り直された新しい接続を閉じないように）
+                if self.client is client and not connection_closed.is_set():
+                    print(f"MCPサーバーへの呼び出しに失敗したため再接続します：{self.endpoint} ({e})")
+                    self._reconnect_requested.set()
+                # 同時実行数の枠を返した状態で、古い接続が閉じられるのを待ってから再試行する
+                await asyncio.wait_for(connection_closed.wait(), timeout=self.connect_timeout)
+
+    async def close(self):
+        self._closed = True
+        self._reconnect_requested.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class MCPSessionPool:
+    """
+    エンドポイントごとにMCPSessionを1つずつ保持し、ツール呼び出しを振り分けます。
+    """
+    def __init__(self, endpoints: list[str], max_in_flight: int = 8, health_check_interval: float = 30.0,
+                 connect_timeout: float = 10.0, on_tools_changed=None):
+        self.sessions = {
+            endpoint: MCPSession(endpoint,
+                                 max_in_flight=max_in_flight,
+                                 health_check_interval=health_check_interval,
+                                 connect_timeout=connect_timeout,
+                                 on_tools_changed=on_tools_changed)
+            for endpoint in endpoints
+        }
+
+    async def start(self):
+        """全エンドポイントへの接続を開始し、最初の接続を待つ。接続できないサーバーは裏で再試行を続ける。"""
+        for session in self.sessions.values():
+            session.start()
+        results = await asyncio.gather(*[session.wait_ready() for session in self.sessions.values()],
+                                       return_exceptions=True)
+        for endpoint, result in zip(self.sessions, results):
+            if isinstance(result, BaseException):
+                print(f"起動時にMCPサーバーへ接続できませんでした。再試行を続けます：{endpoint}")
+
+    async def call_tool(self, endpoint: str, tool_name: str, args: dict):
+        return await self.sessions[endpoint].call_tool(tool_name, args)
+
+    async def close(self):
+        await asyncio.gather(*[session.close() for session in self.sessions.values()])
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
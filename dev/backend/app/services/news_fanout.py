@@ -0,0 +1,72 @@
+from firebase_admin import firestore
+import asyncio
+import heapq
+import itertools
+
+
+class NearRegionsNewsFanout:
+    """
+    隣接地域のニュースを並列に取得し、新しい順に1本のストリームへ統合します。
+    """
+    def __init__(self, db, executor=None):
+        self.db = db
+        # Noneの場合はイベントループの既定のスレッドプールを使う
+        self.executor = executor
+
+    @staticmethod
+    def near_region_ids(near_regions) -> list[str]:
+        near_ids = []
+        for data in near_regions:
+            near_id = data.get("ID")
+            # 同じ地域が重複登録されていても1回だけ取得する
+            if near_id and near_id not in near_ids:
+                near_ids.append(near_id)
+        return near_ids
+
+    def get_near_region_ids(self, region_id: str) -> list[str]:
+        near_regions = self.db.collection("Regions").document(region_id).collection("near_regions")
+        return self.near_region_ids(doc.to_dict() for doc in near_regions.stream())
+
+    def _fetch_region_news(self, region_id: str, limit: int, since=None) -> list[tuple[str, dict]]:
+        query = self.db.collection("Regions").document(region_id).collection("News")
+        if since:
+            query = query.where("Time", ">=", since)
+        query = query.order_by("Time", direction=firestore.Query.DESCENDING).limit(limit)
+        return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+    async def fetch(self, region_id: str, limit: int = 50, near_ids: list[str] | None = None,
+                    since=None) -> list[tuple[str, dict]]:
+        """
+        隣接地域のニュースを新しい順に最大limit件取得する。
+
+        Parameters:
+            region_id (str): 基準となる地域ID
+            limit (int): 全地域合計の最大件数
+            near_ids (list): 隣接地域IDの一覧（キャッシュ済みの場合。Noneの場合はFirestoreから読む）
+            since (datetime): 指定した場合、Timeがこの時刻以降のニュースだけを取得
+
+        Returns:
+            list: [(ドキュメントID, ドキュメントの内容), ...] 形式（Timeの降順）
+        """
+        loop = asyncio.get_running_loop()
+        if near_ids is None:
+            near_ids = await loop.run_in_executor(self.executor, self.get_near_region_ids, region_id)
+        if not near_ids:
+            return []
+
+        # 1地域から全件が選ばれる場合もあるので、各地域ともlimit件まで取得する
+        streams = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, self._fetch_region_news, near_id, limit, since)
+            for near_id in near_ids
+        ])
+
+        # 各ストリームはTimeの降順に並んでいるので、そのままマージできる
+        merged = heapq.merge(*streams, key=lambda item: item[1]["Time"], reverse=True)
+        return list(itertools.islice(merged, limit))
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
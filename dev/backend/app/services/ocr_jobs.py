@@ -0,0 +1,140 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from core.cache import TTLCache
+from tools.ocr.preprocess import ImagePreprocessor
+from tools.ocr.ocr_cache import OCRCache, ArticleCache, phash
+
+
+class OCRJobManager:
+    """
+    ポスター画像のOCRと記事生成を、リクエストとは別のタスクで行うジョブとして管理する。
+
+    submit はジョブIDをすぐに返し、結果は get で取得するか、webhook_url にPOSTで通知します。
+    ジョブは ttl 秒後（または max_jobs 件を超えたとき古いものから）破棄されます。
+    """
+    def __init__(self, ocr_engine, article, preprocessor: ImagePreprocessor | None = None,
+                 ocr_cache: OCRCache | None = None, article_cache: ArticleCache | None = None,
+                 max_jobs: int = 1000, ttl: float = 3600.0,
+                 max_concurrency: int = 4, ocr_timeout: float = 30.0, webhook_url: str | None = None):
+        self.ocr_engine = ocr_engine
+        self.article = article
+        self.preprocessor = preprocessor or ImagePreprocessor()
+        # 同じポスターの再アップロードでは、OCRと記事生成をやり直さない
+        self.ocr_cache = ocr_cache or OCRCache()
+        self.article_cache = article_cache or ArticleCache()
+        self.jobs = TTLCache(maxsize=max_jobs, ttl=ttl)
+        self.ocr_timeout = ocr_timeout
+        self.webhook_url = webhook_url
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks = set()
+
+    def submit(self, content: bytes) -> dict:
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "text": None,
+            "article": None,
+            "error": None,
+        }
+        self.jobs.set(job["job_id"], job)
+        task = asyncio.create_task(self._run(job, content))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return dict(job)
+
+    def get(self, job_id: str) -> dict | None:
+        job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def _run(self, job: dict, content: bytes):
+        try:
+            async with self._semaphore:
+                job["status"] = "running"
+                job["text"] = await self.ocr_image(content)
+                print("OCR結果：", job["text"])
+                job["article"] = await self.create_article(job["text"])
+                print("生成した記事：", job["article"])
+                job["status"] = "succeeded"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = f"OCRに失敗しました: {e}"
+        finally:
+            job["finished_at"] = time.time()
+        await self.notify(job)
+
+    def _load(self, content: bytes):
+        image = self.preprocessor.load(content)
+        return image, phash(image)
+
+    async def ocr_image(self, content: bytes) -> str:
+        """
+        画像を前処理してOCRする。同じファイル、または再エンコード・再圧縮された同じ画像のOCR結果があればそれを返す。
+        """
+        text = self.ocr_cache.get_exact(content)
+        if text is not None:
+            print("キャッシュされたOCR結果を使用します（同じファイル）")
+            return text
+        image, image_hash = await asyncio.to_thread(self._load, content)
+        text = self.ocr_cache.get(image_hash)
+        if text is not None:
+            print(f"キャッシュされたOCR結果を使用します（pHash {image_hash:064x}）")
+        else:
+            prepared = await asyncio.to_thread(self.preprocessor.encode, image)
+            text = await self.ocr_engine.image_bytes_to_text_async(prepared, timeout=self.ocr_timeout)
+        self.ocr_cache.set(content, image_hash, text)
+        return text
+
+    async def create_article(self, text: str) -> str:
+        article = self.article_cache.get(text)
+        if article is not None:
+            print("キャッシュされた記事を使用します")
+            return article
+        article = await self.article.acreate(text)
+        self.article_cache.set(text, article)
+        return article
+
+    async def ocr_pages(self, contents: list[bytes], max_concurrency: int = 4) -> list[str]:
+        """
+        複数ページの画像を max_concurrency 件ずつ並列にOCRし、ページ順にテキストを返す。
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def ocr_page(content: bytes) -> str:
+            async with semaphore:
+                return await self.ocr_image(content)
+
+        return list(await asyncio.gather(*[ocr_page(content) for content in contents]))
+
+    @staticmethod
+    def merge_pages(texts: list[str]) -> str:
+        if len(texts) == 1:
+            return texts[0]
+        return "\n\n".join(f"（{page}ページ目）\n{text}" for page, text in enumerate(texts, start=1))
+
+    async def notify(self, job: dict):
+        if not self.webhook_url:
+            return
+        try:
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                response = await client.post(self.webhook_url, json=job)
+                response.raise_for_status()
+        except Exception as e:
+            print(f"OCRジョブ {job['job_id']} の結果を通知できませんでした：{e}")
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
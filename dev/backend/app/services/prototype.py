@@ -1,44 +1,83 @@
-import asyncio
-from fastmcp.client.transports import SSETransport
-from fastmcp.client import Client
-from models import model  # AzureOpenAIChat を含む独自モジュール
-import json
 import glob
 from tools.mcp_server.mcp_server_qdrant.QdrantManager import QdrantManager
 from models import model
+from core import config
 
 
 class Prototype:
-    def __init__(self):
+    collection_name = "region"
+
+    def __init__(self, batch_size: int = 64):
         self.embedding_client = model.AzureOpenAIEmbedding()
-        self.qdrant_manager = QdrantManager(host="qdrant", port=6333, ssl=False)
+        self.qdrant_manager = QdrantManager(host=config.QDRANT_HOST, port=config.QDRANT_PORT, ssl=False)
+        # 1回に埋め込み・書き込みを行う段落の数
+        self.batch_size = batch_size
         self.region_database_dict = {}
-        
+
     def _temp_read_qdrant(self):
-        for file_name in glob.glob(r"app/db/region_db/*.txt"):
+        # 各ファイルの1行目が地域ID、残りが本文。同じ地域IDのファイルは本文をまとめる
+        self.region_database_dict = {}
+        for file_name in sorted(glob.glob(r"app/db/region_db/*.txt")):
             print(file_name)
             with open(file_name, "r", encoding="utf-8") as f:
                 qdrant_text = str(f.read())
                 region_id, text = qdrant_text.split("\n", maxsplit=1)
-                self.region_database_dict[region_id] = text
+                self.region_database_dict.setdefault(region_id.strip(), []).append(text)
+
+    @staticmethod
+    def split_chunks(texts: list[str]) -> list[str]:
+        """本文を空行で段落に分け、空の段落と重複を除く（順番は保つ）。"""
+        chunks = []
+        for text in texts:
+            for point_text in text.split("\n\n"):
+                if point_text.strip() and point_text not in chunks:
+                    chunks.append(point_text)
+        return chunks
+
+    def ingest_region(self, region_id: str, chunks: list[str]) -> bool:
+        """
+        地域の段落をQdrantと同期する。新しい段落だけを埋め込んで書き込み、無くなった段落は削除する。
 
-    def setup(self):    
+        Returns:
+            bool: Qdrantの内容が変わった場合は True
+        """
+        wanted = {QdrantManager.point_id(region_id, chunk): chunk for chunk in chunks}
+        existing = self.qdrant_manager.list_point_ids(collection_name=self.collection_name, payload_id=region_id)
+        new_chunks = [chunk for point_id, chunk in wanted.items() if point_id not in existing]
+        stale_ids = existing - wanted.keys()
+
+        for start in range(0, len(new_chunks), self.batch_size):
+            batch = new_chunks[start:start + self.batch_size]
+            embeddings = self.embedding_client.get_embeddings(batch)
+            self.qdrant_manager.upsert_documents(collection_name=self.collection_name,
+                                                 documents=[(region_id, chunk, em) for chunk, em in zip(batch, embeddings)])
+        self.qdrant_manager.delete_points(collection_name=self.collection_name, point_ids=list(stale_ids))
+        print(f"region {region_id}: {len(new_chunks)} added, {len(stale_ids)} removed, {len(wanted) - len(new_chunks)} unchanged")
+        return bool(new_chunks or stale_ids)
+
+    def setup(self, on_region_updated=None, on_progress=None):
+        """
+        region_db のファイルをQdrantに反映する。何度実行しても、変更のあった段落だけが処理される。
+
+        Parameters:
+            on_region_updated: 内容が変わった地域IDを受け取るコールバック（応答キャッシュの破棄などに使う）
+            on_progress: (処理済みの地域数, 全地域数, 処理中の地域ID) を受け取るコールバック
+        """
         self._temp_read_qdrant()
-        region_exist = self.qdrant_manager.collection_exists(collection_name="region")
-        for id, text in self.region_database_dict.items():
-            if not region_exist:
-                texts = text.split("\n\n")
-                for point_text in texts:
-                    em = self.embedding_client.get_embedding(point_text)
-                    self.qdrant_manager.write_to_collection(collection_name="region",
-                                                            document=point_text,
-                                                            embedding=em,
-                                                            payload_id=id)
-                    print("writed setup qdrant!!!!!!!!!!!!!!!!!")
+        self.qdrant_manager.ensure_collection(self.collection_name)
+        regions_total = len(self.region_database_dict)
+        for regions_done, (region_id, texts) in enumerate(self.region_database_dict.items()):
+            if on_progress is not None:
+                on_progress(regions_done, regions_total, region_id)
+            updated = self.ingest_region(region_id, self.split_chunks(texts))
+            if updated and on_region_updated is not None:
+                on_region_updated(region_id)
+        if on_progress is not None:
+            on_progress(regions_total, regions_total, None)
         print("complete setup Prototype!!!!!!!!!!!!!!")
 
 """
 Copyright (c) 2025 YukiTakayama
 このソースコードは自由に使用、複製、改変、再配布することができます。
 ただし、著作権表示は削除しないでください。
-"""
\ No newline at end of file
+"""
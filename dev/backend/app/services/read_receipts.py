@@ -0,0 +1,144 @@
+from firebase_admin import firestore
+import hashlib
+
+
+class ReadReceiptIndex:
+    """
+    地域ごとのメッセージ既読状態の集計（Regions/{region_id}/ReadReceipts）を管理します。
+
+    同じ送信者・タイトル・本文のメッセージは、複数のユーザーに送られていても
+    1つの集計ドキュメントにまとめられます。同じユーザーに同じメッセージが複数回送られることもあるので、
+    集計には "ユーザーID/メッセージID" を未読・既読に分けて保存し、1通でも未読が残っているユーザーを未読とします。
+    """
+    collection_name = "ReadReceipts"
+
+    def __init__(self, db):
+        self.db = db
+
+    def _receipts_ref(self, region_id: str):
+        return self.db.collection("Regions").document(region_id).collection(self.collection_name)
+
+    @staticmethod
+    def receipt_id(title: str, text: str, author: str) -> str:
+        key = "\x1f".join([author, title, text])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def message_key(user_id: str, message_id: str) -> str:
+        # FirestoreのドキュメントIDには "/" を使えないので区切りに使える
+        return f"{user_id}/{message_id}"
+
+    def on_message_posted(self, batch, region_id: str, receipt_id: str, user_id: str, message_id: str, message_data: dict):
+        """メッセージ送信時に、そのメッセージを未読として集計に追加する。SentTime は最後に送信した時刻になる。"""
+        receipt_ref = self._receipts_ref(region_id).document(receipt_id)
+        batch.set(receipt_ref, {
+            "Title": message_data["Title"],
+            "author": message_data["author"],
+            "SentTime": message_data["SentTime"],
+            "unread_messages": firestore.ArrayUnion([self.message_key(user_id, message_id)]),
+        }, merge=True)
+
+    def on_message_read(self, batch, region_id: str, receipt_id: str, user_id: str, message_id: str):
+        """既読化したメッセージを未読から既読へ移す。"""
+        receipt_ref = self._receipts_ref(region_id).document(receipt_id)
+        key = self.message_key(user_id, message_id)
+        batch.set(receipt_ref, {
+            "unread_messages": firestore.ArrayRemove([key]),
+            "read_messages": firestore.ArrayUnion([key]),
+        }, merge=True)
+
+    @staticmethod
+    def users_by_state(d: dict) -> tuple[list[str], list[str]]:
+        """集計ドキュメントから (既読のユーザー, 未読のユーザー) を求める。"""
+        if "unread_messages" not in d and "read_messages" not in d:
+            # ユーザー単位で集計していた頃のドキュメント（rebuild で作り直される）
+            return d.get("read_users", []), d.get("unread_users", [])
+        unread_users = {key.split("/", 1)[0] for key in d.get("unread_messages", [])}
+        read_users = {key.split("/", 1)[0] for key in d.get("read_messages", [])} - unread_users
+        return sorted(read_users), sorted(unread_users)
+
+    def summary(self, region_id: str) -> list[dict]:
+        """
+        地域内のメッセージごとの既読・未読の人数とユーザー一覧を返す。
+
+        Returns:
+            list: SentTimeの降順に並んだ集計のリスト
+        """
+        query = self._receipts_ref(region_id).order_by("SentTime", direction=firestore.Query.DESCENDING)
+        result = []
+        for doc in query.stream():
+            d = doc.to_dict()
+            read_users, unread_users = self.users_by_state(d)
+            result.append({
+                "receipt_id": doc.id,
+                "Title": d.get("Title", ""),
+                "author": d.get("author", ""),
+                "SentTime": d.get("SentTime"),
+                "read_count": len(read_users),
+                "unread_count": len(unread_users),
+                "read_users": read_users,
+                "unread_users": unread_users,
+            })
+        return result
+
+    def rebuild(self, region_id: str) -> int:
+        """
+        地域内の全ユーザーのメッセージを走査して集計を作り直す。
+        集計導入前に送信されたメッセージの取り込みと、どのメッセージにも対応しなくなった集計の削除を行う。
+
+        Returns:
+            int: 作成した集計ドキュメントの数
+        """
+        receipts = {}
+        user_docs = self.db.collection("Users").where("RegionID", "==", region_id).stream()
+        for user_doc in user_docs:
+            messages_ref = self.db.collection("Users").document(user_doc.id).collection("Messages")
+            for msg_doc in messages_ref.select(["Title", "Text", "author", "SentTime", "read"]).stream():
+                msg_data = msg_doc.to_dict()
+                receipt_id = self.receipt_id(msg_data.get("Title", ""), msg_data.get("Text", ""), msg_data.get("author", ""))
+                receipt = receipts.setdefault(receipt_id, {
+                    "Title": msg_data.get("Title", ""),
+                    "author": msg_data.get("author", ""),
+                    "SentTime": msg_data.get("SentTime"),
+                    "read_messages": [],
+                    "unread_messages": [],
+                    "messages": [],
+                })
+                if msg_data.get("SentTime") and (receipt["SentTime"] is None or msg_data["SentTime"] > receipt["SentTime"]):
+                    receipt["SentTime"] = msg_data["SentTime"]
+                key = self.message_key(user_doc.id, msg_doc.id)
+                (receipt["read_messages"] if msg_data.get("read") else receipt["unread_messages"]).append(key)
+                receipt["messages"].append(msg_doc.reference)
+
+        # 1バッチあたりの書き込み上限(500)を超えないように分割して書き込む
+        writes = []
+        for receipt_doc in self._receipts_ref(region_id).select([]).stream():
+            if receipt_doc.id not in receipts:
+                writes.append(("delete", receipt_doc.reference, None))
+        for receipt_id, receipt in receipts.items():
+            # set（mergeなし）で、古い形式の read_users / unread_users も消える
+            writes.append(("set", self._receipts_ref(region_id).document(receipt_id), {
+                "Title": receipt["Title"],
+                "author": receipt["author"],
+                "SentTime": receipt["SentTime"],
+                "read_messages": sorted(receipt["read_messages"]),
+                "unread_messages": sorted(receipt["unread_messages"]),
+            }))
+            for message_ref in receipt["messages"]:
+                writes.append(("update", message_ref, {"RegionID": region_id, "ReceiptID": receipt_id}))
+        for start in range(0, len(writes), 500):
+            batch = self.db.batch()
+            for method, ref, data in writes[start:start + 500]:
+                if method == "delete":
+                    batch.delete(ref)
+                else:
+                    getattr(batch, method)(ref, data)
+            batch.commit()
+        return len(receipts)
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
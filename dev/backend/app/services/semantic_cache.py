@@ -0,0 +1,102 @@
+import threading
+import time
+import numpy as np
+
+
+class SemanticResponseCache:
+    """
+    地域ごとに、質問の埋め込みと応答を保存しておく意味的なキャッシュ。
+
+    新しい質問の埋め込みと保存済みの質問の埋め込みのコサイン類似度が threshold 以上なら、
+    ツール選択・検索・応答生成を行わずに保存済みの応答を返せるようにします。
+    """
+    def __init__(self, threshold: float = 0.95, ttl: float = 1800.0, max_entries_per_region: int = 256):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries_per_region = max_entries_per_region
+        # region_id -> [{'query', 'vector', 'answer', 'expires_at', 'latency'}, ...]
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, region_id: str, query_vector) -> dict | None:
+        """
+        最も類似度の高い有効なエントリを返す。閾値に満たなければ None。
+
+        Returns:
+            dict: {'query': 元の質問, 'answer': 応答, 'similarity': 類似度, 'latency': 元の処理時間}
+        """
+        with self._lock:
+            now = time.monotonic()
+            entries = [entry for entry in self._entries.get(region_id, []) if entry["expires_at"] > now]
+            self._entries[region_id] = entries
+            if not entries:
+                return None
+            matrix = np.stack([entry["vector"] for entry in entries])
+            similarities = matrix @ self._normalize(query_vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            entry = entries[best]
+            return {
+                "query": entry["query"],
+                "answer": entry["answer"],
+                "similarity": float(similarities[best]),
+                "latency": entry["latency"],
+            }
+
+    def store(self, region_id: str, query: str, query_vector, answer: str, latency: float):
+        with self._lock:
+            entries = self._entries.setdefault(region_id, [])
+            entries.append({
+                "query": query,
+                "vector": self._normalize(query_vector),
+                "answer": answer,
+                "expires_at": time.monotonic() + self.ttl,
+                "latency": latency,
+            })
+            # 上限を超えたら古いものから捨てる
+            del entries[:-self.max_entries_per_region]
+
+    def invalidate(self, region_id: str):
+        """地域の情報（Qdrantのドキュメントやニュース）が変わったときに、その地域の応答を破棄する。"""
+        with self._lock:
+            if self._entries.pop(region_id, None):
+                self.invalidations += 1
+
+    def record_hit(self, hit: dict, latency: float):
+        with self._lock:
+            self.hits += 1
+            self.latency_saved += max(hit["latency"] - latency, 0.0)
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved_seconds": self.latency_saved,
+                "invalidations": self.invalidations,
+                "entries": sum(len(entries) for entries in self._entries.values()),
+            }
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
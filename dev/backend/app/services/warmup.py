@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class WarmupStatus:
+    """
+    起動後にバックグラウンドで行う初期化（ベクトルストアへの投入など）の進み具合を保持します。
+
+    state は "pending" → "running" → "ready" または "failed" と変わります。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "pending"
+        self.regions_total = 0
+        self.regions_done = 0
+        self.current_region = None
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def start(self):
+        with self._lock:
+            self.state = "running"
+            self.started_at = time.time()
+            self.finished_at = None
+            self.error = None
+
+    def progress(self, regions_done: int, regions_total: int, current_region: str | None = None):
+        with self._lock:
+            self.regions_done = regions_done
+            self.regions_total = regions_total
+            self.current_region = current_region
+
+    def finish(self, error: Exception | None = None):
+        with self._lock:
+            self.state = "failed" if error else "ready"
+            self.error = str(error) if error else None
+            self.current_region = None
+            self.finished_at = time.time()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "regions_done": self.regions_done,
+                "regions_total": self.regions_total,
+                "current_region": self.current_region,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+            }
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -1,20 +1,111 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import VectorParams, Distance
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+from qdrant_client.http.models import Filter, FieldCondition, MatchValue, PointIdsList
+from qdrant_client.http.models import HnswConfigDiff, KeywordIndexParams, ScalarQuantization, ScalarQuantizationConfig, ScalarType
+from qdrant_client.http.models import SearchParams, QuantizationSearchParams
+from qdrant_client.http.models import PointStruct, SparseVector, SparseVectorParams, Modifier, Prefetch, FusionQuery, Fusion
+from qdrant_client.http.models import QueryResponse
+from qdrant_client.http.exceptions import UnexpectedResponse
+from collections import Counter
 import  dotenv
 import os
+import re
+import time
+import unicodedata
 import uuid
+import zlib
 import numpy as np
 
 dotenv.load_dotenv()
 
 
+def sparse_text_vector(text: str, k1: float = 1.2) -> SparseVector:
+    """
+    日本語の本文を、文字2-gramと英数字の単語からなる疎ベクトルにする（形態素解析器を使わない）。
+
+    値は出現回数を BM25 と同じ形で飽和させたもの。IDFはQdrant側（Modifier.IDF）で掛けるため、
+    地名・日付のような語の完全一致をBM25に近い重みで検索できます。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for segment in re.findall(r"\w+", text):
+        if len(segment) == 1:
+            tokens.append(segment)
+        else:
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+        # 「3丁目」「2025」「abc」などの英数字はひとまとまりでも扱う
+        tokens.extend(word for word in re.findall(r"[0-9a-z]+", segment) if len(word) > 1)
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        index = zlib.crc32(token.encode("utf-8"))
+        weights[index] = weights.get(index, 0.0) + tf * (k1 + 1) / (tf + k1)
+    return SparseVector(indices=list(weights.keys()), values=list(weights.values()))
+
+
 class QdrantManager:
     """
     Qdrantを操作することができます。
     """
-    def __init__(self, host: str = "localhost", port: int = 6333, ssl: bool = False):
+    # 決定的なポイントIDを作るための名前空間（同じ地域・同じ本文なら常に同じIDになる）
+    point_id_namespace = uuid.UUID("6f1c0a52-3f5e-4d5b-9a57-2f0d5b6c8e11")
+    # 語の一致で検索するための疎ベクトルの名前（密ベクトルは名前なしのまま）
+    sparse_vector_name = "text"
+
+    def __init__(self, host: str = "localhost", port: int = 6333, ssl: bool = False,
+                 quantization: str | None = os.getenv("QDRANT_QUANTIZATION") or None,
+                 hnsw_m: int = int(os.getenv("QDRANT_HNSW_M", "16")),
+                 hnsw_ef_construct: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100")),
+                 hnsw_ef: int | None = int(os.getenv("QDRANT_HNSW_EF")) if os.getenv("QDRANT_HNSW_EF") else None,
+                 tenant_index: bool = os.getenv("QDRANT_TENANT_INDEX", "false").lower() == "true",
+                 hybrid: bool = os.getenv("QDRANT_HYBRID", "true").lower() == "true",
+                 score_threshold: float | None = float(os.getenv("QDRANT_SCORE_THRESHOLD")) if os.getenv("QDRANT_SCORE_THRESHOLD") else None,
+                 collection_check_interval: float = float(os.getenv("QDRANT_COLLECTION_CHECK_INTERVAL", "300"))):
+        """
+        Parameters:
+            quantization (str | None): "int8" の場合、スカラー量子化したベクトルをメモリに置き、検索時に元のベクトルで再スコアリングする
+            hnsw_m (int): HNSWグラフの各ノードのリンク数
+            hnsw_ef_construct (int): HNSWグラフ構築時の探索幅
+            hnsw_ef (int | None): 検索時の探索幅（Noneの場合はQdrantの既定値）
+            tenant_index (bool): payload_id（地域ID）ごとにHNSWグラフを作り、地域単位の検索に最適化する
+            hybrid (bool): コレクションに疎ベクトルを持たせ、密ベクトルとの併用検索（RRF）を行う
+            score_threshold (float | None): 密ベクトル検索で、これより類似度の低い結果を捨てる
+            collection_check_interval (float): コレクションの状態（存在・疎ベクトルの有無）を問い合わせ直す間隔（秒）
+        """
         self.client = QdrantClient(url=f"{'https' if ssl else 'http'}://{host}:{port}", api_key=os.getenv("QDRANT_API_KEY"))
+        if quantization not in (None, "int8"):
+            raise ValueError(f"未対応の量子化方式です: {quantization}")
+        self.quantization = quantization
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.hnsw_ef = hnsw_ef
+        self.tenant_index = tenant_index
+        self.hybrid = hybrid
+        self.score_threshold = score_threshold
+        self.collection_check_interval = collection_check_interval
+        # コレクション名 -> (疎ベクトルを持っているか, 確認した時刻)。
+        # 書き込み・検索のたびに問い合わせないようにするが、他で削除・作り直された場合に備えて一定時間で確認し直す
+        self._collections = {}
+
+    def _hnsw_config(self) -> HnswConfigDiff:
+        if self.tenant_index:
+            # 全体のグラフは作らず、地域ごとのグラフだけを作る（検索は必ず地域で絞り込むため）
+            return HnswConfigDiff(m=0, payload_m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def _quantization_config(self):
+        if self.quantization == "int8":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        return None
+
+    def _search_params(self) -> SearchParams | None:
+        if self.quantization is None and self.hnsw_ef is None:
+            return None
+        return SearchParams(
+            hnsw_ef=self.hnsw_ef,
+            quantization=QuantizationSearchParams(rescore=True, oversampling=2.0) if self.quantization else None
+        )
 
     def create_collection(self, collection_name: str):
         self.client.create_collection(
@@ -22,43 +113,209 @@ class QdrantManager:
             vectors_config=VectorParams(
                     size=1536,  # 例: OpenAIのtext-embedding-ada-002のベクトルサイズ
                     distance=Distance.COSINE
-                )
+                ),
+            sparse_vectors_config={
+                self.sparse_vector_name: SparseVectorParams(modifier=Modifier.IDF)
+            } if self.hybrid else None,
+            hnsw_config=self._hnsw_config(),
+            quantization_config=self._quantization_config()
         )
+        self.create_payload_index(collection_name)
         print(f"Collection '{collection_name}' created successfully.")
+
+    def create_payload_index(self, collection_name: str):
+        """検索のたびに絞り込みに使う payload_id にキーワードインデックスを作る。"""
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name="payload_id",
+            field_schema=KeywordIndexParams(type="keyword", is_tenant=self.tenant_index),
+            wait=True
+        )
+
+    def _collection_state(self, collection_name: str, create: bool) -> bool | None:
+        """
+        コレクションが疎ベクトルを持っているかを返す。存在しない場合、create なら作成し、そうでなければ None を返す。
+
+        create の場合（投入時）は、疎ベクトルを持たない既存のコレクションを作り直す。
+        検索時には作成・作り直しを行わず、密ベクトルだけで検索する。
+        """
+        cached = self._collections.get(collection_name)
+        if cached is not None and time.monotonic() - cached[1] < self.collection_check_interval:
+            return cached[0]
+        if not self.collection_exists(collection_name=collection_name):
+            self._collections.pop(collection_name, None)
+            if not create:
+                return None
+            self.create_collection(collection_name)
+            hybrid = self.hybrid
+        else:
+            hybrid = self._update_collection(collection_name, recreate=create)
+        self._collections[collection_name] = (hybrid, time.monotonic())
+        return hybrid
+
+    def _update_collection(self, collection_name: str, recreate: bool) -> bool:
+        """既存のコレクションにインデックス・量子化の設定を反映し、疎ベクトルを持っているかを返す。"""
+        info = self.client.get_collection(collection_name=collection_name)
+        has_sparse = self.sparse_vector_name in (info.config.params.sparse_vectors or {})
+        if self.hybrid and not has_sparse:
+            # Qdrantは既存のコレクションに名前付きのベクトルを追加できないため、作り直して再投入する
+            if not recreate:
+                print(f"Collection '{collection_name}' is dense-only until it is re-ingested.")
+                return False
+            self.client.delete_collection(collection_name=collection_name)
+            self.create_collection(collection_name)
+            print(f"Collection '{collection_name}' had no sparse vectors and was recreated; all documents will be re-ingested.")
+            return True
+        if "payload_id" not in (info.payload_schema or {}):
+            self.create_payload_index(collection_name)
+            print(f"Payload index on 'payload_id' created for '{collection_name}'.")
+        if self.quantization and info.config.quantization_config is None:
+            self.client.update_collection(collection_name=collection_name,
+                                          quantization_config=self._quantization_config())
+            print(f"Quantization enabled for '{collection_name}'.")
+        return has_sparse
+
+    def ensure_collection(self, collection_name: str) -> bool:
+        """
+        コレクションが無ければ作成し、既存のコレクションにはインデックス・量子化の設定を反映する。
+        併用検索が有効で、既存のコレクションが疎ベクトルを持っていない場合は空のコレクションとして作り直す
+        （ポイントIDは本文から決まるので、投入時に全件が書き込み直される）。
+
+        Returns:
+            bool: 疎ベクトルを持っている（併用検索できる）かどうか
+        """
+        return self._collection_state(collection_name, create=True)
+
+    @classmethod
+    def point_id(cls, payload_id: str, document: str) -> str:
+        """地域IDと本文のハッシュから決まるポイントID。再投入しても重複しない。"""
+        return str(uuid.uuid5(cls.point_id_namespace, f"{payload_id}\x1f{document}"))
     
     def write_to_collection(self, collection_name: str, document: str, embedding: list, payload_id: str):
-        colection_exist = self.collection_exists(collection_name=collection_name)
-        if not colection_exist:
-            self.create_collection(collection_name)
-        points = [
-            {
-                "id": str(uuid.uuid4()),
-                "vector": embedding,
-                "payload": {"document":document,
-                            "payload_id":payload_id}
-            }
-        ]
-        self.client.upsert(
+        return self.upsert_documents(collection_name=collection_name,
+                                     documents=[(payload_id, document, embedding)])
+
+    def upsert_documents(self, collection_name: str, documents: list[tuple[str, str, list]], batch_size: int = 128):
+        """
+        (payload_id, document, embedding) のリストを、batch_size件ずつまとめて書き込む。
+
+        ポイントIDは point_id で決まるため、同じ内容を何度書き込んでも1件のままになる。
+        """
+        hybrid = self.ensure_collection(collection_name)
+        for start in range(0, len(documents), batch_size):
+            points = [
+                PointStruct(
+                    id=self.point_id(payload_id, document),
+                    vector={"": embedding, self.sparse_vector_name: sparse_text_vector(document)} if hybrid else embedding,
+                    payload={"document":document,
+                             "payload_id":payload_id}
+                )
+                for payload_id, document, embedding in documents[start:start + batch_size]
+            ]
+            self.client.upsert(
+                collection_name=collection_name,
+                points=points,
+                wait=True
+            )
+        print(f"{len(documents)} documents written to collection '{collection_name}' successfully.")
+        return True
+
+    def list_point_ids(self, collection_name: str, payload_id: str) -> set[str]:
+        """指定した payload_id を持つポイントのIDをすべて返す（ベクトルと本文は取得しない）。"""
+        point_ids = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=Filter(
+                    must=[
+                        FieldCondition(key="payload_id", match=MatchValue(value=payload_id))
+                    ]
+                ),
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            point_ids.update(str(point.id) for point in points)
+            if offset is None:
+                return point_ids
+
+    def delete_points(self, collection_name: str, point_ids: list[str]):
+        if not point_ids:
+            return
+        self.client.delete(
             collection_name=collection_name,
-            points=points
+            points_selector=PointIdsList(points=list(point_ids)),
+            wait=True
         )
-        print(f"Documents written to collection '{collection_name}' successfully.")
-        return True
     
-    def search_collection(self, collection_name: str, query_vector: list[float], payload_id: str, limit: int = 10):
-        results = self.client.query_points(
+    def search_collection(self, collection_name: str, query_vector: list[float], payload_id: str, limit: int = 10,
+                          query_text: str | None = None, score_threshold: float | None = None):
+        """
+        地域（payload_id）で絞り込んで検索する。
+
+        query_text があり、コレクションが疎ベクトルを持っている場合は、密ベクトルと疎ベクトルで
+        それぞれ候補を取り、Reciprocal Rank Fusion で順位を統合する。ベクトルは返さない。
+        検索ではコレクションを作成せず、存在しない場合は空の結果を返す。
+        """
+        hybrid = self._collection_state(collection_name, create=False)
+        if hybrid is None:
+            print(f"Collection '{collection_name}' does not exist.")
+            return QueryResponse(points=[])
+        try:
+            return self._query(collection_name, query_vector, payload_id, limit, query_text, score_threshold, hybrid)
+        except UnexpectedResponse as e:
+            if e.status_code != 404:
+                raise
+            # 確認した後に削除された場合
+            self._collections.pop(collection_name, None)
+            print(f"Collection '{collection_name}' does not exist.")
+            return QueryResponse(points=[])
+
+    def _query(self, collection_name: str, query_vector: list[float], payload_id: str, limit: int,
+               query_text: str | None, score_threshold: float | None, hybrid: bool):
+        score_threshold = self.score_threshold if score_threshold is None else score_threshold
+        query_filter = Filter(
+            must=[
+                FieldCondition(key="payload_id", match=MatchValue(value=payload_id))
+            ]
+        )
+        sparse_query = sparse_text_vector(query_text) if query_text else None
+        if not hybrid or not sparse_query or not sparse_query.indices:
+            return self.client.query_points(
+                collection_name=collection_name,
+                query=query_vector,
+                limit=limit,
+                query_filter=query_filter,
+                score_threshold=score_threshold,
+                search_params=self._search_params(),
+                with_payload=["document"],
+                with_vectors=False
+            )
+        candidates = limit * 4
+        return self.client.query_points(
             collection_name=collection_name,
-            query=query_vector,
+            prefetch=[
+                Prefetch(query=query_vector, filter=query_filter, limit=candidates,
+                         score_threshold=score_threshold, params=self._search_params()),
+                Prefetch(query=sparse_query, using=self.sparse_vector_name, filter=query_filter, limit=candidates),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            query_filter=query_filter,
             limit=limit,
-            query_filter = Filter(
-                must=[
-                    FieldCondition(key="payload_id", match=MatchValue(value=payload_id))
-                ]
-            )
+            with_payload=["document"],
+            with_vectors=False
+        )
 
+    @staticmethod
+    def format_results(results) -> str:
+        """検索結果を、プロンプトに入れる本文だけのテキストにする。"""
+        return "\n\n".join(
+            f"[{rank}] {point.payload['document'].strip()}"
+            for rank, point in enumerate(results.points, start=1)
         )
-        return results
-    
+
     def collection_exists(self, collection_name: str):
         judge = self.client.collection_exists(collection_name=collection_name)
         return judge
@@ -1,11 +1,13 @@
 from pydantic import Field, BaseModel
-from typing import List, Any
+from typing import List, Any, Optional
 
 class SearchCollectionInput(BaseModel):
     collection_name: str = Field(..., description="必ずNoneを返してください")
     query_vector: List[float] = Field(..., description="必ずNoneを返してください")
     payload_id: str = Field(..., description="必ずNoneを返してください")
     limit: int = Field(10, description="必ずNoneを返してください")
+    query_text: Optional[str] = Field(None, description="必ずNoneを返してください")
+    score_threshold: Optional[float] = Field(None, description="必ずNoneを返してください")
 
 class WriteToCollectionInput(BaseModel):
     collection_name: str = Field(..., description="必ずNoneを返してください。")
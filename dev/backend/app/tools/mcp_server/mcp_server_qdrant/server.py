@@ -1,3 +1,5 @@
+import os
+
 from mcp.server.fastmcp import FastMCP
 from QdrantManager import QdrantManager
 from schema import *
@@ -6,7 +8,7 @@ mcp = FastMCP("MCP_BaseServer",
               host="0.0.0.0",
               port=8000)
 
-qdrant_manager = QdrantManager(host="qdrant", port=6333, ssl=False)
+qdrant_manager = QdrantManager(host=os.getenv("QDRANT_HOST", "qdrant"), port=int(os.getenv("QDRANT_PORT", "6333")), ssl=False)
 
 @mcp.tool()
 def search_collection(args: SearchCollectionInput):
@@ -15,9 +17,12 @@ def search_collection(args: SearchCollectionInput):
         collection_name=args.collection_name,
         query_vector=args.query_vector,
         limit=args.limit,
-        payload_id=args.payload_id
+        payload_id=args.payload_id,
+        query_text=args.query_text,
+        score_threshold=args.score_threshold
     )
-    return results
+    # ベクトルやスコアは返さず、本文だけを返す（プロンプトのトークンを節約する）
+    return QdrantManager.format_results(results)
 
 
 def write_to_collection(args: WriteToCollectionInput):
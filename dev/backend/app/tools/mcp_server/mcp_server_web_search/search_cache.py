@@ -0,0 +1,72 @@
+from collections import OrderedDict
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize_query(query: str) -> str:
+    """全角・半角や大文字・小文字、空白の違いを吸収した検索語（キャッシュのキー）。"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip().lower()
+
+
+class SearchCache:
+    """
+    検索結果を、正規化した検索語をキーにして保存するTTL付きのLRUキャッシュ。
+
+    path を指定するとSQLiteにも保存し、サーバーを再起動しても有効期限内の結果を使えるようにします。
+    """
+    def __init__(self, maxsize: int = 512, ttl: float = 3600.0, path: str | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS search_results (key TEXT PRIMARY KEY, results TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._conn.execute("DELETE FROM search_results WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def get(self, key: str) -> list[str] | None:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                results, expires_at = item
+                if expires_at >= now:
+                    self._data.move_to_end(key)
+                    return results
+                del self._data[key]
+            if self._conn is None:
+                return None
+            row = self._conn.execute("SELECT results, expires_at FROM search_results WHERE key = ? AND expires_at >= ?", (key, now)).fetchone()
+            if row is None:
+                return None
+            results = json.loads(row[0])
+            self._set_memory(key, results, row[1])
+            return results
+
+    def set(self, key: str, results: list[str]):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._set_memory(key, results, expires_at)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO search_results (key, results, expires_at) VALUES (?, ?, ?)",
+                                   (key, json.dumps(results, ensure_ascii=False), expires_at))
+                self._conn.commit()
+
+    def _set_memory(self, key: str, results: list[str], expires_at: float):
+        self._data[key] = (results, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
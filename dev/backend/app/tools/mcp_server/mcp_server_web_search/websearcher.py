@@ -1,29 +1,137 @@
-from tavily import TavilyClient
+import asyncio
+import json
 import os
 
+from search_cache import SearchCache, normalize_query
 
-class MCPWebSearcher:
-    def __init__(self):
-        # API キーを設定してクライアントを生成
-        self.tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API"))
 
-    def answer(self, query: str) -> str:
-        """スニペットベースの要約と参考URL一覧を返す（文字列）"""
-        response = self.tavily_client.search(query)
+class TavilyBackend:
+    name = "tavily"
+
+    def __init__(self, min_score: float = 0.6):
+        from tavily import AsyncTavilyClient
+        # API キーを設定してクライアントを生成
+        self.client = AsyncTavilyClient(api_key=os.getenv("TAVILY_API"))
+        self.min_score = min_score
 
-        # スコア0.6以上のcontentを改行で結合してstrで返す
-        filtered_texts = [
+    async def search(self, query: str) -> list[str]:
+        response = await self.client.search(query)
+        # スコア0.6以上のcontentだけを返す
+        return [
             result["content"]
             for result in response.get("results", [])
-            if result.get("score", 0) >= 0.6
+            if result.get("score", 0) >= self.min_score
         ]
 
-        return "\n".join(filtered_texts)
+
+class DuckDuckGoBackend:
+    name = "duckduckgo"
+
+    def __init__(self, max_results: int = 5):
+        self.max_results = max_results
+
+    def _search(self, query: str) -> list[str]:
+        from duckduckgo_search import DDGS
+        with DDGS() as ddgs:
+            return [result["body"] for result in ddgs.text(query, max_results=self.max_results) if result.get("body")]
+
+    async def search(self, query: str) -> list[str]:
+        # duckduckgo_search は同期APIなのでスレッドで実行する
+        return await asyncio.to_thread(self._search, query)
+
+
+class StubBackend:
+    """
+    ネットワークに接続しない検索（オフラインでの動作確認用）。
+    path のJSON（{検索語: [結果, ...]}）に検索語があればそれを、無ければ固定の文を返す。
+    """
+    name = "stub"
+
+    def __init__(self, path: str | None = None):
+        self.results = {}
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                self.results = {normalize_query(query): results for query, results in json.load(f).items()}
+
+    async def search(self, query: str) -> list[str]:
+        return self.results.get(normalize_query(query), [f"「{query}」の検索結果（スタブ）"])
+
+
+def create_backend(name: str):
+    if name == "tavily":
+        return TavilyBackend()
+    if name == "duckduckgo":
+        return DuckDuckGoBackend()
+    if name == "stub":
+        return StubBackend(os.getenv("WEB_SEARCH_STUB_PATH") or None)
+    raise ValueError(f"未対応の検索バックエンドです: {name}")
+
+
+class MCPWebSearcher:
+    """
+    Web検索を非同期で行う。
+
+    - 正規化した検索語ごとに結果をキャッシュする
+    - 同じ検索語の検索が実行中なら、新しく検索せずにその結果を待つ
+    - 同時に実行する検索の数を max_concurrency までに制限する
+    - 主のバックエンドが primary_timeout 秒以内に応答しないか失敗した場合は、予備のバックエンドを使う
+    """
+    def __init__(self,
+                 backend: str = os.getenv("WEB_SEARCH_BACKEND", "tavily"),
+                 fallback: str | None = os.getenv("WEB_SEARCH_FALLBACK", "duckduckgo") or None,
+                 primary_timeout: float = float(os.getenv("WEB_SEARCH_PRIMARY_TIMEOUT", "5")),
+                 max_concurrency: int = int(os.getenv("WEB_SEARCH_MAX_CONCURRENCY", "4")),
+                 cache_ttl: float = float(os.getenv("WEB_SEARCH_CACHE_TTL", "3600")),
+                 cache_size: int = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512")),
+                 cache_path: str | None = os.getenv("WEB_SEARCH_CACHE_PATH") or None):
+        self.backend = create_backend(backend)
+        self.fallback = create_backend(fallback) if fallback and fallback != backend else None
+        self.primary_timeout = primary_timeout
+        self.cache = SearchCache(maxsize=cache_size, ttl=cache_ttl, path=cache_path)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # 正規化した検索語 -> 実行中の検索
+        self._in_flight = {}
+
+    async def _search_backends(self, query: str) -> list[str]:
+        async with self._semaphore:
+            try:
+                return await asyncio.wait_for(self.backend.search(query), timeout=self.primary_timeout)
+            except Exception as e:
+                if self.fallback is None:
+                    raise
+                reason = "タイムアウト" if isinstance(e, asyncio.TimeoutError) else e
+                print(f"{self.backend.name} での検索に失敗したため {self.fallback.name} を使います：{reason}")
+            return await self.fallback.search(query)
+
+    async def _search_and_cache(self, key: str, query: str) -> list[str]:
+        try:
+            results = await self._search_backends(query)
+            if results:
+                self.cache.set(key, results)
+            return results
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def search(self, query: str) -> list[str]:
+        key = normalize_query(query)
+        results = self.cache.get(key)
+        if results is not None:
+            return results
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._search_and_cache(key, query))
+            self._in_flight[key] = task
+        # 待っている呼び出しがキャンセルされても、同じ検索を待つ他の呼び出しには影響させない
+        return await asyncio.shield(task)
+
+    async def answer(self, query: str) -> str:
+        """検索結果の本文を空行区切りで結合して返す（文字列）"""
+        return "\n\n".join(await self.search(query))
 
 
 if __name__ == "__main__":
     searcher = MCPWebSearcher()
-    result_text = searcher.answer("大阪滝川地域活動 祭り 2025")
+    result_text = asyncio.run(searcher.answer("大阪滝川地域活動 祭り 2025"))
     print(result_text)
 
 
@@ -31,4 +139,4 @@ if __name__ == "__main__":
 Copyright (c) 2025 YukiTakayama
 このソースコードは自由に使用、複製、改変、再配布することができます。
 ただし、著作権表示は削除しないでください。
-"""
\ No newline at end of file
+"""
@@ -1,8 +1,9 @@
 from azure.cognitiveservices.vision.computervision import ComputerVisionClient
 from msrest.authentication import CognitiveServicesCredentials
-from PIL import Image
+import asyncio
 import io
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,38 +19,49 @@ class AzureVisionOCR:
 
         self.client = ComputerVisionClient(endpoint, CognitiveServicesCredentials(key))
 
-    def image_to_text(self, pil_image: Image.Image) -> str:
-        # PIL画像をバイト配列に変換（JPEG推奨）
-        buffered = io.BytesIO()
-        pil_image.save(buffered, format="JPEG")
-        content = buffered.getvalue()
-
-        # Azure Computer Visionのread APIは非同期なので処理開始
+    def submit(self, content: bytes) -> str:
+        """Azure Computer Visionのread APIは非同期なので処理を開始し、ジョブIDを返す。"""
         read_response = self.client.read_in_stream(io.BytesIO(content), raw=True)
-
-        # ジョブIDを取得
         operation_location = read_response.headers["Operation-Location"]
-        operation_id = operation_location.split("/")[-1]
+        return operation_location.split("/")[-1]
 
-        # 処理完了までポーリング（最大30秒程度）
-        import time
-        for _ in range(30):
-            result = self.client.get_read_result(operation_id)
-            if result.status.lower() not in ['notstarted', 'running']:
-                break
-            time.sleep(1)
-
-        if result.status != 'succeeded':
+    def get_result(self, operation_id: str):
+        """ジョブの状態を1回だけ問い合わせる。完了していなければ None を返す。"""
+        result = self.client.get_read_result(operation_id)
+        if result.status.lower() in ['notstarted', 'running']:
+            return None
+        if result.status.lower() != 'succeeded':
             raise RuntimeError(f"Azure OCR failed with status: {result.status}")
-
         # テキスト抽出
         lines = []
         for page in result.analyze_result.read_results:
             for line in page.lines:
                 lines.append(line.text)
-
         return "\n".join(lines)
 
+    @staticmethod
+    def poll_intervals(initial: float = 0.5, factor: float = 1.5, maximum: float = 4.0):
+        """ポーリングの待ち時間（最初は短く、だんだん長くする）。"""
+        interval = initial
+        while True:
+            yield interval
+            interval = min(interval * factor, maximum)
+
+    async def image_bytes_to_text_async(self, content: bytes, timeout: float = 30.0) -> str:
+        """
+        画像をOCRしてテキストを返す。イベントループを止めないように、
+        SDKの呼び出しはスレッドで実行し、待ち時間は asyncio.sleep で待つ。
+        """
+        operation_id = await asyncio.to_thread(self.submit, content)
+        deadline = time.monotonic() + timeout
+        for interval in self.poll_intervals():
+            text = await asyncio.to_thread(self.get_result, operation_id)
+            if text is not None:
+                return text
+            if time.monotonic() + interval > deadline:
+                raise RuntimeError("Azure OCR timed out")
+            await asyncio.sleep(interval)
+
 
 """
 Copyright (c) 2025 YukiTakayama
@@ -0,0 +1,82 @@
+from functools import lru_cache
+from PIL import Image
+import hashlib
+import numpy as np
+
+from core.cache import TTLCache
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(size: int) -> np.ndarray:
+    """直交化したDCT-IIの変換行列。"""
+    n = np.arange(size)
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def phash(image: Image.Image, hash_size: int = 16, highfreq_factor: int = 4) -> int:
+    """
+    画像の知覚ハッシュ（pHash）。縮小したグレースケール画像をDCTし、低周波の hash_size x hash_size 個の係数が
+    中央値より大きいかどうかで hash_size**2 ビットの値を作る。
+
+    再エンコード・再圧縮では変わらず、64ビットのdHashより細かいので、本文だけが違うポスターは別の値になる。
+    """
+    size = hash_size * highfreq_factor
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.Resampling.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(size)
+    coefficients = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    value = 0
+    for bit in (coefficients > np.median(coefficients)).flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+class OCRCache:
+    """
+    OCRの結果を、画像の pHash（256ビット）をキーにして保存する。
+
+    同じポスターを撮り直さずに再エンコード・再圧縮した画像は pHash が一致するのでヒットする。
+    近い値を同じ画像とみなすと本文だけが違うポスターのOCR結果を返してしまうため、完全に一致する場合だけヒットさせる。
+    アップロードされたバイト列のSHA-256でも保存し、全く同じファイルは画像を展開せずに返す。
+    """
+    def __init__(self, maxsize: int = 512, ttl: float = 86400.0):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def content_key(content: bytes) -> tuple[str, str]:
+        return ("sha256", hashlib.sha256(content).hexdigest())
+
+    def get_exact(self, content: bytes) -> str | None:
+        """アップロードされたファイルと全く同じ内容のOCR結果。"""
+        return self.entries.get(self.content_key(content))
+
+    def get(self, image_hash: int) -> str | None:
+        return self.entries.get(("phash", image_hash))
+
+    def set(self, content: bytes, image_hash: int, text: str):
+        self.entries.set(self.content_key(content), text)
+        self.entries.set(("phash", image_hash), text)
+
+
+class ArticleCache:
+    """生成した記事を、OCRテキストのハッシュをキーにして保存する。"""
+    def __init__(self, maxsize: int = 512, ttl: float = 86400.0):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> str | None:
+        return self.entries.get(self.key(text))
+
+    def set(self, text: str, article: str):
+        self.entries.set(self.key(text), article)
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -0,0 +1,60 @@
+from PIL import Image, ImageOps
+import io
+
+
+class ImageTooLargeError(ValueError):
+    """画像のバイト数・画素数が上限を超えている。"""
+
+
+class ImagePreprocessor:
+    """
+    OCRに送る前に画像を小さく・軽くする。
+
+    スマートフォンで撮ったポスターは4000px以上・数MBあることが多いので、
+    EXIFの向きを反映し、長辺を max_long_edge まで縮小し、グレースケールにしてから再エンコードします。
+    JPEGは Image.draft で縮小しながらデコードするため、元の解像度で展開するより速く省メモリです。
+    """
+    def __init__(self, max_long_edge: int = 2048, grayscale: bool = True, image_format: str = "JPEG",
+                 jpeg_quality: int = 85, max_pixels: int = 50_000_000):
+        if image_format not in ("JPEG", "PNG"):
+            raise ValueError(f"未対応の画像形式です: {image_format}")
+        self.max_long_edge = max_long_edge
+        self.grayscale = grayscale
+        self.image_format = image_format
+        self.jpeg_quality = jpeg_quality
+        self.max_pixels = max_pixels
+
+    def load(self, content: bytes) -> Image.Image:
+        image = Image.open(io.BytesIO(content))
+        # ヘッダーだけを読んだ段階で画素数を確認し、巨大な画像は展開しない
+        if image.width * image.height > self.max_pixels:
+            raise ImageTooLargeError(f"画像の画素数が大きすぎます（{image.width}x{image.height}）")
+        if image.format == "JPEG":
+            # EXIFで90度回転される場合も長辺は変わらないので、回転前に縮小デコードしてよい
+            image.draft("L" if self.grayscale else "RGB", (self.max_long_edge, self.max_long_edge))
+        image = ImageOps.exif_transpose(image)
+        if self.grayscale:
+            image = image.convert("L")
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail((self.max_long_edge, self.max_long_edge), Image.Resampling.LANCZOS)
+        return image
+
+    def encode(self, image: Image.Image) -> bytes:
+        buffered = io.BytesIO()
+        if self.image_format == "JPEG":
+            image.save(buffered, format="JPEG", quality=self.jpeg_quality)
+        else:
+            # 圧縮率よりもエンコードの速さを優先する
+            image.save(buffered, format="PNG", compress_level=1)
+        return buffered.getvalue()
+
+    def __call__(self, content: bytes) -> bytes:
+        return self.encode(self.load(content))
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -0,0 +1,337 @@
+"""
+ベンチマーク用のメモリ上のFirestore。
+
+バックエンドが使う firebase_admin の同期APIの範囲（collection / document / add / set(merge) / update /
+delete / get / stream / where / order_by / limit / start_after / select / count / batch と
+ArrayUnion・ArrayRemove・Increment・SERVER_TIMESTAMP）だけを実装しています。
+latency を指定すると、読み書き1回ごとにその秒数だけ待ち、実際のFirestoreの往復時間を模擬します。
+"""
+from collections import defaultdict
+import datetime
+import random
+import threading
+import time
+import uuid
+
+
+def _apply_transform(current, value):
+    kind = type(value).__name__
+    if kind == "ArrayUnion":
+        result = list(current or [])
+        result.extend(item for item in value.values if item not in result)
+        return result
+    if kind == "ArrayRemove":
+        return [item for item in (current or []) if item not in value.values]
+    if kind == "Increment":
+        return (current or 0) + value.value
+    if kind == "Sentinel":
+        return datetime.datetime.now(datetime.timezone.utc)
+    return _normalize(value)
+
+
+def _normalize(value):
+    # Firestoreはタイムゾーン付きの日時を返すので、タイムゾーンなしの日時はローカル時刻として変換する
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        return value.astimezone(datetime.timezone.utc)
+    return value
+
+
+def _copy(data: dict) -> dict:
+    return {key: list(value) if isinstance(value, list) else value for key, value in data.items()}
+
+
+def _compare(left, op: str, right) -> bool:
+    right = [_normalize(item) for item in right] if isinstance(right, (list, tuple)) else _normalize(right)
+    try:
+        if op == "==":
+            return left == right
+        if op == "!=":
+            return left != right
+        if op == "<":
+            return left < right
+        if op == "<=":
+            return left <= right
+        if op == ">":
+            return left > right
+        if op == ">=":
+            return left >= right
+        if op == "in":
+            return left in right
+        if op == "not-in":
+            return left not in right
+        if op == "array-contains":
+            return right in (left or [])
+        if op == "array-contains-any":
+            return any(item in (left or []) for item in right)
+    except TypeError:
+        return False
+    raise ValueError(f"未対応の演算子です: {op}")
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: dict | None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> dict | None:
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        return (self._data or {}).get(field)
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeFirestore", path: tuple, filters=(), orders=(), limit_count=None,
+                 start_after_snapshot=None, fields=None):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._start_after = start_after_snapshot
+        self._fields = fields
+
+    def _copy_with(self, **kwargs) -> "FakeQuery":
+        params = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit_count": self._limit,
+            "start_after_snapshot": self._start_after,
+            "fields": self._fields,
+        }
+        params.update(kwargs)
+        return FakeQuery(self._client, self._path, **params)
+
+    def where(self, field_path: str = None, op_string: str = None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy_with(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING"):
+        return self._copy_with(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._copy_with(limit_count=count)
+
+    def start_after(self, snapshot: FakeSnapshot):
+        return self._copy_with(start_after_snapshot=snapshot)
+
+    def select(self, field_paths):
+        return self._copy_with(fields=list(field_paths))
+
+    @staticmethod
+    def _value(doc_id: str, data: dict, field: str):
+        return doc_id if field == "__name__" else data.get(field)
+
+    def _matching(self) -> list[tuple[str, dict]]:
+        with self._client.lock:
+            docs = list(self._client.collections.get(self._path, {}).items())
+        docs = [(doc_id, data) for doc_id, data in docs
+                if all(_compare(data.get(field), op, value) for field, op, value in self._filters)]
+        # order_by のフィールドを持たないドキュメントは結果に含めない（Firestoreと同じ）
+        docs = [(doc_id, data) for doc_id, data in docs
+                if all(field == "__name__" or data.get(field) is not None for field, _ in self._orders)]
+        for field, direction in reversed(self._orders or (("__name__", "ASCENDING"),)):
+            docs.sort(key=lambda item: self._value(item[0], item[1], field), reverse=direction == "DESCENDING")
+        if self._start_after is not None:
+            ids = [doc_id for doc_id, _ in docs]
+            if self._start_after.id in ids:
+                docs = docs[ids.index(self._start_after.id) + 1:]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return docs
+
+    def stream(self):
+        self._client.wait()
+        for doc_id, data in self._matching():
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield FakeSnapshot(FakeDocumentReference(self._client, self._path + (doc_id,)), data)
+
+    def get(self):
+        return list(self.stream())
+
+    def count(self, alias: str | None = None) -> "FakeAggregationQuery":
+        return FakeAggregationQuery(self, alias or "count")
+
+
+class FakeAggregationResult:
+    def __init__(self, alias: str, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query: FakeQuery, alias: str):
+        self._query = query
+        self._alias = alias
+
+    def get(self):
+        # 本物と同じく、集計結果のリストのリストを返す（1回の往復で済む）
+        self._query._client.wait()
+        return [[FakeAggregationResult(self._alias, len(self._query._matching()))]]
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: "FakeFirestore", path: tuple):
+        super().__init__(client, path)
+        self.id = path[-1]
+
+    def document(self, document_id: str | None = None) -> "FakeDocumentReference":
+        return FakeDocumentReference(self._client, self._path + (document_id or uuid.uuid4().hex[:20],))
+
+    def add(self, document_data: dict, document_id: str | None = None):
+        reference = self.document(document_id)
+        reference.set(document_data)
+        return datetime.datetime.now(datetime.timezone.utc), reference
+
+
+class FakeDocumentReference:
+    def __init__(self, client: "FakeFirestore", path: tuple):
+        self._client = client
+        self._path = path
+        self.id = path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    def collection(self, collection_id: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self._client, self._path + (collection_id,))
+
+    def get(self, field_paths=None) -> FakeSnapshot:
+        self._client.wait()
+        with self._client.lock:
+            data = self._client.collections.get(self._path[:-1], {}).get(self.id)
+            return FakeSnapshot(self, _copy(data) if data is not None else None)
+
+    def _write(self, document_data: dict, merge: bool):
+        collection = self._client.collections[self._path[:-1]]
+        current = dict(collection.get(self.id) or {}) if merge else {}
+        for key, value in document_data.items():
+            current[key] = _apply_transform(current.get(key), value)
+        collection[self.id] = current
+
+    def set(self, document_data: dict, merge: bool = False):
+        self._client.wait()
+        with self._client.lock:
+            self._write(document_data, merge)
+
+    def update(self, field_updates: dict):
+        self._client.wait()
+        with self._client.lock:
+            if self.id not in self._client.collections.get(self._path[:-1], {}):
+                raise KeyError(f"ドキュメントが存在しません: {self.path}")
+            self._write(field_updates, merge=True)
+
+    def delete(self):
+        self._client.wait()
+        with self._client.lock:
+            self._client.collections.get(self._path[:-1], {}).pop(self.id, None)
+
+
+class FakeWriteBatch:
+    def __init__(self, client: "FakeFirestore"):
+        self._client = client
+        self._operations = []
+
+    def set(self, reference: FakeDocumentReference, document_data: dict, merge: bool = False):
+        self._operations.append(lambda: reference._write(document_data, merge))
+
+    def update(self, reference: FakeDocumentReference, field_updates: dict):
+        self._operations.append(lambda: reference._write(field_updates, merge=True))
+
+    def delete(self, reference: FakeDocumentReference):
+        self._operations.append(lambda: self._client.collections.get(reference._path[:-1], {}).pop(reference.id, None))
+
+    def commit(self):
+        # バッチは1回の往復でまとめて書き込む
+        self._client.wait()
+        with self._client.lock:
+            for operation in self._operations:
+                operation()
+        self._operations = []
+
+
+class FakeFirestore:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.RLock()
+        # コレクションのパス -> {ドキュメントID: 内容}
+        self.collections = defaultdict(dict)
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, collection_id: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, (collection_id,))
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def close(self):
+        pass
+
+
+def seed(db: FakeFirestore, regions: int = 5, users_per_region: int = 20, news_per_region: int = 100,
+         messages_per_user: int = 10, rng: random.Random | None = None) -> dict:
+    """
+    ベンチマーク用のデータを作る。近隣地域は前後の地域とする。
+    FakeFirestore の代わりにFirestoreエミュレーターのクライアントを渡すこともできます。
+
+    Returns:
+        dict: {'regions': [(地域ID, 名前)], 'users': [(ユーザーID, 地域ID)]}
+    """
+    rng = rng or random.Random(0)
+    # 投入中は待ち時間を入れない（エミュレーターの本物のクライアントには latency が無い）
+    latency = getattr(db, "latency", None)
+    if latency is not None:
+        db.latency = 0.0
+    now = datetime.datetime.now(datetime.timezone.utc)
+    columns = ["防災", "イベント", "お知らせ", "回覧板"]
+    region_ids = [f"region-{i:03d}" for i in range(regions)]
+    users = []
+    for i, region_id in enumerate(region_ids):
+        region_ref = db.collection("Regions").document(region_id)
+        region_ref.set({"Name": f"ベンチマーク町内会{i}"})
+        for near_id in {region_ids[i - 1], region_ids[(i + 1) % regions]} - {region_id}:
+            region_ref.collection("near_regions").add({"ID": near_id, "Name": f"近隣{near_id}"})
+        for n in range(news_per_region):
+            column = rng.choice(columns)
+            region_ref.collection("News").add({
+                "Title": f"お知らせ{n}",
+                "Text": f"{region_id} のお知らせ本文 {n}。" * 5,
+                "Time": now - datetime.timedelta(minutes=n * 37),
+                "columns": column,
+                "StartTime": now + datetime.timedelta(days=rng.randint(1, 30)) if column == "イベント" else None,
+            })
+        for u in range(users_per_region):
+            user_id = f"{region_id}-user-{u:03d}"
+            users.append((user_id, region_id))
+            user_ref = db.collection("Users").document(user_id)
+            user_ref.set({"Name": f"住民{u}", "RegionID": region_id, "Role": "member"})
+            for m in range(messages_per_user):
+                user_ref.collection("Messages").add({
+                    "Title": f"回覧{m}",
+                    "Text": f"回覧の本文 {m}",
+                    "SentTime": now - datetime.timedelta(hours=m),
+                    "read": rng.random() < 0.5,
+                    "author": "役員",
+                    "RegionID": region_id,
+                })
+    if latency is not None:
+        db.latency = latency
+    return {"regions": [(region_id, f"ベンチマーク町内会{i}") for i, region_id in enumerate(region_ids)], "users": users}
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -0,0 +1,148 @@
+"""
+ベンチマーク用の、Azure OpenAI互換の偽サーバー。
+
+/openai/deployments/{deployment}/chat/completions と /openai/deployments/{deployment}/embeddings に応答します。
+ChatAgent のプロンプトの内容から、ツール選択・ツールの引数・関数呼び出し・最終応答のどれかを判断して
+それらしい応答を返します。応答までの待ち時間と、429を返す割合を指定できます。
+
+実行例（dev/backend で実行）:
+    python benchmarks/fake_openai_server.py --port 8090 --latency 0.8 --jitter 0.3 --rate-limit 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = "ベンチマーク用の応答です。町内会の清掃当番は毎月第2日曜日の午前9時からです。詳しくは回覧板をご確認ください。"
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def create_app(latency: float = 0.5, jitter: float = 0.2, rate_limit: float = 0.0,
+               embedding_latency: float = 0.05, token_interval: float = 0.01, dimensions: int = 1536) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(0)
+
+    async def wait(base: float):
+        await asyncio.sleep(max(0.0, base + rng.uniform(-jitter, jitter) * (base > 0)))
+
+    def throttled():
+        if rate_limit and rng.random() < rate_limit:
+            return JSONResponse(status_code=429, headers={"Retry-After": "1"},
+                                content={"error": {"code": "429", "message": "Rate limit is exceeded."}})
+        return None
+
+    def reply_for(body: dict) -> dict:
+        """プロンプトからChatAgentのどの段階かを判断して、返すメッセージを作る。"""
+        if body.get("tools"):
+            names = [tool["function"]["name"] for tool in body["tools"]]
+            name = "search_collection" if "search_collection" in names else names[0]
+            return {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps({"query": "町内会 清掃当番"}, ensure_ascii=False)},
+            }]}
+        message = body["messages"][-1]["content"]
+        text = message if isinstance(message, str) else "".join(part.get("text", "") for part in message)
+        if '{"tools": [{"name": "xxx"}' in text:
+            content = json.dumps({"tools": [{"name": "search_collection"}]})
+        elif '"args"' in text:
+            content = json.dumps({"args": {"query": "町内会 清掃当番"}}, ensure_ascii=False)
+        else:
+            content = ANSWER
+        return {"role": "assistant", "content": content}
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        error = throttled()
+        if error is not None:
+            return error
+        await wait(latency)
+        message = reply_for(body)
+        prompt_tokens = count_tokens(json.dumps(body["messages"], ensure_ascii=False))
+        completion_tokens = count_tokens(message["content"] or json.dumps(message.get("tool_calls")))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if body.get("stream"):
+            async def stream():
+                content = message["content"] or ""
+                for i in range(0, len(content), 4):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": deployment,
+                             "choices": [{"index": 0, "delta": {"content": content[i:i + 4]}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(token_interval)
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": deployment,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": deployment,
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @app.post("/openai/deployments/{deployment}/embeddings")
+    async def embeddings(deployment: str, request: Request):
+        body = await request.json()
+        error = throttled()
+        if error is not None:
+            return error
+        await wait(embedding_latency)
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(inputs):
+            # 同じテキストには同じベクトルを返す
+            seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            data.append({"object": "embedding", "index": i, "embedding": vector.tolist()})
+        tokens = sum(count_tokens(str(text)) for text in inputs)
+        return {"object": "list", "data": data, "model": deployment,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fake Azure OpenAI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.5, help="チャットの応答までの秒数")
+    parser.add_argument("--jitter", type=float, default=0.2, help="待ち時間のばらつき（±秒）")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--token-interval", type=float, default=0.01, help="ストリーミングのチャンクの間隔（秒）")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="429を返す割合（0〜1）")
+    args = parser.parse_args()
+    app = create_app(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                     embedding_latency=args.embedding_latency, token_interval=args.token_interval)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -0,0 +1,292 @@
+"""
+バックエンドの負荷試験。チャット・ニュース一覧・メッセージ・OCRのリクエストを指定した割合で混ぜて送り、
+リクエストの種類ごとにスループットと p50 / p95 / p99 の応答時間を表示します。
+
+--spawn を指定すると、偽のAzure OpenAI・MCPサーバーの代わり・メモリ上のFirestoreを使ったバックエンドを
+このスクリプトが起動するので、外部サービスやネットワークが無くても同じ条件で繰り返し計測できます。
+
+実行例（dev/backend で実行）:
+    python benchmarks/load_test.py --spawn --duration 60 --concurrency 20 --mix chat=1,news=6,messages=3,ocr=0.5
+    python benchmarks/load_test.py --base-url http://localhost:8080 --api-key <BACKEND_API_KEY> --output baseline.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+CHAT_QUERIES = [
+    "次のゴミの日は？",
+    "清掃当番はいつ？",
+    "今週末に近くで開催されるイベントを教えて",
+    "町内会費の支払い方法は？",
+    "防災訓練の集合場所はどこ？",
+    "集会所を借りるにはどうすればいい？",
+]
+
+
+class Recorder:
+    """リクエストの種類ごとの応答時間とエラー数を記録する。"""
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name: str, latency: float, ok: bool):
+        self.latencies.setdefault(name, []).append(latency)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = {}
+        for name, latencies in sorted(self.latencies.items()):
+            quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+            result[name] = {
+                "count": len(latencies),
+                "errors": self.errors.get(name, 0),
+                "throughput": len(latencies) / elapsed,
+                "p50": quantiles[49],
+                "p95": quantiles[94],
+                "p99": quantiles[98],
+                "mean": statistics.mean(latencies),
+                "max": max(latencies),
+            }
+        return result
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, regions: list[str], users: list[tuple[str, str]],
+                 images: list[bytes], rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.regions = regions
+        self.users = users
+        self.images = images
+        self.rng = rng
+
+    async def request(self, name: str, method: str, url: str, expected: tuple = (200,), **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code in expected
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.record(name, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    # ---- シナリオ ----
+    async def chat(self):
+        region_id = self.rng.choice(self.regions)
+        await self.request("chat", "POST", "/api/v1/Chat", json={
+            "UserMessage": self.rng.choice(CHAT_QUERIES),
+            "RegionID": region_id,
+            "RegionName": f"ベンチマーク町内会{self.regions.index(region_id)}",
+        })
+
+    async def news(self):
+        # 一覧の1ページ目を見て、半分の利用者は次のページと隣接地域のニュースも見る
+        region_id = self.rng.choice(self.regions)
+        response = await self.request("news.list", "GET", f"/api/v1/regions/{region_id}/news", params={"limit": 20})
+        if response is None or self.rng.random() < 0.5:
+            return
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor:
+            await self.request("news.list", "GET", f"/api/v1/regions/{region_id}/news", params={"limit": 20, "cursor": cursor})
+        await self.request("news.near", "GET", f"/api/v1/regions/{region_id}/news/near_regions", params={"limit": 20})
+
+    async def messages(self):
+        user_id, _ = self.rng.choice(self.users)
+        response = await self.request("messages.list", "GET", "/api/v1/users/messages", params={"user_id": user_id})
+        if response is None:
+            return
+        unread = [message["id"] for message in response.json() if not message.get("read")]
+        if unread:
+            await self.request("messages.read", "POST", "/api/v1/user/update/read",
+                               json={"user_id": user_id, "message_id": self.rng.choice(unread)})
+        if self.rng.random() < 0.1:
+            await self.request("messages.post", "POST", "/api/v1/users/post/messages", params={"user_id": user_id},
+                               json={"title": "ベンチマーク", "text": "負荷試験のメッセージです", "author": "役員"})
+
+    async def ocr(self):
+        await self.request("ocr", "POST", "/api/v1/upload-binary-image", content=self.rng.choice(self.images),
+                           headers={"Content-Type": "application/octet-stream"})
+
+    async def worker(self, scenarios: list, weights: list[float], deadline: float):
+        while time.monotonic() < deadline:
+            await self.rng.choices(scenarios, weights=weights)[0]()
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ("chat", "news", "messages", "ocr"):
+            raise argparse.ArgumentTypeError(f"未対応のシナリオです: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def create_images(count: int, rng: random.Random) -> list[bytes]:
+    """OCR用のポスター画像。同じ画像を何度も送るので、OCRキャッシュのヒットも含めて計測される。"""
+    from PIL import Image, ImageDraw
+
+    images = []
+    for i in range(count):
+        image = Image.new("RGB", (1240, 1754), "white")
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(0, 1100), rng.randrange(0, 1650)
+            draw.rectangle((x, y, x + rng.randrange(40, 140), y + rng.randrange(10, 100)), fill=(rng.randrange(256),) * 3)
+        buffered = io.BytesIO()
+        image.save(buffered, format="PNG")
+        images.append(buffered.getvalue())
+    return images
+
+
+def print_report(summary: dict, elapsed: float):
+    print(f"\n計測時間 {elapsed:.1f}秒")
+    print(f"{'request':<15}{'count':>8}{'errors':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}{'max':>9}")
+    for name, s in summary.items():
+        print(f"{name:<15}{s['count']:>8}{s['errors']:>8}{s['throughput']:>9.2f}"
+              f"{s['p50']:>9.3f}{s['p95']:>9.3f}{s['p99']:>9.3f}{s['mean']:>9.3f}{s['max']:>9.3f}")
+
+
+# ---- --spawn で起動するプロセス ----
+def spawn_services(args) -> list[subprocess.Popen]:
+    python = sys.executable
+    commands = [
+        [python, os.path.join(BENCHMARK_DIR, "fake_openai_server.py"), "--port", str(args.openai_port),
+         "--latency", str(args.llm_latency), "--rate-limit", str(args.rate_limit)],
+        [python, os.path.join(BENCHMARK_DIR, "stub_mcp_server.py"), "--kind", "qdrant", "--port", str(args.qdrant_mcp_port),
+         "--latency", str(args.mcp_latency)],
+        [python, os.path.join(BENCHMARK_DIR, "stub_mcp_server.py"), "--kind", "web", "--port", str(args.web_mcp_port),
+         "--latency", str(args.mcp_latency)],
+        [python, os.path.join(BENCHMARK_DIR, "run_backend.py"), "--port", str(args.backend_port),
+         "--firestore-latency", str(args.firestore_latency), "--ocr-latency", str(args.ocr_latency),
+         "--regions", str(args.regions), "--users-per-region", str(args.users_per_region)],
+    ]
+    env = dict(os.environ,
+               BACKEND_API_KEY=args.api_key,
+               ENDPOINT_URL=f"http://127.0.0.1:{args.openai_port}",
+               EMBEDDING_ENDPOINT_URL=f"http://127.0.0.1:{args.openai_port}",
+               MCP_QDRANT_URL=f"http://127.0.0.1:{args.qdrant_mcp_port}/sse",
+               MCP_WEB_SEARCH_URL=f"http://127.0.0.1:{args.web_mcp_port}/sse")
+    log = open(os.path.join(BENCHMARK_DIR, "load_test_services.log"), "w", encoding="utf-8")
+    return [subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT) for command in commands]
+
+
+async def wait_until_ready(base_url: str, processes: list[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if any(process.poll() is not None for process in processes):
+                raise RuntimeError("ベンチマーク用のプロセスが終了しました。benchmarks/load_test_services.log を確認してください")
+            try:
+                if (await client.get("/api/v1/health/live")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError("バックエンドが起動しませんでした")
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    regions = [f"region-{i:03d}" for i in range(args.regions)]
+    users = [(f"{region_id}-user-{u:03d}", region_id) for region_id in regions for u in range(args.users_per_region)]
+    mix = args.mix
+    images = create_images(args.ocr_images, rng) if mix.get("ocr") else []
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits,
+                                 headers={"Authorization": f"Bearer {args.api_key}"}) as client:
+        recorder = Recorder()
+        load_test = LoadTest(client, recorder, regions, users, images, rng)
+        scenarios = [getattr(load_test, name) for name in mix]
+        weights = list(mix.values())
+
+        if args.warmup:
+            await asyncio.gather(*[load_test.worker(scenarios, weights, time.monotonic() + args.warmup)
+                                   for _ in range(args.concurrency)])
+            load_test.recorder = recorder = Recorder()
+
+        start = time.monotonic()
+        await asyncio.gather(*[load_test.worker(scenarios, weights, start + args.duration) for _ in range(args.concurrency)])
+        elapsed = time.monotonic() - start
+
+    summary = recorder.summary(elapsed)
+    print_report(summary, elapsed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items() if key != "api_key"},
+                       "elapsed": elapsed, "results": summary}, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を {args.output} に保存しました")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="backend load test")
+    parser.add_argument("--base-url", default=None, help="計測するバックエンド（--spawn の場合は省略）")
+    parser.add_argument("--api-key", default=os.getenv("BACKEND_API_KEY", "benchmark"))
+    parser.add_argument("--duration", type=float, default=30.0, help="計測する秒数")
+    parser.add_argument("--warmup", type=float, default=5.0, help="計測前に負荷をかける秒数（キャッシュや接続の準備）")
+    parser.add_argument("--concurrency", type=int, default=10, help="同時にリクエストを送る利用者の数")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("chat=1,news=6,messages=3,ocr=0.2"),
+                        help="シナリオの割合（例: chat=1,news=6,messages=3,ocr=0.2）")
+    parser.add_argument("--regions", type=int, default=5, help="テスト用データの地域数（run_backend.py と合わせる）")
+    parser.add_argument("--users-per-region", type=int, default=20)
+    parser.add_argument("--ocr-images", type=int, default=4, help="OCRで送る画像の種類の数")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="結果をJSONで保存するファイル")
+    # --spawn の設定
+    parser.add_argument("--spawn", action="store_true", help="偽のサービスとバックエンドを起動してから計測する")
+    parser.add_argument("--backend-port", type=int, default=18080)
+    parser.add_argument("--openai-port", type=int, default=18090)
+    parser.add_argument("--qdrant-mcp-port", type=int, default=18000)
+    parser.add_argument("--web-mcp-port", type=int, default=18001)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="偽のAzure OpenAIが429を返す割合")
+    parser.add_argument("--mcp-latency", type=float, default=0.05)
+    parser.add_argument("--firestore-latency", type=float, default=0.02)
+    parser.add_argument("--ocr-latency", type=float, default=1.5)
+    args = parser.parse_args()
+
+    if not args.spawn:
+        if not args.base_url:
+            parser.error("--base-url か --spawn を指定してください")
+        await run(args)
+        return
+
+    args.base_url = args.base_url or f"http://127.0.0.1:{args.backend_port}"
+    processes = spawn_services(args)
+    try:
+        await wait_until_ready(args.base_url, processes)
+        await run(args)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
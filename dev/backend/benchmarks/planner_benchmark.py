@@ -0,0 +1,92 @@
+"""
+ツール選択方式（staged / function_calling）ごとに、LLMの往復回数と応答時間を比較するベンチマーク。
+
+実行例（dev/backend で実行。.env と MCPサーバー・Qdrant が必要）:
+    python benchmarks/planner_benchmark.py --region-id <地域ID> --region-name <町内会名> --repeat 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from core import config  # noqa: E402
+from services.MCP_Client import ChatAgent  # noqa: E402
+
+DEFAULT_QUERIES = [
+    "次のゴミの日は？",
+    "清掃当番はいつ？",
+    "今週末に近くで開催されるイベントを教えて",
+    "町内会費の支払い方法は？",
+]
+
+
+class CountingChatClient:
+    """AzureOpenAIChat.chat / achat の呼び出し回数を数えるためのラッパー"""
+    def __init__(self, chat_client):
+        self.chat_client = chat_client
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.chat_client, name)
+
+    def chat(self, prompt: list, **kwargs):
+        self.calls += 1
+        return self.chat_client.chat(prompt, **kwargs)
+
+    async def achat(self, prompt: list, **kwargs):
+        self.calls += 1
+        return await self.chat_client.achat(prompt, **kwargs)
+
+
+async def run_mode(agent: ChatAgent, mode: str, queries: list[str], region_id: str, region_name: str, repeat: int):
+    agent.planner_mode = mode
+    latencies = []
+    round_trips = []
+    for _ in range(repeat):
+        for query in queries:
+            agent.chat_client.calls = 0
+            start = time.perf_counter()
+            await agent.chat(query=query, region_id=region_id, region_name=region_name)
+            latencies.append(time.perf_counter() - start)
+            round_trips.append(agent.chat_client.calls)
+    return latencies, round_trips
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="planner benchmark")
+    parser.add_argument("--region-id", required=True)
+    parser.add_argument("--region-name", required=True)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", default=["staged", "function_calling"])
+    parser.add_argument("--query", action="append", help="質問（複数指定可）。省略時は既定の質問を使う")
+    args = parser.parse_args()
+
+    # 同じ質問を繰り返すので、応答キャッシュが有効だと2回目以降がキャッシュヒットになり比較にならない
+    config.CHAT_CACHE_ENABLED = False
+    agent = ChatAgent()
+    agent.chat_client = CountingChatClient(agent.chat_client)
+    await agent.get_tools_from_mcp_server()
+    try:
+        queries = args.query or DEFAULT_QUERIES
+        print(f"{'mode':<18}{'runs':>6}{'LLM往復(平均)':>14}{'mean[s]':>10}{'p50[s]':>10}{'max[s]':>10}")
+        for mode in args.modes:
+            latencies, round_trips = await run_mode(agent, mode, queries, args.region_id, args.region_name, args.repeat)
+            print(f"{mode:<18}{len(latencies):>6}{statistics.mean(round_trips):>14.2f}"
+                  f"{statistics.mean(latencies):>10.2f}{statistics.median(latencies):>10.2f}{max(latencies):>10.2f}")
+    finally:
+        await agent.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -0,0 +1,134 @@
+"""
+外部サービスの代わりを使ってバックエンドを起動する（ベンチマーク用）。
+
+- Firestore: メモリ上の FakeFirestore（FIRESTORE_EMULATOR_HOST があればFirestoreエミュレーター）にテスト用のデータを投入して使う
+- Azure OpenAI: fake_openai_server.py（ENDPOINT_URL / EMBEDDING_ENDPOINT_URL）
+- MCPサーバー: stub_mcp_server.py（MCP_QDRANT_URL / MCP_WEB_SEARCH_URL）
+- Azure Computer Vision: 指定した待ち時間の後に固定の文章を返す
+
+環境変数が設定されていればそちらを優先するので、本物のサービスの一部だけを使うこともできます。
+.env は不要ですが、app/db/system_prompt.txt は必要です。
+
+実行例（dev/backend で実行）:
+    python benchmarks/run_backend.py --port 8080 --firestore-latency 0.02 --ocr-latency 1.5
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "app"))
+sys.path.insert(0, BENCHMARK_DIR)
+
+import uvicorn  # noqa: E402
+
+from fake_firestore import FakeFirestore, seed  # noqa: E402
+
+BENCHMARK_ENV = {
+    "BACKEND_API_KEY": "benchmark",
+    "ENDPOINT_URL": "http://127.0.0.1:8090",
+    "DEPLOYMENT_NAME": "gpt-4o-mini",
+    "AZURE_OPENAI_API_KEY": "benchmark",
+    "API_VERSION": "2024-10-21",
+    "EMBEDDING_ENDPOINT_URL": "http://127.0.0.1:8090",
+    "EMBEDDING_MODEL": "text-embedding-3-small",
+    "EMBEDDING_API_KEY": "benchmark",
+    "EMBEDDING_API_VERSION": "2024-10-21",
+    "MCP_QDRANT_URL": "http://127.0.0.1:8000/sse",
+    "MCP_WEB_SEARCH_URL": "http://127.0.0.1:8001/sse",
+    "AZURE_COMPUTER_VISION_ENDPOINT": "http://127.0.0.1:8091",
+    "AZURE_COMPUTER_VISION_KEY": "benchmark",
+    "QDRANT_HOST": "127.0.0.1",
+    # 認証情報は patch_firebase で差し替えるが、items.py が読み込み時に参照する
+    "FIREBASE_PRIVATE_KEY": "benchmark",
+    # ローカルにQdrantが無ければ、起動時の投入は1回で諦める
+    "WARMUP_MAX_ATTEMPTS": "1",
+}
+
+OCR_TEXT = "回覧板\n町内一斉清掃のお知らせ\n日時 10月第2日曜日 午前9時から\n集合場所 集会所前\n軍手とゴミ袋は町内会で用意します"
+
+
+def create_firestore(args):
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as gcloud_firestore
+        db = gcloud_firestore.Client(project=os.getenv("FIREBASE_PROJECT_ID", "benchmark"))
+        print(f"Firestoreエミュレーター（{os.environ['FIRESTORE_EMULATOR_HOST']}）を使用します")
+    else:
+        db = FakeFirestore(latency=args.firestore_latency)
+        print(f"メモリ上のFirestoreを使用します（1回あたり{args.firestore_latency}秒）")
+    if not args.no_seed:
+        data = seed(db, regions=args.regions, users_per_region=args.users_per_region,
+                    news_per_region=args.news_per_region, messages_per_user=args.messages_per_user)
+        print(f"テスト用データを投入しました：地域{len(data['regions'])}件、ユーザー{len(data['users'])}人")
+    return db
+
+
+def patch_firebase(db):
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: firebase_admin._apps.setdefault("[DEFAULT]", None)
+    firestore.client = lambda *args, **kwargs: db
+
+
+def patch_ocr(latency: float):
+    from tools.ocr.azure_vision_ocr import AzureVisionOCR
+
+    ready_at = {}
+
+    def __init__(self):
+        self.client = None
+
+    def submit(self, content: bytes) -> str:
+        operation_id = str(uuid.uuid4())
+        ready_at[operation_id] = time.monotonic() + latency
+        return operation_id
+
+    def get_result(self, operation_id: str):
+        if time.monotonic() < ready_at[operation_id]:
+            return None
+        del ready_at[operation_id]
+        return OCR_TEXT
+
+    AzureVisionOCR.__init__ = __init__
+    AzureVisionOCR.submit = submit
+    AzureVisionOCR.get_result = get_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run the backend against local stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--firestore-latency", type=float, default=0.02, help="Firestoreの読み書き1回あたりの秒数")
+    parser.add_argument("--ocr-latency", type=float, default=1.5, help="OCRの完了までの秒数")
+    parser.add_argument("--regions", type=int, default=5)
+    parser.add_argument("--users-per-region", type=int, default=20)
+    parser.add_argument("--news-per-region", type=int, default=100)
+    parser.add_argument("--messages-per-user", type=int, default=10)
+    parser.add_argument("--no-seed", action="store_true", help="テスト用データを投入しない（投入済みのエミュレーターを使う場合）")
+    args = parser.parse_args()
+
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+    # モデルはシステムプロンプトと地域データを dev/backend からの相対パスで読む
+    os.chdir(os.path.dirname(BENCHMARK_DIR))
+
+    patch_firebase(create_firestore(args))
+    patch_ocr(args.ocr_latency)
+
+    import main as backend
+    uvicorn.run(backend.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
@@ -0,0 +1,88 @@
+"""
+ベンチマーク用のMCPサーバーの代わり。
+
+本物のサーバーと同じ名前・同じ引数のツール（search_collection / fetch_tool）を公開し、
+指定した待ち時間の後に固定の文章を返します。Qdrantやインターネット検索を使わずにチャットの負荷試験を行えます。
+ローカルのQdrantで試す場合は、本物の mcp_server_qdrant を QDRANT_HOST=localhost で起動してください。
+
+実行例（dev/backend で実行）:
+    python benchmarks/stub_mcp_server.py --kind qdrant --port 8000 --latency 0.05
+    python benchmarks/stub_mcp_server.py --kind web --port 8001 --latency 1.0
+"""
+import argparse
+import asyncio
+import random
+from typing import List, Optional
+
+from mcp.server.fastmcp import FastMCP
+from pydantic import BaseModel, Field
+
+PASSAGES = [
+    "町内会の清掃当番は毎月第2日曜日の午前9時から、集会所前に集合して行います。",
+    "燃えるゴミは月曜日と木曜日、資源ゴミは第1・第3水曜日の朝8時30分までに出してください。",
+    "町内会費は年額3,600円です。4月の総会の後に班長が集金します。",
+    "防災訓練は9月の第1日曜日に小学校のグラウンドで行います。",
+    "集会所の利用は1週間前までに会長へ申し込んでください。",
+]
+
+
+class SearchCollectionInput(BaseModel):
+    collection_name: str = Field(..., description="必ずNoneを返してください")
+    query_vector: List[float] = Field(..., description="必ずNoneを返してください")
+    payload_id: str = Field(..., description="必ずNoneを返してください")
+    limit: int = Field(10, description="必ずNoneを返してください")
+    query_text: Optional[str] = Field(None, description="必ずNoneを返してください")
+    score_threshold: Optional[float] = Field(None, description="必ずNoneを返してください")
+
+
+class FetchToolInput(BaseModel):
+    query: str = Field(..., description="あなたが担当している町内会の名前を最初にいれてください。次にインターネットで検索したいワードをなるべく固有名詞を使って入力してください。")
+
+
+def create_server(kind: str, host: str, port: int, latency: float, jitter: float) -> FastMCP:
+    rng = random.Random(0)
+
+    async def wait():
+        await asyncio.sleep(max(0.0, latency + rng.uniform(-jitter, jitter)))
+
+    if kind == "qdrant":
+        mcp = FastMCP("MCP_BaseServer", host=host, port=port)
+
+        @mcp.tool()
+        async def search_collection(args: SearchCollectionInput):
+            """町内会の基本情報が入っているデータベースにベクトル検索を行えます。"""
+            await wait()
+            passages = PASSAGES[:max(1, min(args.limit, len(PASSAGES)))]
+            return "\n\n".join(f"[{i}] {passage}" for i, passage in enumerate(passages, start=1))
+    else:
+        mcp = FastMCP("FetchWrapper", host=host, port=port)
+
+        @mcp.tool()
+        async def fetch_tool(args: FetchToolInput) -> str:
+            """インターネットに接続して検索することができます。"""
+            await wait()
+            return f"「{args.query}」の検索結果\n\n" + "\n\n".join(PASSAGES[:3])
+
+    return mcp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="stub MCP server")
+    parser.add_argument("--kind", choices=["qdrant", "web"], required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency", type=float, default=0.05, help="ツールの応答までの秒数")
+    parser.add_argument("--jitter", type=float, default=0.0, help="待ち時間のばらつき（±秒）")
+    args = parser.parse_args()
+    create_server(args.kind, args.host, args.port, args.latency, args.jitter).run(transport="sse")
+
+
+if __name__ == "__main__":
+    main()
+
+
+"""
+Copyright (c) 2025 YukiTakayama
+このソースコードは自由に使用、複製、改変、再配布することができます。
+ただし、著作権表示は削除しないでください。
+"""
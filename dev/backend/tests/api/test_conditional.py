@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+import sys
+
+import pytest
+from starlette.requests import Request
+
+from api.conditional import compute_etag, etag_matches, not_modified_response, etag_json_response
+
+
+def make_request(path: str = "/news", query: str = "", if_none_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": headers})
+
+
+def test_etag_depends_on_version_and_query():
+    etag = compute_etag(make_request(query="limit=2"), (3, ("a", 1)))
+    assert etag == compute_etag(make_request(query="limit=2"), (3, ("a", 1)))
+    assert etag != compute_etag(make_request(query="limit=2"), (4, ("a", 1)))
+    assert etag != compute_etag(make_request(query="limit=3"), (3, ("a", 1)))
+    assert etag.startswith('"') and etag.endswith('"')
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ('"other"', False),
+    ("*", True),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(make_request(if_none_match=header), '"abc"') is expected
+
+
+def test_not_modified_response_has_no_body():
+    response = not_modified_response(make_request(if_none_match='"abc"'), '"abc"')
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["ETag"] == '"abc"'
+    assert not_modified_response(make_request(if_none_match='"other"'), '"abc"') is None
+
+
+def test_etag_json_response_keeps_headers():
+    response = etag_json_response([{"id": "a"}], '"abc"', headers={"X-Next-Cursor": "a"})
+    assert response.status_code == 200
+    assert response.body == b'[{"id":"a"}]'
+    assert response.headers["ETag"] == '"abc"'
+    assert response.headers["X-Next-Cursor"] == "a"
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+@pytest.fixture
+def news(backend):
+    _, db = backend
+    news = db.collection("Regions").document("etag-region").collection("News")
+    news.document("news-0").set({"Title": "お知らせ", "Text": "本文", "Time": datetime.now(timezone.utc), "columns": "回覧板"})
+    return news
+
+
+def test_list_news_returns_304_for_current_etag(client, news):
+    first = client.get("/api/v1/regions/etag-region/news")
+    assert first.status_code == 200
+    second = client.get("/api/v1/regions/etag-region/news", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert second.content == b""
+
+
+def test_list_news_304_does_not_read_documents(client, news, monkeypatch):
+    etag = client.get("/api/v1/regions/etag-region/news").headers["ETag"]
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("304 の場合はニュースを読まない")
+
+    items = sys.modules["api.v1.endpoints.items"]
+    monkeypatch.setattr(items.repository, "list_news_page", fail)
+    response = client.get("/api/v1/regions/etag-region/news", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("change", ["add", "edit", "delete"])
+def test_list_news_etag_changes_after_write(client, news, change):
+    etag = client.get("/api/v1/regions/etag-region/news").headers["ETag"]
+    if change == "add":
+        news.document("news-1").set({"Title": "追加", "Text": "本文", "Time": datetime.now(timezone.utc), "columns": "回覧板"})
+    elif change == "edit":
+        # 編集時は Time も更新される
+        news.document("news-0").update({"Title": "編集", "Time": datetime.now(timezone.utc)})
+    else:
+        news.document("news-0").delete()
+    response = client.get("/api/v1/regions/etag-region/news", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_user_messages_etag_changes_when_marked_read(client, backend):
+    _, db = backend
+    db.collection("Users").document("etag-user").set({"Name": "住民"})
+    messages = db.collection("Users").document("etag-user").collection("Messages")
+    messages.document("m1").set({"Title": "回覧", "Text": "本文", "SentTime": datetime.now(timezone.utc),
+                                 "read": False, "author": "役員"})
+    first = client.get("/api/v1/users/messages", params={"user_id": "etag-user"})
+    assert client.get("/api/v1/users/messages", params={"user_id": "etag-user"},
+                      headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert client.post("/api/v1/user/update/read", json={"user_id": "etag-user", "message_id": "m1"}).status_code == 200
+    response = client.get("/api/v1/users/messages", params={"user_id": "etag-user"},
+                          headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()[0]["read"] is True
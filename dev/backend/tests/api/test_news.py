@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def region(backend):
+    _, db = backend
+    news = db.collection("Regions").document("news-region").collection("News")
+    now = datetime.now(timezone.utc)
+    for i in range(5):
+        news.document(f"news-{i}").set({"Title": f"お知らせ{i}", "Text": "本文", "Time": now - timedelta(hours=i),
+                                         "columns": "回覧板"})
+    return "news-region"
+
+
+def test_list_news_returns_next_cursor_header(client, region):
+    response = client.get(f"/api/v1/regions/{region}/news", params={"limit": 2})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == ["news-0", "news-1"]
+    assert response.headers["X-Next-Cursor"] == "news-1"
+
+
+def test_list_news_follows_cursor_to_last_page(client, region):
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get(f"/api/v1/regions/{region}/news", params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert seen == [f"news-{i}" for i in range(5)]
+
+
+def test_list_news_without_limit_has_no_cursor(client, region):
+    response = client.get(f"/api/v1/regions/{region}/news")
+    assert len(response.json()) == 5
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_list_news_rejects_unknown_cursor(client, region):
+    response = client.get(f"/api/v1/regions/{region}/news", params={"limit": 2, "cursor": "missing"})
+    assert response.status_code == 400
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+from fake_firestore import FakeFirestore
+
+
+@pytest.fixture
+def db():
+    return FakeFirestore()
+
+
+@pytest.fixture(scope="session")
+def backend(tmp_path_factory):
+    """
+    メモリ上のFirestoreを使ってバックエンドのアプリを読み込む（benchmarks/run_backend.py と同じ差し替え）。
+    lifespan（MCPサーバーへの接続など）は実行しないので、外部サービスは不要です。
+
+    Returns:
+        tuple: (FastAPIアプリ, FakeFirestore)
+    """
+    import run_backend
+
+    for key, value in run_backend.BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+    db = FakeFirestore()
+    run_backend.patch_firebase(db)
+    # モデルはシステムプロンプトをカレントディレクトリからの相対パスで読む
+    workdir = tmp_path_factory.mktemp("backend")
+    (workdir / "app" / "db").mkdir(parents=True)
+    (workdir / "app" / "db" / "system_prompt.txt").write_text("テスト用のシステムプロンプト", encoding="utf-8")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    yield main.app, db
+    sys.modules["api.v1.endpoints.items"].repository.shutdown()
+
+
+@pytest.fixture
+def client(backend):
+    from fastapi.testclient import TestClient
+
+    app, _ = backend
+    return TestClient(app, headers={"Authorization": f"Bearer {os.environ['BACKEND_API_KEY']}"})
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+
+import openai
+import pytest
+
+from core import config
+from models import openai_client
+from models.openai_client import ConcurrencyLimiter, LimitedAsyncStream
+
+
+class FakeAsyncStream(openai.AsyncStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def limit(monkeypatch):
+    monkeypatch.setattr(config, "AZURE_OPENAI_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(openai_client, "_limiters", {})
+    return 2
+
+
+def test_limiter_caps_async_and_threads_together():
+    limiter = ConcurrencyLimiter(2)
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def enter():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+
+    def leave():
+        nonlocal running
+        with lock:
+            running -= 1
+
+    def sync_call():
+        with limiter:
+            enter()
+            time.sleep(0.02)
+            leave()
+
+    async def async_call():
+        async with limiter:
+            enter()
+            await asyncio.sleep(0.02)
+            leave()
+
+    async def main():
+        threads = [threading.Thread(target=sync_call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        await asyncio.gather(*[async_call() for _ in range(6)])
+        await asyncio.to_thread(lambda: [thread.join() for thread in threads])
+
+    asyncio.run(main())
+    assert peak == 2
+    assert limiter._in_use == 0
+
+
+def test_cancelled_waiter_is_removed():
+    limiter = ConcurrencyLimiter(1)
+
+    async def main():
+        await limiter.aacquire()
+        waiter = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0)
+        assert len(limiter._waiters) == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert len(limiter._waiters) == 0
+        limiter.release()
+        assert limiter._in_use == 0
+
+    asyncio.run(main())
+
+
+def test_waiter_cancelled_after_handover_returns_the_slot():
+    limiter = ConcurrencyLimiter(1)
+
+    async def main():
+        await limiter.aacquire()
+        waiter = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0)
+        # 枠を渡した直後、待っていた側が起きる前にキャンセルされる
+        limiter.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter._in_use == 0
+        await asyncio.wait_for(limiter.aacquire(), timeout=1)
+
+    asyncio.run(main())
+
+
+def test_waiters_are_served_in_fifo_order_across_sync_and_async():
+    limiter = ConcurrencyLimiter(1)
+    order = []
+
+    def sync_call():
+        with limiter:
+            order.append("sync")
+
+    async def async_call(name):
+        async with limiter:
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await limiter.aacquire()
+        first = asyncio.create_task(async_call("async-1"))
+        await asyncio.sleep(0.01)
+        thread = threading.Thread(target=sync_call)
+        thread.start()
+        while len(limiter._waiters) < 2:
+            await asyncio.sleep(0.001)
+        second = asyncio.create_task(async_call("async-2"))
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await asyncio.gather(first, second)
+        await asyncio.to_thread(thread.join)
+
+    asyncio.run(main())
+    assert order == ["async-1", "sync", "async-2"]
+
+
+def test_acall_with_retry_releases_slot_on_error(limit):
+    async def fail():
+        raise ValueError("boom")
+
+    async def main():
+        for _ in range(limit + 1):
+            with pytest.raises(ValueError):
+                await openai_client.acall_with_retry("errors", fail)
+        assert openai_client._limiter("errors")._in_use == 0
+
+    asyncio.run(main())
+
+
+def test_stream_holds_slot_until_closed(limit):
+    async def open_stream():
+        return FakeAsyncStream(["a", "b"])
+
+    async def main():
+        streams = [await openai_client.acall_with_retry("streams", open_stream) for _ in range(limit)]
+        assert all(isinstance(stream, LimitedAsyncStream) for stream in streams)
+        limiter = openai_client._limiter("streams")
+        assert limiter._in_use == limit
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(openai_client.acall_with_retry("streams", open_stream), timeout=0.05)
+
+        # 読み終えると閉じられ、枠が返る
+        assert [chunk async for chunk in streams[0]] == ["a", "b"]
+        assert streams[0]._stream.closed
+        # 途中で閉じても枠が返る
+        async with streams[1]:
+            pass
+        assert limiter._in_use == 0
+
+    asyncio.run(main())
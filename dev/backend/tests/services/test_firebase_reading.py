@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.firebase_reading import query_news_page
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def news(db):
+    news = db.collection("Regions").document("region").collection("News")
+    for i in range(7):
+        news.document(f"news-{i}").set({"Title": f"お知らせ{i}", "Time": NOW - timedelta(days=i),
+                                         "columns": "防災" if i % 2 else "回覧板"})
+    # Time の無いドキュメント（管理画面などから直接書き込まれたもの）
+    news.document("news-notime").set({"Title": "時刻なし"})
+    return news
+
+
+def ids(docs):
+    return [doc.id for doc in docs]
+
+
+def test_default_order_is_document_id_and_includes_docs_without_time(db, news):
+    docs, next_cursor = query_news_page(db, "region")
+    assert ids(docs) == sorted([f"news-{i}" for i in range(7)] + ["news-notime"])
+    assert next_cursor is None
+
+
+def test_cursor_pagination_visits_every_document_once(db, news):
+    seen = []
+    cursor = None
+    while True:
+        docs, cursor = query_news_page(db, "region", limit=3, cursor=cursor)
+        assert len(docs) <= 3
+        seen.extend(ids(docs))
+        if cursor is None:
+            break
+        assert cursor == docs[-1].id
+    assert seen == sorted([f"news-{i}" for i in range(7)] + ["news-notime"])
+
+
+def test_cursor_pagination_with_order_by(db, news):
+    first, cursor = query_news_page(db, "region", limit=4, order_by="Time")
+    second, last_cursor = query_news_page(db, "region", limit=4, order_by="Time", cursor=cursor)
+    assert ids(first) == [f"news-{i}" for i in range(4)]
+    assert ids(second) == [f"news-{i}" for i in range(4, 7)]
+    assert last_cursor is None
+
+
+def test_ascending_order(db, news):
+    docs, _ = query_news_page(db, "region", order_by="Time", descending=False, limit=2)
+    assert ids(docs) == ["news-6", "news-5"]
+
+
+def test_since_filters_on_time(db, news):
+    docs, _ = query_news_page(db, "region", since=NOW - timedelta(days=2))
+    assert ids(docs) == ["news-0", "news-1", "news-2"]
+
+
+def test_columns_filter(db, news):
+    docs, _ = query_news_page(db, "region", columns=["防災"], order_by="Time")
+    assert ids(docs) == ["news-1", "news-3", "news-5"]
+
+
+def test_unknown_cursor_raises(db, news):
+    with pytest.raises(ValueError):
+        query_news_page(db, "region", cursor="missing")
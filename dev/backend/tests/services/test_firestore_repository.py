@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.firestore_repository import FirestoreRepository
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def repository(db):
+    repository = FirestoreRepository(db, max_workers=2)
+    yield repository
+    repository.shutdown()
+
+
+def test_list_messages_since_includes_messages_without_updated_time(db, repository):
+    messages = db.collection("Users").document("user").collection("Messages")
+    # UpdatedTime が導入される前のメッセージ
+    messages.document("old").set({"Title": "古い", "SentTime": NOW - timedelta(days=3)})
+    messages.document("legacy-new").set({"Title": "新しい", "SentTime": NOW - timedelta(hours=1)})
+    messages.document("posted").set({"Title": "投稿", "SentTime": NOW - timedelta(hours=2), "UpdatedTime": NOW - timedelta(hours=2)})
+    # 古いが最近既読になったメッセージ
+    messages.document("read").set({"Title": "既読", "SentTime": NOW - timedelta(days=5), "UpdatedTime": NOW - timedelta(minutes=5)})
+
+    docs = asyncio.run(repository.list_messages("user", since=NOW - timedelta(days=1)))
+    assert [doc_id for doc_id, _ in docs] == ["legacy-new", "posted", "read"]
+    assert len(asyncio.run(repository.list_messages("user"))) == 4
+
+
+def test_versions_change_on_writes(db, repository):
+    news = db.collection("Regions").document("region").collection("News")
+    news.document("a").set({"Title": "a", "Time": NOW})
+    version = asyncio.run(repository.news_version("region"))
+    assert asyncio.run(repository.news_version("region")) == version
+    news.document("b").set({"Title": "b", "Time": NOW - timedelta(days=1)})
+    assert asyncio.run(repository.news_version("region")) != version
+
+    messages = db.collection("Users").document("user").collection("Messages")
+    messages.document("m").set({"Title": "m", "SentTime": NOW})
+    version = asyncio.run(repository.messages_version("user"))
+    messages.document("m").update({"read": True, "UpdatedTime": NOW + timedelta(minutes=1)})
+    assert asyncio.run(repository.messages_version("user")) != version
@@ -0,0 +1,58 @@
+import pytest
+
+from services import semantic_cache
+from services.semantic_cache import SemanticResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(semantic_cache, "time", clock)
+    return clock
+
+
+def test_lookup_uses_cosine_similarity_threshold(clock):
+    cache = SemanticResponseCache(threshold=0.95)
+    cache.store("region", "清掃はいつ？", [1.0, 0.0, 0.0], "10月です", latency=2.0)
+    hit = cache.lookup("region", [2.0, 0.1, 0.0])
+    assert hit["answer"] == "10月です"
+    assert hit["similarity"] > 0.95
+    assert cache.lookup("region", [0.5, 0.5, 0.0]) is None
+    # 地域ごとに別のキャッシュ
+    assert cache.lookup("other", [1.0, 0.0, 0.0]) is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SemanticResponseCache(ttl=60)
+    cache.store("region", "q", [1.0, 0.0], "a", latency=1.0)
+    clock.now += 59
+    assert cache.lookup("region", [1.0, 0.0]) is not None
+    clock.now += 2
+    assert cache.lookup("region", [1.0, 0.0]) is None
+    assert cache.metrics()["entries"] == 0
+
+
+def test_oldest_entries_are_evicted_per_region(clock):
+    cache = SemanticResponseCache(max_entries_per_region=2)
+    cache.store("region", "q1", [1.0, 0.0, 0.0], "a1", latency=1.0)
+    cache.store("region", "q2", [0.0, 1.0, 0.0], "a2", latency=1.0)
+    cache.store("region", "q3", [0.0, 0.0, 1.0], "a3", latency=1.0)
+    assert cache.lookup("region", [1.0, 0.0, 0.0]) is None
+    assert cache.lookup("region", [0.0, 1.0, 0.0])["answer"] == "a2"
+    assert cache.lookup("region", [0.0, 0.0, 1.0])["answer"] == "a3"
+
+
+def test_invalidate_drops_region(clock):
+    cache = SemanticResponseCache()
+    cache.store("region", "q", [1.0, 0.0], "a", latency=1.0)
+    cache.invalidate("region")
+    assert cache.lookup("region", [1.0, 0.0]) is None
+    assert cache.metrics()["invalidations"] == 1
@@ -0,0 +1,126 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from core import cache as cache_module
+from services.ocr_jobs import OCRJobManager
+from tools.ocr.ocr_cache import OCRCache, ArticleCache, phash
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+def poster(line_widths: list[int]) -> Image.Image:
+    """同じヘッダーで本文の行だけが違うポスター。"""
+    image = Image.new("L", (800, 1100), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 40, 760, 160), fill=0)
+    for row, width in enumerate(line_widths):
+        draw.rectangle((60, 220 + row * 60, 60 + width, 250 + row * 60), fill=60)
+    return image
+
+
+def jpeg(image: Image.Image, quality: int = 85) -> bytes:
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+POSTER = [600, 500, 650, 300, 620, 580, 400]
+OTHER_POSTER = [300, 650, 200, 600, 640, 250, 500]
+
+
+def test_phash_is_stable_across_reencoding_and_resizing():
+    image = poster(POSTER)
+    image_hash = phash(image)
+    assert image_hash.bit_length() <= 256
+    assert phash(Image.open(io.BytesIO(jpeg(image, quality=90)))) == image_hash
+    assert phash(Image.open(io.BytesIO(jpeg(image, quality=40)))) == image_hash
+    assert phash(image.resize((600, 825))) == image_hash
+
+
+def test_phash_differs_for_posters_with_different_body():
+    assert phash(poster(POSTER)) != phash(poster(OTHER_POSTER))
+
+
+def test_ocr_cache_exact_and_perceptual_lookup(clock):
+    cache = OCRCache()
+    content = jpeg(poster(POSTER))
+    image_hash = phash(poster(POSTER))
+    assert cache.get_exact(content) is None
+    cache.set(content, image_hash, "回覧板")
+    assert cache.get_exact(content) == "回覧板"
+    assert cache.get(image_hash) == "回覧板"
+    assert cache.get_exact(jpeg(poster(POSTER), quality=40)) is None
+
+
+def test_ocr_cache_ttl(clock):
+    cache = OCRCache(ttl=60)
+    cache.set(b"image", 1, "回覧板")
+    clock.now += 59
+    assert cache.get(1) == "回覧板"
+    clock.now += 2
+    assert cache.get(1) is None
+    assert cache.get_exact(b"image") is None
+
+
+def test_ocr_cache_evicts_least_recently_used(clock):
+    # 1件につきSHA-256とpHashの2つのキーを保存する
+    cache = OCRCache(maxsize=4)
+    cache.set(b"a", 1, "a")
+    cache.set(b"b", 2, "b")
+    assert cache.get(1) == "a"
+    cache.set(b"c", 3, "c")
+    assert len(cache.entries) == 4
+    # 使われていない古いキーから捨てられ、直前に使われたpHashは残る
+    assert cache.get_exact(b"a") is None
+    assert cache.get_exact(b"b") is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+
+
+def test_article_cache_ignores_whitespace(clock):
+    cache = ArticleCache()
+    cache.set("町内 清掃\nのお知らせ", "記事")
+    assert cache.get("町内  清掃 のお知らせ ") == "記事"
+    assert cache.get("町内清掃のお知らせ") is None
+
+
+class FakeOCREngine:
+    def __init__(self):
+        self.calls = 0
+
+    async def image_bytes_to_text_async(self, content: bytes, timeout: float = 30.0) -> str:
+        self.calls += 1
+        return f"OCR結果{self.calls}"
+
+
+def test_ocr_image_reuses_result_for_reencoded_upload():
+    engine = FakeOCREngine()
+    jobs = OCRJobManager(engine, article=None)
+
+    async def main():
+        first = await jobs.ocr_image(jpeg(poster(POSTER), quality=90))
+        same_file = await jobs.ocr_image(jpeg(poster(POSTER), quality=90))
+        reencoded = await jobs.ocr_image(jpeg(poster(POSTER), quality=50))
+        other = await jobs.ocr_image(jpeg(poster(OTHER_POSTER), quality=90))
+        return first, same_file, reencoded, other
+
+    first, same_file, reencoded, other = asyncio.run(main())
+    assert first == same_file == reencoded == "OCR結果1"
+    assert other == "OCR結果2"
+    assert engine.calls == 2
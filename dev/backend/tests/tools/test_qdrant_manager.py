@@ -0,0 +1,110 @@
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import VectorParams, Distance
+
+from tools.mcp_server.mcp_server_qdrant.QdrantManager import QdrantManager, sparse_text_vector
+
+DIMENSIONS = 1536
+COLLECTION = "region"
+
+
+def unit_vector(index: int) -> list[float]:
+    vector = [0.0] * DIMENSIONS
+    vector[index] = 1.0
+    return vector
+
+
+def make_manager(client: QdrantClient, **kwargs) -> QdrantManager:
+    manager = QdrantManager(collection_check_interval=kwargs.pop("collection_check_interval", 0), **kwargs)
+    manager.client = client
+    return manager
+
+
+@pytest.fixture
+def client():
+    return QdrantClient(":memory:")
+
+
+@pytest.fixture
+def manager(client):
+    return make_manager(client, hybrid=True, score_threshold=None)
+
+
+DOCUMENTS = [
+    ("r1", "夏祭りは公園で行います。", unit_vector(0)),
+    ("r1", "3丁目のゴミ集積所の清掃は第2日曜日です。", unit_vector(1)),
+    ("r1", "防災訓練のお知らせ。", unit_vector(2)),
+    ("r2", "3丁目のゴミ集積所の清掃は第2日曜日です。", unit_vector(1)),
+]
+
+
+def documents(result) -> list[str]:
+    return [point.payload["document"] for point in result.points]
+
+
+def test_sparse_text_vector_matches_terms_after_normalisation():
+    full_width = sparse_text_vector("３丁目　ＡＢＣ")
+    half_width = sparse_text_vector("3丁目 abc")
+    assert sorted(full_width.indices) == sorted(half_width.indices)
+    assert len(full_width.indices) == len(full_width.values)
+    assert sparse_text_vector("").indices == []
+
+
+def test_hybrid_search_finds_exact_terms_within_region(manager, client):
+    manager.upsert_documents(COLLECTION, DOCUMENTS)
+    info = client.get_collection(COLLECTION)
+    assert QdrantManager.sparse_vector_name in info.config.params.sparse_vectors
+
+    dense = manager.search_collection(COLLECTION, unit_vector(0), payload_id="r1", limit=1)
+    assert documents(dense) == ["夏祭りは公園で行います。"]
+
+    hybrid = manager.search_collection(COLLECTION, unit_vector(0), payload_id="r1", limit=2,
+                                       query_text="3丁目の清掃はいつ？")
+    assert "3丁目のゴミ集積所の清掃は第2日曜日です。" in documents(hybrid)
+    for point in hybrid.points:
+        assert point.payload.keys() == {"document"}
+        assert point.vector is None
+
+
+def test_search_is_filtered_by_region(manager):
+    manager.upsert_documents(COLLECTION, DOCUMENTS)
+    result = manager.search_collection(COLLECTION, unit_vector(1), payload_id="r2", limit=10, query_text="清掃")
+    assert documents(result) == ["3丁目のゴミ集積所の清掃は第2日曜日です。"]
+
+
+def test_upsert_is_idempotent(manager, client):
+    manager.upsert_documents(COLLECTION, DOCUMENTS)
+    manager.upsert_documents(COLLECTION, DOCUMENTS)
+    assert client.count(COLLECTION).count == len(DOCUMENTS)
+    assert len(manager.list_point_ids(COLLECTION, "r1")) == 3
+
+
+def test_search_does_not_create_missing_collection(manager, client):
+    result = manager.search_collection("missing", unit_vector(0), payload_id="r1", query_text="清掃")
+    assert result.points == []
+    assert not client.collection_exists("missing")
+
+
+def test_search_notices_collection_deleted_elsewhere(manager, client):
+    manager.upsert_documents(COLLECTION, DOCUMENTS)
+    client.delete_collection(COLLECTION)
+    assert manager.search_collection(COLLECTION, unit_vector(0), payload_id="r1").points == []
+
+
+def test_dense_only_collection_is_searched_densely_and_recreated_on_ingest(client):
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=DIMENSIONS, distance=Distance.COSINE))
+    make_manager(client, hybrid=False).upsert_documents(COLLECTION, DOCUMENTS)
+
+    manager = make_manager(client, hybrid=True)
+    # 検索では作り直さず、密ベクトルだけで検索する
+    result = manager.search_collection(COLLECTION, unit_vector(0), payload_id="r1", limit=1, query_text="清掃")
+    assert documents(result) == ["夏祭りは公園で行います。"]
+    assert client.count(COLLECTION).count == len(DOCUMENTS)
+
+    # 投入時には疎ベクトルを持つコレクションとして作り直す（ポイントは再投入される）
+    assert manager.ensure_collection(COLLECTION) is True
+    info = client.get_collection(COLLECTION)
+    assert QdrantManager.sparse_vector_name in info.config.params.sparse_vectors
+    assert client.count(COLLECTION).count == 0
+    manager.upsert_documents(COLLECTION, DOCUMENTS)
+    assert client.count(COLLECTION).count == len(DOCUMENTS)